@@ -62,9 +62,9 @@ class Block(GooCanvas.CanvasGroup, BlockModel):
         self.height: int = self.__calculate_height()
 
         self.__draw_rect()
-        self.__draw_label()
-        self.__draw_ports()
-        self.__draw_icon()
+        # Label, ports and icon are drawn when the block is first shown in
+        # detail (see set_detail)
+        self.__detailed: bool = False
         self.update_flow()
 
     # ----------------------------------------------------------------------
@@ -98,7 +98,7 @@ class Block(GooCanvas.CanvasGroup, BlockModel):
             self.remember_x = event.x
             self.remember_y = event.y
 
-        self.diagram.update_flows()
+        self.diagram.mark_dirty(self)
 
         if event.button == 3:
             return False
@@ -385,6 +385,37 @@ class Block(GooCanvas.CanvasGroup, BlockModel):
         else:
             return (x - 25, y - 8)
 
+    # ----------------------------------------------------------------------
+    def set_detail(self, detailed: bool) -> None:
+        """
+        This method shows or hides the label, ports and icon. Without
+        them the block is a plain rectangle, for low zoom levels.
+
+            Parameters:
+                * **detailed** (:class:`boolean<boolean>`)
+        """
+        if detailed == self.__detailed:
+            return
+        if detailed and "Label" not in self.widgets:
+            self.__draw_label()
+            self.__draw_ports()
+            self.__draw_icon()
+        self.__detailed = detailed
+        self.__update_state()
+
+    # ----------------------------------------------------------------------
+    def get_area(self) -> Tuple[float, float, float, float]:
+        """
+        This method get the area of the block, from its position, even
+        when it is not on the canvas.
+
+            Returns:
+                * **Types** (:class:`tuple<tuple>`) x1, y1, x2, y2
+        """
+        x, y = self.get_position()
+        # The label is above the rectangle
+        return x, y - 10, x + self.width, y + self.height + 10
+
     # ----------------------------------------------------------------------
     def get_port_pos(self, port: Port) -> Tuple[float, float]:
         """
@@ -469,9 +500,7 @@ class Block(GooCanvas.CanvasGroup, BlockModel):
         """
         self.has_flow = True
         distinct_con = []
-        for conn in self.diagram.connectors:
-            if conn.input != self:
-                continue
+        for conn in self.diagram.get_incoming(self.id):
             if conn.input_port not in distinct_con:
                 distinct_con.append(conn.input_port)
         in_count = 0
@@ -511,32 +540,35 @@ class Block(GooCanvas.CanvasGroup, BlockModel):
         self.height = self.__calculate_height()
 
         if self.is_collapsed:
-            self.widgets["Label"].set_property("visibility", GooCanvas.CanvasItemVisibility.INVISIBLE)
             self.widgets["Rect"].set_property("width", self.width - 60)
             self.widgets["Rect"].set_property("x", 35)
             self.widgets["Rect"].set_property("y", 0)
             self.widgets["Rect"].set_property("height", self.height - 10)
-            self.widgets["Icon"].set_property("y", (self.height - 10)/2)
-            self.widgets["Icon"].set_property("x", (self.width / 2) + 2)
-            for port in self.ports:
-                x,y = self.__get_port_pos(port)
-                if "port" + str(port) in self.widgets:
-                    self.widgets["port" + str(port)].set_property("x", x)
-                    self.widgets["port" + str(port)].set_property("y", y)
-                    self.widgets["port" + str(port)].set_property("text", self.__create_ports_label(port))
-            return True
-
-        if not self.is_collapsed:
-            self.widgets["Label"].set_property("visibility", GooCanvas.CanvasItemVisibility.VISIBLE)
+        else:
             self.widgets["Rect"].set_property("width", self.width)
             self.widgets["Rect"].set_property("x", 0)
             self.widgets["Rect"].set_property("y", 10)
             self.widgets["Rect"].set_property("height", self.height)
+
+        if "Label" not in self.widgets:
+            return
+        if self.__detailed:
+            visibility = GooCanvas.CanvasItemVisibility.VISIBLE
+        else:
+            visibility = GooCanvas.CanvasItemVisibility.INVISIBLE
+        if self.is_collapsed:
+            self.widgets["Label"].set_property("visibility", GooCanvas.CanvasItemVisibility.INVISIBLE)
+            self.widgets["Icon"].set_property("y", (self.height - 10)/2)
+            self.widgets["Icon"].set_property("x", (self.width / 2) + 2)
+        else:
+            self.widgets["Label"].set_property("visibility", visibility)
             self.widgets["Icon"].set_property("y", (self.height + 20)/2)
             self.widgets["Icon"].set_property("x", (self.width / 2))
-            for port in self.ports:
-                x,y = self.__get_port_pos(port)
-                if "port" + str(port) in self.widgets:
-                    self.widgets["port" + str(port)].set_property("x", x)
-                    self.widgets["port" + str(port)].set_property("y", y)
-                    self.widgets["port" + str(port)].set_property("text", self.__create_ports_label(port))
+        self.widgets["Icon"].set_property("visibility", visibility)
+        for port in self.ports:
+            x,y = self.__get_port_pos(port)
+            if "port" + str(port) in self.widgets:
+                self.widgets["port" + str(port)].set_property("x", x)
+                self.widgets["port" + str(port)].set_property("y", y)
+                self.widgets["port" + str(port)].set_property("text", self.__create_ports_label(port))
+                self.widgets["port" + str(port)].set_property("visibility", visibility)
@@ -66,4 +66,4 @@ class BlockMenu(Gtk.Menu):
 
         """
         self.block.is_collapsed = not self.block.is_collapsed
-        self.block.diagram.update_flows()
+        self.block.diagram.mark_dirty(self.block, connectors=True)
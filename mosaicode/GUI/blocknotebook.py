@@ -5,7 +5,7 @@ This module contains the BlockNotebook class.
 """
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk
+from gi.repository import GLib, Gtk
 from mosaicode.GUI.blockstreeview import BlocksTreeView
 from typing import Any, Dict, List, Optional, Union
 
@@ -26,22 +26,32 @@ class BlockNotebook(Gtk.Notebook):
         """
         Gtk.Notebook.__init__(self)
         self.tabs: List[Any] = []
+        # Placeholder page -> language not loaded yet
+        self.placeholders: Dict[Any, str] = {}
+        self.__language_to_show: Optional[str] = None
+        self.__updating: bool = False
         self.main_window = main_window
         self.set_scrollable(True)
+        self.connect("switch-page", self.__on_switch_page)
 
     # ----------------------------------------------------------------------
-    def update_blocks(self, blocks) -> None:
+    def update_blocks(self, blocks, placeholders: Optional[List[str]] = None) -> None:
         """
         This methods update all blocks loaded for each library.
 
             :param blocks: blocks to update
+            :param placeholders: languages not loaded yet, shown as tabs
+                that load their blocks when opened
             :return: None
         """
         languages = []
 
+        # Rebuilding the pages must not load the placeholder languages
+        self.__updating = True
+        self.placeholders = {}
         while self.get_n_pages() > 0:
             self.remove_page(0)
-            self.tabs.pop()
+        self.tabs.clear()
 
         for x in blocks:
             instance = blocks[x]
@@ -55,7 +65,72 @@ class BlockNotebook(Gtk.Notebook):
             treeview = BlocksTreeView(self.main_window, language, blocks)
             self.append_page(treeview, Gtk.Label.new(language))
             self.tabs.append(treeview)
+
+        for language in placeholders or []:
+            page = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+            button = Gtk.Button.new_with_label("Load " + language + " blocks")
+            button.connect("clicked", lambda widget, name: self.__load_language(name),
+                           language)
+            page.pack_start(button, False, False, 6)
+            self.append_page(page, Gtk.Label.new(language))
+            self.placeholders[page] = language
         self.show_all()
+        self.__updating = False
+
+        # Show the first tab of the language that was just loaded
+        language, self.__language_to_show = self.__language_to_show, None
+        if language is not None:
+            for index, name in enumerate(languages):
+                if name.split("/")[0] == language:
+                    self.set_current_page(index)
+                    break
+
+    # ----------------------------------------------------------------------
+    def apply_changes(self, removed, blocks) -> None:
+        """
+        This method patch the pages with the blocks removed, added or
+        changed, instead of rebuilding all of them.
+
+            :param removed: types of the removed blocks
+            :param blocks: added and changed blocks, by type
+            :return: None
+        """
+        for block_type in list(removed) + list(blocks):
+            for tab in self.tabs:
+                tab.remove_block(block_type)
+
+        for block in blocks.values():
+            name = block.language + "/" + block.extension
+            tab = next((tab for tab in self.tabs if tab.language == name), None)
+            if tab is None:
+                # New pages go before the placeholders
+                tab = BlocksTreeView(self.main_window, name, {})
+                self.insert_page(tab, Gtk.Label.new(name), len(self.tabs))
+                self.tabs.append(tab)
+                tab.show_all()
+            tab.add_block(block)
+
+        for tab in list(self.tabs):
+            if tab.tree_store.get_iter_first() is None:
+                self.remove_page(self.page_num(tab))
+                self.tabs.remove(tab)
+
+    # ----------------------------------------------------------------------
+    def __on_switch_page(self, notebook, page, page_num) -> None:
+        """
+        Load the blocks of a placeholder tab when it is opened. The pages
+        can not be replaced inside this signal, so it is done when idle.
+        """
+        if self.__updating or page not in self.placeholders:
+            return
+        self.__language_to_show = self.placeholders[page]
+        GLib.idle_add(self.__load_language, self.placeholders[page])
+
+    # ----------------------------------------------------------------------
+    def __load_language(self, language: str) -> bool:
+        self.__language_to_show = language
+        self.main_window.main_control.load_language(language)
+        return False
 
     # ----------------------------------------------------------------------
     def search(self, query) -> None:
@@ -77,7 +152,7 @@ class BlockNotebook(Gtk.Notebook):
         current_tab = None
         if self.get_current_page() > -1:
             current_tab = self.get_nth_page(self.get_current_page())
-        if current_tab is None:
+        if current_tab is None or current_tab in self.placeholders:
             return None
         return current_tab.get_selected_block()
 # ----------------------------------------------------------------------
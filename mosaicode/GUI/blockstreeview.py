@@ -27,6 +27,7 @@ class BlocksTreeView(Gtk.ScrolledWindow):
         """
         Gtk.ScrolledWindow.__init__(self)
         self.main_window = main_window
+        self.language = language
         self.current_filter: Optional[Any] = None
 
         self.tree_store = Gtk.TreeStore(str, str, str, str, object)
@@ -109,6 +110,41 @@ class BlocksTreeView(Gtk.ScrolledWindow):
                         block
                         ])
 
+    # ----------------------------------------------------------------------
+    def add_block(self, block) -> None:
+        """
+        This method add a block, replacing the one with the same type.
+
+            Parameters:
+                * **block**
+        """
+        self.remove_block(block.type)
+        self.__add_item(block)
+
+    # ----------------------------------------------------------------------
+    def remove_block(self, block_type: str) -> bool:
+        """
+        This method remove a block. Empty categories are removed too.
+
+            Parameters:
+                * **block_type**
+            Returns:
+                * True if the block was found.
+        """
+        category = self.tree_store.get_iter_first()
+        while category is not None:
+            child = self.tree_store.iter_children(category)
+            while child is not None:
+                block = self.tree_store[child][4]
+                if block is not None and block.type == block_type:
+                    self.tree_store.remove(child)
+                    if not self.tree_store.iter_has_child(category):
+                        self.tree_store.remove(category)
+                    return True
+                child = self.tree_store.iter_next(child)
+            category = self.tree_store.iter_next(category)
+        return False
+
     # ----------------------------------------------------------------------
     def __append_category(self, category_name):
         return self.tree_store.append(None, [None, str(category_name),
@@ -78,7 +78,7 @@ class Comment(GooCanvas.CanvasText, CommentModel):
             self.remember_x = event.x
             self.remember_y = event.y
 
-        self.diagram.update_flows()
+        self.diagram.mark_dirty(self)
         return True
 
     # ----------------------------------------------------------------------
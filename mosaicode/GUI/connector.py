@@ -32,6 +32,9 @@ class Connector(GooCanvas.CanvasGroup, ConnectionModel):
         self.is_selected = False
         self.width = 0
         self.height = 0
+        # Straight lines when not detailed, for low zoom levels
+        self.__detailed = False
+        self.__area = (0, 0, 0, 0)
 
         self.connect("button-press-event", self.__on_button_press)
         self.connect("enter-notify-event", self.__on_enter_notify)
@@ -52,7 +55,7 @@ class Connector(GooCanvas.CanvasGroup, ConnectionModel):
             self.diagram.deselect_all()
             self.is_selected = True
 
-        self.diagram.update_flows()
+        self.diagram.mark_dirty(self)
         return False
 
     # ----------------------------------------------------------------------
@@ -90,6 +93,31 @@ class Connector(GooCanvas.CanvasGroup, ConnectionModel):
 
         self.__update_draw()
 
+    # ----------------------------------------------------------------------
+    def set_detail(self, detailed):
+        """
+        This method draws the connector with the preferred style, or as a
+        straight line, for low zoom levels.
+
+            Parameters:
+                * **detailed** (:class:`boolean<boolean>`)
+        """
+        if detailed == self.__detailed:
+            return
+        self.__detailed = detailed
+        self.__update_draw()
+
+    # ----------------------------------------------------------------------
+    def get_area(self):
+        """
+        This method get the area of the connector, even when it is not on
+        the canvas.
+
+            Returns:
+                * **Types** (:class:`tuple<tuple>`) x1, y1, x2, y2
+        """
+        return self.__area
+
     # ----------------------------------------------------------------------
     def __update_draw(self):
         """
@@ -101,7 +129,11 @@ class Connector(GooCanvas.CanvasGroup, ConnectionModel):
         x1 = self.__to_point[0]
         y1 = self.__to_point[1]
 
-        if System.get_preferences().connection == "Curve":
+        connection = System.get_preferences().connection
+        if not self.__detailed:
+            connection = "Line"
+
+        if connection == "Curve":
             c1x = x1
             c1y = y0
             c2x = x0
@@ -115,12 +147,12 @@ class Connector(GooCanvas.CanvasGroup, ConnectionModel):
             path += " " + str(c2x) + " " + str(c2y)
             path += " " + str(x1) + " " + str(y1)
 
-        elif System.get_preferences().connection == "Line":
+        elif connection == "Line":
             path += "M " + str(x0) + " " + str(y0)
             path += " L " + str(x1) + " " + str(y1)
 
 
-        else: # System.get_preferences().connection == "Square":
+        else: # connection == "Square":
             x0_shift = (self.output_port.type_index * 4)
             x1_shift = 0
             if self.input_port is not None:
@@ -145,6 +177,10 @@ class Connector(GooCanvas.CanvasGroup, ConnectionModel):
             # End Point
             path += " L " + str(x1) + " " + str(y1)
 
+        # The curves are inside the polygon of their points
+        values = [float(value) for value in path.split() if value not in ("M", "C", "L")]
+        self.__area = (min(values[0::2]), min(values[1::2]),
+                       max(values[0::2]), max(values[1::2]))
 
         if "Line" not in self.__widgets:
             widget = GooCanvas.CanvasPath(
@@ -9,6 +9,7 @@ gi.require_version('Gdk', '3.0')
 gi.require_version('GooCanvas', '2.0')
 from gi.repository import Gtk
 from gi.repository import Gdk
+from gi.repository import GLib
 from gi.repository import GObject
 from gi.repository import GooCanvas
 from typing import Any, Optional, List, Dict, Tuple
@@ -17,6 +18,7 @@ from mosaicode.GUI.connector import Connector
 from mosaicode.GUI.comment import Comment
 from mosaicode.system import System as System
 from mosaicode.model.diagrammodel import DiagramModel
+from mosaicode.model.commandhistory import AddConnection, MoveBlocks
 from mosaicode.model.blockmodel import BlockModel
 from mosaicode.control.diagramcontrol import DiagramControl
 import gettext
@@ -28,6 +30,10 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
     This class contains the methods related to Diagram class.
     """
 
+    # Below this scale blocks are plain rectangles and connectors are
+    # straight lines
+    DETAIL_ZOOM = 0.6
+
     # ----------------------------------------------------------------------
 
     def __init__(self, main_window: Any) -> None:
@@ -46,7 +52,7 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
 
         self.connect("motion-notify-event", self.__on_motion_notify)
         self.connect_after("button_press_event", self.__on_button_press)
-        self.connect_after("button_release_event", self.__on_button_release)
+        self.connect("button_release_event", self.__on_button_release)
         self.connect_after("key-press-event", self.__on_key_press)
 
         self.connect("drag_data_received", self.__drag_data_received)
@@ -59,6 +65,32 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
 
         self.show_grid: bool = False
         self.select_rect: Optional[Any] = None
+        # Layers of the canvas, from bottom to top. The redraw adds and
+        # removes only the items that changed.
+        root = self.get_root_item()
+        self.__grid_layer = GooCanvas.CanvasGroup(
+            parent=root, pointer_events=GooCanvas.CanvasPointerEvents.NONE)
+        self.__block_layer = GooCanvas.CanvasGroup(parent=root)
+        self.__connector_layer = GooCanvas.CanvasGroup(parent=root)
+        self.__comment_layer = GooCanvas.CanvasGroup(parent=root)
+        # id(item) -> (item, layer), for the items of the diagram
+        self.__drawn: Dict[int, Tuple[Any, Any]] = {}
+        # The grid is a single path, hidden when not shown, and the
+        # (width, height, grid size) of its lines
+        self.__grid: Optional[Any] = None
+        self.__grid_drawn: Optional[Tuple[int, int, int]] = None
+        # id(item) -> item, for the items to update in the idle callback
+        self.__dirty: Dict[int, Any] = {}
+        self.__dirty_source: Optional[int] = None
+        # Only the blocks and connectors near the visible area are on the
+        # canvas (see __cull): id(item) -> item, and the area they cover
+        self.__shown: Dict[int, Any] = {}
+        self.__culled: Optional[Tuple[float, float, float, float]] = None
+        self.__cull_source: Optional[int] = None
+        self.connect("size-allocate", self.__on_viewport_changed)
+        self.connect("notify::hadjustment", self.__on_adjustment_changed)
+        self.connect("notify::vadjustment", self.__on_adjustment_changed)
+        self.__on_adjustment_changed()
         self.__draw_grid()
 
         # Used for cycle detection
@@ -70,17 +102,15 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         # Select elements
         if self.select_rect is not None:
             self.__update_select(event.x / scale, event.y / scale)
-            items = self.get_items_in_area(
-                self.select_rect.bounds, True, False, True)
+            bounds = self.select_rect.get_bounds()
+            items = self.get_items_in_bounds(
+                (bounds.x1, bounds.y1, bounds.x2, bounds.y2), inside=True)
             for item in items:
+                if not getattr(item, "is_selected", False):
                     item.is_selected = True
-            self.update_flows()
+                    self.mark_dirty(item)
             return True  # Abort other events
 
-        if event.state & Gdk.ModifierType.BUTTON1_MASK:
-            for connector in self.connectors:
-                connector.update_flow()
-
         if self.curr_connector is None:
             return False
         point = (event.x / scale, event.y / scale)
@@ -95,16 +125,16 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
 
         if event.state == Gdk.ModifierType.CONTROL_MASK:
             if event.keyval == Gdk.KEY_Up:
-                self.move_selected(0, -grid*5)
+                self.__nudge(0, -grid*5)
                 return True
             if event.keyval == Gdk.KEY_Down:
-                self.move_selected(0, grid*5)
+                self.__nudge(0, grid*5)
                 return True
             if event.keyval == Gdk.KEY_Left:
-                self.move_selected(-grid*5, 0)
+                self.__nudge(-grid*5, 0)
                 return True
             if event.keyval == Gdk.KEY_Right:
-                self.move_selected(grid*5, 0)
+                self.__nudge(grid*5, 0)
                 return True
 
         if event.keyval == Gdk.KEY_Delete and self.focus:
@@ -112,21 +142,39 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
             return True
 
         if event.keyval == Gdk.KEY_Up:
-            self.move_selected(0, -grid)
+            self.__nudge(0, -grid)
             return True
         if event.keyval == Gdk.KEY_Down:
-            self.move_selected(0, grid)
+            self.__nudge(0, grid)
             return True
         if event.keyval == Gdk.KEY_Left:
-            self.move_selected(-grid, 0)
+            self.__nudge(-grid, 0)
             return True
         if event.keyval == Gdk.KEY_Right:
-            self.move_selected(grid, 0)
+            self.__nudge(grid, 0)
             return True
 
     # ----------------------------------------------------------------------
     def __on_button_release(self, widget, event=None):
+        # Before the items get the event, so the end of a drag is always seen
+        self.__end_move()
         self.__end_select()
+        return False
+
+    # ----------------------------------------------------------------------
+    def __nudge(self, x, y):
+        self.move_selected(x, y)
+        self.__end_move()
+
+    # ----------------------------------------------------------------------
+    def __end_move(self):
+        """
+        This method records the blocks moved since the last call as one
+        action. Consecutive moves of the same blocks are merged.
+        """
+        positions = self.end_move()
+        if positions:
+            DiagramControl(self).do("Move", MoveBlocks(positions))
 
     # ----------------------------------------------------------------------
     def __on_button_press(self, widget, event=None):
@@ -136,7 +184,6 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
             self.last_clicked_point = (event.x, event.y)
             self.deselect_all()
             self.__abort_connection()
-            self.update_flows()
             self.__start_select()
             return False
         if event.button == 3:
@@ -207,7 +254,7 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         Returns
              * **Types** (:class:`boolean<boolean>`)
         """
-        for oldCon in self.connectors:
+        for oldCon in self.get_incoming(newCon.input.id):
             if oldCon.input == newCon.input \
                     and oldCon.input_port == newCon.input_port\
                     and not newCon.input_port.multiple:
@@ -223,19 +270,7 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
 
     # ----------------------------------------------------------------------
     def __cycle_detection(self, newCon: Connector) -> bool:
-        marks = []
-        marks.append(newCon.input.id)
-        i = 0
-        while i < len(marks):
-            for connection in self.connectors:
-                if connection.output.id != marks[i]:
-                    continue
-                if connection.input == newCon.output:
-                    return True
-                if connection.input.id not in marks:
-                    marks.append(connection.input.id)
-            i += 1
-        return False
+        return self.would_create_cycle(newCon.output.id, newCon.input.id)
 
     # ----------------------------------------------------------------------
     def __abort_connection(self):
@@ -258,6 +293,7 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         """
         self.__abort_connection()  # abort any possibly running connections
         self.curr_connector = Connector(self, block, port)
+        self.curr_connector.set_detail(self.is_detailed())
         self.get_root_item().add_child(self.curr_connector, -1)
         self.update_flows()
 
@@ -280,41 +316,58 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
             self.__abort_connection()
             return False
 
-        self.connectors.append(self.curr_connector)
+        self.add_connection(self.curr_connector)
+        DiagramControl(self).do("Add Connection", AddConnection(self.curr_connector))
         self.curr_connector = None
         self.update_flows()
         return True
 
     # ----------------------------------------------------------------------
     def __draw_grid(self):
-        if self.show_grid:
-            width = self.main_window.get_size()[0]
-            height = self.main_window.get_size()[1]
-
-            i = 0
-            while i < height:
-                GooCanvas.CanvasPath(
-                        parent=self.get_root_item(),
-                        stroke_color="#F9F9F9",
-                        data="M 0 " + str(i) + " L "+ str(width) +" "+ str(i) + "",
-                        line_width=0.8
-                        )
-                i = i + System.get_preferences().grid
-            i = 0
-            while i < width:
-                GooCanvas.CanvasPath(
-                        parent=self.get_root_item(),
-                        stroke_color="#F9F9F9",
-                        data="M " + str(i) + " 0 L "+ str(i) + " "+ str(height) +"",
-                        line_width=0.8
-                        )
-                i = i + System.get_preferences().grid
+        if not self.show_grid:
+            if self.__grid is not None:
+                self.__grid.set_property(
+                    "visibility", GooCanvas.CanvasItemVisibility.INVISIBLE)
+            return
+        width = self.main_window.get_size()[0]
+        height = self.main_window.get_size()[1]
+        grid = (width, height, System.get_preferences().grid)
+        if self.__grid is None:
+            self.__grid = GooCanvas.CanvasPath(
+                    parent=self.__grid_layer,
+                    stroke_color="#F9F9F9",
+                    line_width=0.8,
+                    pointer_events=GooCanvas.CanvasPointerEvents.NONE
+                    )
+        if grid != self.__grid_drawn:
+            self.__grid_drawn = grid
+            self.__grid.set_property("data", self.__get_grid_path(*grid))
+        self.__grid.set_property(
+            "visibility", GooCanvas.CanvasItemVisibility.VISIBLE)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __get_grid_path(width, height, size):
+        """
+        This method returns the lines of the grid as the data of a path.
+        """
+        if size <= 0:
+            return ""
+        lines = ["M 0 " + str(i) + " L " + str(width) + " " + str(i)
+                 for i in range(0, height, size)]
+        lines += ["M " + str(i) + " 0 L " + str(i) + " " + str(height)
+                  for i in range(0, width, size)]
+        return " ".join(lines)
 
     # ----------------------------------------------------------------------
     def update_flows(self):
         """
         This method update flows.
         """
+        if self.defer("update_flows"):
+            return
+        # All the items are updated here
+        self.__dirty.clear()
         self.update()
         for block_id in self.blocks:
             self.blocks[block_id].update_flow()
@@ -323,6 +376,123 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         for comment in self.comments:
             if hasattr(comment, 'update_flow'):
                 comment.update_flow()
+        # Undo, align and collapse move items without marking them. The
+        # index only changes for the boxes that moved.
+        self.update_bounds(*list(self._spatial_items.values()))
+
+    # ----------------------------------------------------------------------
+    def mark_dirty(self, *items, connectors=False):
+        """
+        This method marks items to update, instead of updating the whole
+        diagram. The marks are updated once, in an idle callback that runs
+        before the canvas is painted.
+
+            Parameters:
+                * **items** blocks, connectors and comments changed
+                * **connectors** also mark the connectors of the blocks,
+                  when they were moved or resized
+        """
+        for item in items:
+            self.__dirty[id(item)] = item
+            if connectors and isinstance(item, Block):
+                for connector in self.get_incoming(item.id):
+                    self.__dirty[id(connector)] = connector
+                for connector in self.get_outgoing(item.id):
+                    self.__dirty[id(connector)] = connector
+        if self.__dirty and self.__dirty_source is None:
+            self.__dirty_source = GLib.idle_add(self.__update_dirty,
+                                                priority=GLib.PRIORITY_HIGH_IDLE)
+
+    # ----------------------------------------------------------------------
+    def __update_dirty(self):
+        self.__dirty_source = None
+        dirty = self.__dirty
+        self.__dirty = {}
+        for item in dirty.values():
+            # Canvas items of the rubber band selection have no flow
+            if hasattr(item, 'update_flow'):
+                item.update_flow()
+        # New items are indexed by redraw, removed ones must stay out
+        self.update_bounds(*[item for key, item in dirty.items()
+                             if key in self._spatial_items])
+        # Moved items may come near the visible area, or leave it
+        self.__cull(force=True)
+        return GLib.SOURCE_REMOVE
+
+    # ----------------------------------------------------------------------
+    def is_detailed(self):
+        """
+        This method returns if the items are drawn in detail at the
+        current scale.
+        """
+        return self.get_scale() >= self.DETAIL_ZOOM
+
+    # ----------------------------------------------------------------------
+    def __on_adjustment_changed(self, *args):
+        for adjustment in (self.get_hadjustment(), self.get_vadjustment()):
+            if adjustment is not None:
+                adjustment.connect("value-changed", self.__on_viewport_changed)
+
+    # ----------------------------------------------------------------------
+    def __on_viewport_changed(self, *args):
+        if self.__cull_source is None:
+            self.__cull_source = GLib.idle_add(self.__on_cull,
+                                               priority=GLib.PRIORITY_HIGH_IDLE)
+
+    # ----------------------------------------------------------------------
+    def __on_cull(self):
+        self.__cull_source = None
+        self.__cull()
+        return GLib.SOURCE_REMOVE
+
+    # ----------------------------------------------------------------------
+    def __cull(self, force=False, full=False):
+        """
+        This method puts on the canvas the blocks and connectors near the
+        visible area, and removes the others, so the canvas does not lay
+        out and paint items that are not seen. Comments are always shown.
+
+            Parameters:
+                * **force** query the items even if the visible area did
+                  not leave the area of the last query
+                * **full** check all the items, after a redraw
+        """
+        allocation = self.get_allocation()
+        x1, y1 = self.convert_from_pixels(0, 0)
+        x2, y2 = self.convert_from_pixels(allocation.width, allocation.height)
+        area = self.__culled
+        if not (force or full) and area is not None and area[0] <= x1 and \
+                area[1] <= y1 and x2 <= area[2] and y2 <= area[3]:
+            return
+        # Half of the visible area around it, so small scrolls change
+        # nothing
+        margin_x = (x2 - x1) / 2
+        margin_y = (y2 - y1) / 2
+        area = (x1 - margin_x, y1 - margin_y, x2 + margin_x, y2 + margin_y)
+        self.__culled = area
+
+        shown = {}
+        for item in self.get_items_in_bounds(area):
+            if id(item) in self.__drawn and not isinstance(item, Comment):
+                shown[id(item)] = item
+        if full:
+            previous = [item for item, layer in self.__drawn.values()]
+        else:
+            previous = list(self.__shown.values())
+        for item in previous:
+            if id(item) not in shown and not isinstance(item, Comment) \
+                    and item.get_parent() is not None:
+                item.remove()
+
+        detailed = self.is_detailed()
+        for key, item in shown.items():
+            item.set_detail(detailed)
+            if item.get_parent() is None:
+                self.__drawn[key][1].add_child(item, -1)
+        self.__shown = shown
+        # The connectors change their area with the level of detail
+        self.update_bounds(*[item for item in shown.values()
+                             if isinstance(item, Connector)])
 
     # ----------------------------------------------------------------------
     def change_zoom(self, value):
@@ -341,7 +511,9 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
             zoom = zoom - 0.1
         self.zoom = zoom
         self.set_scale(self.zoom)
-        self.update_flows()
+        # The items shown change with the scale, and the level of detail
+        # of the others changes when they are shown
+        self.__cull(force=True)
         self.set_modified(True)
 
     # ----------------------------------------------------------------------
@@ -373,8 +545,6 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         logging.debug(r"Diagram.align_top() chamado")
         diagram_control = DiagramControl(self)
         diagram_control.align("TOP")
-        self.update_flows()
-        self.redraw()
         logging.debug(r"Diagram.align_top() - atualização visual concluída")
 
     # ----------------------------------------------------------------------
@@ -385,8 +555,6 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         logging.debug(r"Diagram.align_bottom() chamado")
         diagram_control = DiagramControl(self)
         diagram_control.align("BOTTOM")
-        self.update_flows()
-        self.redraw()
         logging.debug(r"Diagram.align_bottom() - atualização visual concluída")
 
     # ----------------------------------------------------------------------
@@ -397,8 +565,6 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         logging.debug(r"Diagram.align_left() chamado")
         diagram_control = DiagramControl(self)
         diagram_control.align("LEFT")
-        self.update_flows()
-        self.redraw()
         logging.debug(r"Diagram.align_left() - atualização visual concluída")
 
     # ----------------------------------------------------------------------
@@ -409,8 +575,6 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         logging.debug(r"Diagram.align_right() chamado")
         diagram_control = DiagramControl(self)
         diagram_control.align("RIGHT")
-        self.update_flows()
-        self.redraw()
         logging.debug(r"Diagram.align_right() - atualização visual concluída")
 
     # ----------------------------------------------------------------------
@@ -461,8 +625,6 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         logging.debug(r"Diagram.delete() chamado")
         diagram_control = DiagramControl(self)
         diagram_control.delete()
-        self.update_flows()
-        self.redraw()
         logging.debug(r"Diagram.delete() - atualização visual concluída")
 
     # ----------------------------------------------------------------------
@@ -493,8 +655,6 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
         logging.debug(r"Diagram.paste() chamado")
         diagram_control = DiagramControl(self)
         diagram_control.paste()
-        self.update_flows()
-        self.redraw()
         logging.debug(r"Diagram.paste() - atualização visual concluída")
 
     # ----------------------------------------------------------------------
@@ -539,12 +699,17 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
     # ----------------------------------------------------------------------
     def deselect_all(self):
         for key in self.blocks:
-            self.blocks[key].is_selected = False
+            if getattr(self.blocks[key], 'is_selected', False):
+                self.blocks[key].is_selected = False
+                self.mark_dirty(self.blocks[key])
         for conn in self.connectors:
-            conn.is_selected = False
+            if getattr(conn, 'is_selected', False):
+                conn.is_selected = False
+                self.mark_dirty(conn)
         for comment in self.comments:
-            if hasattr(comment, 'is_selected'):
+            if getattr(comment, 'is_selected', False):
                 comment.is_selected = False
+                self.mark_dirty(comment)
 
     # ----------------------------------------------------------------------
     def select_all(self):
@@ -578,7 +743,9 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
                 continue
             pos_x, pos_y = self.blocks[key].get_position()
             x, y = self.check_limit(x, y, pos_x, pos_y)
+            self.start_move(self.blocks[key])
             self.blocks[key].move(x, y)
+            self.mark_dirty(self.blocks[key], connectors=True)
 
         for comment in self.comments:
             if not hasattr(comment, 'is_selected') or not comment.is_selected:
@@ -587,7 +754,7 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
                 pos_x, pos_y = comment.get_position()
                 x, y = self.check_limit(x, y, pos_x, pos_y)
                 comment.move(x, y)
-        self.update_flows()
+                self.mark_dirty(comment)
 
     # ----------------------------------------------------------------------
     def collapse(self, state):
@@ -595,7 +762,7 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
             if not self.blocks[key].is_selected:
                 continue
             self.blocks[key].is_collapsed = state
-        self.update_flows()
+            self.mark_dirty(self.blocks[key], connectors=True)
 
     # ---------------------------------------------------------------------
     def check_limit(self, x, y, block_pos_x, block_pos_y):
@@ -628,6 +795,8 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
             Parameters:
                 * **state**
         """
+        if state and self.defer("set_modified"):
+            return
         self.modified = state
         if hasattr(self.main_window, 'work_area') and self.main_window.work_area is not None:
             self.main_window.work_area.rename_diagram(self)
@@ -635,11 +804,12 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
     # ---------------------------------------------------------------------
     def redraw(self):
         """
-        This method redraw the diagram.
+        This method redraw the diagram. Widgets are created for the new
+        models, and only the items added or removed since the last redraw
+        change on the canvas.
         """
-        # First, remove all items from the diagram
-        while self.get_root_item().get_n_children() != 0:
-            self.get_root_item().remove_child(0)
+        if self.defer("redraw"):
+            return
         self.__draw_grid()
 
         # Check diagram content
@@ -663,8 +833,8 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
                 conn = Connector(self, outb, connector.output_port)
                 conn.input = self.blocks[connector.input.id]
                 conn.input_port = connector.input_port
+                self.replace_connection(connector, conn, i)
                 connector = conn
-                self.connectors[i] = conn
 
             if connector.output:
                 if  connector.output.id not in self.blocks or \
@@ -672,7 +842,7 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
                     to_remove.append(connector)
             i = i + 1
         for conn in to_remove:
-            self.connectors.remove(conn)
+            self.remove_connection(conn)
 
         # Create Comment Widgets
         i = 0
@@ -699,35 +869,45 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
                 self.comments[i] = comm
             i = i + 1
 
-        # Redraw Blocks
-        for key in self.blocks:
-            block = self.blocks[key]
-            if not isinstance(block, Block):
-                block = Block(self, self.blocks[key])
-                self.blocks[key] = block
-            self.get_root_item().add_child(block, -1)
-            block.adjust_position()
-        i = 0
-
-        # Redraw Connections
+        # Items of the diagram and their layers
+        items = {}
+        for block in self.blocks.values():
+            items[id(block)] = (block, self.__block_layer)
         for connector in self.connectors:
-            if not isinstance(connector, Connector) and connector.output:
-                outb = self.blocks[connector.output.id]
-                conn = Connector(self, outb, connector.output_port)
-                conn.input = self.blocks[connector.input.id]
-                conn.input_port = connector.input_port
-                connector = conn
-                self.connectors[i] = conn
             if isinstance(connector, GooCanvas.CanvasItem):
-                self.get_root_item().add_child(connector, -1)
-            i = i + 1
-
-        # Redraw Comments
+                items[id(connector)] = (connector, self.__connector_layer)
         for comment in self.comments:
-            self.get_root_item().add_child(comment, -1)
-            comment.adjust_position()
+            items[id(comment)] = (comment, self.__comment_layer)
+
+        # Remove the items deleted from the diagram
+        for key, (item, layer) in list(self.__drawn.items()):
+            if key not in items or items[key][0] is not item:
+                del self.__drawn[key]
+                self.__shown.pop(key, None)
+                if item.get_parent() is not None:
+                    item.remove()
+        # and from the index, with the models replaced by their widgets
+        self.forget_bounds(*[item for key, item in self._spatial_items.items()
+                             if key not in items or items[key][0] is not item])
+
+        # Add the new ones. Blocks and connectors go on the canvas when
+        # they are near the visible area.
+        added = []
+        for key, (item, layer) in items.items():
+            if key in self.__drawn:
+                continue
+            if item.get_parent() is not None:
+                item.remove()
+            if isinstance(item, Comment):
+                layer.add_child(item, -1)
+            self.__drawn[key] = (item, layer)
+            added.append(item)
+            if hasattr(item, "adjust_position"):
+                item.adjust_position()
 
         self.update_flows()
+        self.update_bounds(*added)
+        self.__cull(full=True)
 
     # ----------------------------------------------------------------------
     def show_block_menu(self, block, event):
@@ -741,6 +921,6 @@ class Diagram(GooCanvas.Canvas, DiagramModel):
             event: O evento que disparou a alternância (opcional)
         """
         self.show_grid = not self.show_grid
-        self.redraw()
+        self.__draw_grid()
 
 # ----------------------------------------------------------------------
@@ -100,6 +100,8 @@ class Menu(Gtk.MenuBar):
         # Cria sub menu
         insert_menu = Gtk.Menu()
         self.block_menu = Gtk.Menu()
+        # block type -> menu item
+        self.block_items = {}
         blocks = self.create_menu(_("Block"), None, insert_menu, None)
         blocks.set_submenu(self.block_menu)
         insert_menu.append(Gtk.SeparatorMenuItem())
@@ -213,54 +215,69 @@ class Menu(Gtk.MenuBar):
     def update_blocks(self, blocks):
         for widget in self.block_menu.get_children():
             self.block_menu.remove(widget)
+        self.block_items = {}
 
-        block_list = []
-        # Copy the list to sort
+        # time to populate
         for key in blocks:
-            instance = blocks[key]
-            block_list.append(instance)
+            self.__append_block(blocks[key])
 
-        # time to populate
-        for block in block_list:
-            # first, the language submenu
-            language_menu_item = self.__get_child_by_name(
-                self.block_menu, block.language)
-            if language_menu_item is None:
-                language_menu_item = Gtk.MenuItem.new_with_label(block.language)
-                language_menu_item.set_name(block.language)
-                self.block_menu.append(language_menu_item)
-                language_menu = Gtk.Menu()
-                language_menu_item.set_submenu(language_menu)
-            else:
-                language_menu = language_menu_item.get_submenu()
+        self.block_menu.show_all()
 
-            extension_menu_item = self.__get_child_by_name(
-                language_menu, block.extension)
-            if extension_menu_item is None:
-                extension_menu_item = Gtk.MenuItem.new_with_label(block.extension)
-                extension_menu_item.set_name(block.extension)
-                language_menu.append(extension_menu_item)
-                extension_menu = Gtk.Menu()
-                extension_menu_item.set_submenu(extension_menu)
-            else:
-                extension_menu = extension_menu_item.get_submenu()
+    # ----------------------------------------------------------------------
+    def add_block(self, block):
+        """
+        This method add a block to the menu, replacing the one with the
+        same type.
 
-            group_menu_item = self.__get_child_by_name(
-                extension_menu, block.group)
-            if group_menu_item is None:
-                group_menu_item = Gtk.MenuItem.new_with_label(block.group)
-                group_menu_item.set_name(block.group)
-                extension_menu.append(group_menu_item)
-                group_menu = Gtk.Menu()
-                group_menu_item.set_submenu(group_menu)
-            else:
-                group_menu = group_menu_item.get_submenu()
+            Parameters:
+                block: The block to add.
+        """
+        self.remove_block(block.type)
+        self.__append_block(block)
+        self.block_menu.show_all()
 
-            menu_item = Gtk.MenuItem.new_with_label(block.type)
-            group_menu.append(menu_item)
-            menu_item.connect("activate", self.__add_block, block)
+    # ----------------------------------------------------------------------
+    def remove_block(self, block_type):
+        """
+        This method remove a block from the menu. Empty submenus are
+        removed too.
 
-        self.block_menu.show_all()
+            Parameters:
+                block_type: Type of the block to remove.
+        """
+        menu_item = self.block_items.pop(block_type, None)
+        if menu_item is None:
+            return
+        menu = menu_item.get_parent()
+        menu.remove(menu_item)
+        while menu is not self.block_menu and not menu.get_children():
+            owner = menu.get_attach_widget()
+            menu = owner.get_parent()
+            menu.remove(owner)
+
+    # ----------------------------------------------------------------------
+    def __get_submenu(self, menu, name):
+        menu_item = self.__get_child_by_name(menu, name)
+        if menu_item is not None:
+            return menu_item.get_submenu()
+        menu_item = Gtk.MenuItem.new_with_label(name)
+        menu_item.set_name(name)
+        menu.append(menu_item)
+        submenu = Gtk.Menu()
+        menu_item.set_submenu(submenu)
+        return submenu
+
+    # ----------------------------------------------------------------------
+    def __append_block(self, block):
+        # language, extension and group submenus
+        language_menu = self.__get_submenu(self.block_menu, block.language)
+        extension_menu = self.__get_submenu(language_menu, block.extension)
+        group_menu = self.__get_submenu(extension_menu, block.group)
+
+        menu_item = Gtk.MenuItem.new_with_label(block.type)
+        group_menu.append(menu_item)
+        menu_item.connect("activate", self.__add_block, block)
+        self.block_items[block.type] = menu_item
 
     # ----------------------------------------------------------------------
     def __add_block(self, widget, data):
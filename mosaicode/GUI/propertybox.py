@@ -172,7 +172,13 @@ class PropertyBox(Gtk.VBox):
         """
         self.__recursive_search(self.vbox)
         if self.block:
-            self.block.set_properties(self.properties)
+            diagram = getattr(self.block, "diagram", None)
+            if diagram is None:
+                self.block.set_properties(self.properties)
+                return
+            # Recorded in the history of the diagram
+            from mosaicode.control.diagramcontrol import DiagramControl
+            DiagramControl(diagram).set_properties(self.block, self.properties)
 
     # ----------------------------------------------------------------------
     def notify_comment(self, widget: Optional[Any] = None, data: Optional[Any] = None) -> None:
@@ -76,6 +76,9 @@ class WorkArea(Gtk.Notebook):
 
         self.remove_page(position)
         self.diagrams.pop(position)
+        # The changes not saved are dropped
+        if diagram._journal is not None:
+            diagram._journal.discard()
         return True
 
     # ----------------------------------------------------------------------
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+"""
+This module contains the BatchGenerator class and the ``mosaicode-gen``
+command, which generates the source code of diagrams without GTK.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from mosaicode.system import System as System
+from mosaicode.control.codegenerator import CodeGenerator
+from mosaicode.model.diagrammodel import DiagramModel
+from mosaicode.persistence.diagrampersistence import DiagramPersistence
+
+
+class BatchGenerator:
+    """
+    This class contains methods to generate code from diagram files.
+    """
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def load(cls, file_name: str,
+             template: Optional[str] = None) -> Optional[DiagramModel]:
+        """
+        This method loads a diagram file into a DiagramModel and selects
+        its code template.
+
+        Args:
+            file_name: Path to the diagram file
+            template: Code template type used when the diagram has none
+
+        Returns:
+            The diagram or None if it could not be loaded
+        """
+        diagram = DiagramModel()
+        diagram.file_name = str(file_name)
+        if not DiagramPersistence.load_model(diagram):
+            return None
+        if diagram.code_template is not None:
+            return diagram
+
+        code_templates = System.get_code_templates(diagram.language)
+        if template is not None:
+            if template not in code_templates:
+                System.log("Code Template " + template + " not found")
+                return None
+            diagram.code_template = deepcopy(code_templates[template])
+            return diagram
+
+        template_list = [key for key in sorted(code_templates)
+                         if code_templates[key].language == diagram.language]
+        if len(template_list) == 0:
+            System.log("Generator not available for the language " +
+                       str(diagram.language) + ".")
+            return None
+        if len(template_list) > 1:
+            System.log("Using code template " + template_list[0] +
+                       " for " + diagram.file_name)
+        diagram.code_template = deepcopy(code_templates[template_list[0]])
+        return diagram
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def generate(cls, file_name: str, output_dir: str,
+                 template: Optional[str] = None) -> Tuple[str, bool, str]:
+        """
+        This method generates the code of a diagram file into
+        ``output_dir/<patch name>/``.
+
+        Args:
+            file_name: Path to the diagram file
+            output_dir: Directory where the code is saved
+            template: Code template type used when the diagram has none
+
+        Returns:
+            Tuple of (file name, success, message)
+        """
+        diagram = cls.load(file_name, template)
+        if diagram is None:
+            return file_name, False, "Could not load the diagram"
+
+        dir_name = Path(output_dir) / diagram.patch_name
+        generator = CodeGenerator(diagram, str(dir_name) + os.sep)
+        files: Dict[str, str] = generator.generate_code()
+        if len(files) == 0:
+            return file_name, False, "No code generated"
+
+        try:
+            dir_name.mkdir(parents=True, exist_ok=True)
+            for key in files:
+                with open(dir_name / key, 'w') as code_file:
+                    code_file.write(files[key])
+        except (IOError, OSError) as error:
+            return file_name, False, str(error)
+        return file_name, True, str(dir_name)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def validate(cls, file_name: str) -> List[str]:
+        """
+        This method checks a diagram file against the loaded extensions:
+        block and code template types, connection ports and cycles.
+
+        Args:
+            file_name: Path to the diagram file
+
+        Returns:
+            List of error messages, empty if the diagram is valid
+        """
+        # JSON or binary, as the diagram is loaded
+        try:
+            with DiagramPersistence.open_data(file_name) as data:
+                if data.get("data") != "DIAGRAM":
+                    return ["Not a diagram file"]
+                language = data.get("language") or None
+                template_data = data.get("code_template") or {}
+                block_data = list(data.get("blocks", []))
+                connection_data = list(data.get("connections", []))
+        except (IOError, OSError, ValueError) as error:
+            return [str(error)]
+
+        errors: List[str] = []
+        system_blocks = System.get_blocks(language)
+        blocks = {}
+        for block in block_data:
+            block_type = block.get("type")
+            if block_type not in system_blocks:
+                errors.append("Block " + str(block_type) + " not found")
+                continue
+            blocks[int(block["id"])] = system_blocks[block_type]
+
+        successors: Dict[int, List[int]] = {}
+        in_degree: Dict[int, int] = {}
+        for block_id in blocks:
+            successors[block_id] = []
+            in_degree[block_id] = 0
+        for conn in connection_data:
+            try:
+                from_id = int(conn["from_block"])
+                to_id = int(conn["to_block"])
+                from_out = int(conn["from_out"])
+                to_in = int(conn["to_in"])
+            except (KeyError, TypeError, ValueError):
+                errors.append("Invalid connection " + str(conn))
+                continue
+            if from_id not in blocks or to_id not in blocks:
+                errors.append("Connection to a missing block: " +
+                              str(from_id) + " -> " + str(to_id))
+                continue
+            output_ports = blocks[from_id].ports
+            input_ports = blocks[to_id].ports
+            if not 0 <= from_out < len(output_ports) or \
+                    cls.__port_info(output_ports[from_out])[0]:
+                errors.append("Invalid output port " + str(from_out) +
+                              " in block " + str(from_id))
+                continue
+            if not 0 <= to_in < len(input_ports) or \
+                    not cls.__port_info(input_ports[to_in])[0]:
+                errors.append("Invalid input port " + str(to_in) +
+                              " in block " + str(to_id))
+                continue
+            if cls.__port_info(output_ports[from_out])[1] != \
+                    cls.__port_info(input_ports[to_in])[1]:
+                errors.append("Connection types mismatch: " +
+                              str(from_id) + " -> " + str(to_id))
+            successors[from_id].append(to_id)
+            in_degree[to_id] += 1
+
+        # Kahn's algorithm: blocks left with inputs belong to a cycle
+        queue = [block_id for block_id in in_degree if in_degree[block_id] == 0]
+        while queue:
+            for target in successors[queue.pop()]:
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    queue.append(target)
+        cycle = [str(block_id) for block_id in in_degree if in_degree[block_id] > 0]
+        if cycle:
+            errors.append("Cycle detected between blocks: " + ", ".join(cycle))
+
+        code_templates = System.get_code_templates(language)
+        template_type = template_data.get("type")
+        if template_type is not None:
+            if template_type not in code_templates:
+                errors.append("Code Template " + template_type + " not found")
+        else:
+            if not any(code_templates[key].language == language
+                       for key in code_templates):
+                errors.append("Generator not available for the language " +
+                              str(language) + ".")
+        return errors
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __port_info(cls, port) -> Tuple[bool, str]:
+        """
+        Get (is input, type) of a registry port, loaded or still a dict.
+        """
+        if isinstance(port, dict):
+            return str(port.get("conn_type", "INPUT")).upper() == "INPUT", \
+                port.get("type", "")
+        return port.is_input(), port.type
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def generate_all(cls, file_names: List[str], output_dir: str,
+                     template: Optional[str] = None,
+                     jobs: Optional[int] = None) -> List[Tuple[str, bool, str]]:
+        """
+        This method generates the code of many diagram files, in parallel
+        when more than one job is allowed.
+
+        Args:
+            file_names: Paths to the diagram files
+            output_dir: Directory where the code is saved
+            template: Code template type used when a diagram has none
+            jobs: Number of worker processes (defaults to the CPU count)
+
+        Returns:
+            List of (file name, success, message), in the given order
+        """
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        jobs = max(1, min(jobs, len(file_names)))
+        if jobs == 1:
+            cls._init_worker()
+            return [cls.generate(name, output_dir, template)
+                    for name in file_names]
+
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 initializer=cls._init_worker) as executor:
+            futures = [executor.submit(cls.generate, name, output_dir, template)
+                       for name in file_names]
+            return [future.result() for future in futures]
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def _init_worker(cls) -> None:
+        """
+        Create the System of a worker process. The extensions of each
+        language are loaded once, by the first diagram using it.
+        """
+        System()
+
+
+# ----------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of the ``mosaicode-gen`` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog="mosaicode-gen",
+        description="Generate the source code of Mosaicode diagrams.")
+    parser.add_argument('file', type=str, nargs='+',
+                        help="Diagram files (.mscd)")
+    parser.add_argument('-o', '--output-dir', type=str, default=".",
+                        help="Directory where the code is saved")
+    parser.add_argument('-t', '--template', type=str, default=None,
+                        help="Code template type for diagrams without one")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of worker processes")
+    parser.add_argument('-s', '--socket', type=str, default=None,
+                        help="Send the diagrams to the mosaicode-gend daemon "
+                             "listening on this socket")
+    args = parser.parse_args(argv)
+
+    file_names = [str(Path(name).resolve()) for name in args.file]
+    results = None
+    if args.socket is not None:
+        from mosaicode.control.generationdaemon import GenerationDaemon
+        output_dir = str(Path(args.output_dir).resolve())
+        try:
+            responses = GenerationDaemon.request(
+                args.socket,
+                [{"command": "generate", "file": name,
+                  "output_dir": output_dir, "template": args.template}
+                 for name in file_names])
+            results = [(name, response.get("success", False),
+                        response.get("message", ""))
+                       for name, response in zip(file_names, responses)]
+        except (OSError, ValueError) as error:
+            print("Daemon not available (" + str(error) +
+                  "), generating locally", file=sys.stderr)
+    if results is None:
+        results = BatchGenerator.generate_all(
+            file_names, args.output_dir, args.template, args.jobs)
+
+    status = 0
+    for file_name, success, message in results:
+        if success:
+            print(file_name + ": " + message)
+        else:
+            print(file_name + ": " + message, file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# ----------------------------------------------------------------------
@@ -4,14 +4,13 @@
 This module contains the BlockControl class.
 """
 import ast
-import copy
 import inspect  # For module inspect
 from pathlib import Path
 import logging
 import pkgutil  # For dynamic package load
 from typing import Dict, List, Optional, Any
 
-from mosaicode.model.port import Port
+from mosaicode.model.port import Port, PortRef
 from mosaicode.persistence.blockpersistence import BlockPersistence
 from mosaicode.model.blockmodel import BlockModel
 
@@ -42,10 +41,13 @@ class BlockControl:
         in_port: int = 0
         out_port: int = 0
         new_ports: List[Port] = []
+        # The port list may be shared with the registry block: only
+        # replace it when ports are created or dropped
+        changed: bool = False
         
         for port in block.ports:
             # Se a porta já é um objeto Port, apenas ajustar os índices
-            if isinstance(port, Port):
+            if isinstance(port, (Port, PortRef)):
                 port.index = i
                 if port.is_input():
                     port.type_index = in_port
@@ -58,6 +60,7 @@ class BlockControl:
                 continue
                 
             # Se é um dicionário (formato antigo), processar como antes
+            changed = True
             if not isinstance(port, dict):
                 from mosaicode.system import System
                 System.log("Error Loading a Block: Port is not a dictionary?");
@@ -67,12 +70,12 @@ class BlockControl:
                 System.log("Error Loading a Block: Port should have a type");
                 continue
             port_type: str = port["type"]
-            # Create a copy from the port instance loaded in the System
+            # Create a block port sharing the port type loaded in the System
             if port_type not in ports:
                 from mosaicode.system import System
                 System.log("Error Loading a Block: Port is not present in System");
                 continue
-            new_port: Port = copy.deepcopy(ports[port_type])
+            new_port: PortRef = PortRef(ports[port_type].get_port_type())
 
             if "conn_type" not in port:
                 port["conn_type"] = Port.INPUT
@@ -93,7 +96,8 @@ class BlockControl:
             new_ports.append(new_port)
             i += 1
         block.maxIO = max(in_port, out_port)
-        block.ports = new_ports
+        if changed:
+            block.ports = new_ports
     # ----------------------------------------------------------------------
     @classmethod
     def load(cls, file_name: str) -> Optional['BlockModel']:
@@ -3,42 +3,90 @@
 This module contains the CodeGenerator class.
 """
 from mosaicode.system import System as System
+from mosaicode.utils.wildcard_template import WildcardTemplate
 import gettext
-
-import gi
-gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk
+import weakref
 import logging
 
+# Returned by _port_field() for attributes the port does not have
+_MISSING = object()
+
+
+def _port_field(port, name):
+    """
+    Get a port attribute referenced by $port[name]$. Block ports (PortRef)
+    have no __dict__: their attributes are listed in FIELDS.
+    """
+    fields = getattr(type(port), "FIELDS", None)
+    if fields is not None:
+        return getattr(port, name) if name in fields else _MISSING
+    return port.__dict__.get(name, _MISSING)
+
 
 class CodeGenerator():
     """
     This class contains methods related the CodeGenerator class.
     """
 
+    # Expanded code of each block, per diagram:
+    # diagram -> {block id: (fingerprint, gen_codes, connections code)}
+    __block_cache = weakref.WeakKeyDictionary()
+
     # ----------------------------------------------------------------------
-    def __init__(self, diagram=None):
+    def __init__(self, diagram=None, dir_name=None):
 
         self.__diagram = diagram
+        # Value of $dir_name$, taken from the preferences if not given
+        self.__dir_name = dir_name
+        self.__cache = CodeGenerator.__get_block_cache(diagram)
         self.__block_list = []
         self.__connections = []
         self.__codes = {}
+        # Blocks bucketed by weight, filled by __sort_block_list
+        self.__levels = []
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __get_block_cache(cls, diagram):
+        """
+        This method returns the block code cache of the diagram.
+        """
+        if diagram is None:
+            return {}
+        try:
+            if diagram not in cls.__block_cache:
+                cls.__block_cache[diagram] = {}
+            return cls.__block_cache[diagram]
+        except TypeError:
+            # Diagram can not be weak referenced: do not cache
+            return {}
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def clear_cache(cls, diagram=None):
+        """
+        This method discards the cached block codes of a diagram, or of
+        every diagram if none is given.
+        """
+        if diagram is None:
+            cls.__block_cache.clear()
+            return
+        try:
+            cls.__block_cache.pop(diagram, None)
+        except TypeError:
+            pass
 
     # ----------------------------------------------------------------------
     def __prepare_block_list(self):
         """
         This method prepare the blocks to code generation.
         """
+        self.__block_list = []
         for block_key in self.__diagram.blocks:
             block = self.__diagram.blocks[block_key]
             block.weight = 0
-            block.connections = []
-
             # Listing all connections that the block is output
-            for connection in self.__diagram.connectors:
-                if connection.output != block:
-                    continue
-                block.connections.append(connection)
+            block.connections = self.__diagram.get_outgoing(block.id)
             self.__block_list.append(block)
         return True
 
@@ -46,69 +94,118 @@ class CodeGenerator():
     def __sort_block_list(self):
         """
         This method sorts the blocks to code generation.
+
+        The weight of each block is the length of the longest path that
+        reaches it, computed in the topological order kept by the diagram
+        (or with Kahn's algorithm over the connection net if the diagram
+        has none). Blocks are then grouped in buckets, one per weight.
+
+            Returns:
+                * **Types** (:class:`boolean<boolean>`): False if the
+                  diagram has a cycle.
         """
-        # adjust the weight of every blocks depending on the connection net
-        modification = True
-        while modification:
-            modification = False
-            for block in self.__block_list:
+        blocks_by_id = {}
+        for block in self.__block_list:
+            blocks_by_id[block.id] = block
+
+        order = self.__diagram.get_topological_order()
+        if order is not None:
+            for block_id in order:
+                block = blocks_by_id.get(block_id)
+                if block is None:
+                    continue
                 for connection in block.connections:
-                    for block_target in self.__block_list:
-                        if block_target != connection.input:
-                            continue
-                        weight = block.weight
-                        if block_target.weight < weight + 1:
-                            block_target.weight = weight + 1
-                            modification = True
+                    if connection.input is None:
+                        continue
+                    block_target = blocks_by_id.get(connection.input.id)
+                    if block_target is not None and \
+                            block_target.weight < block.weight + 1:
+                        block_target.weight = block.weight + 1
+            return self.__fill_levels()
+
+        successors = {}
+        in_degree = {}
+        for block_id in blocks_by_id:
+            successors[block_id] = []
+            in_degree[block_id] = 0
+        for block in self.__block_list:
+            for connection in block.connections:
+                if connection.input is None:
+                    continue
+                target = connection.input.id
+                if target not in blocks_by_id:
+                    continue
+                successors[block.id].append(target)
+                in_degree[target] += 1
+
+        queue = [block_id for block_id in blocks_by_id
+                 if in_degree[block_id] == 0]
+        visited = 0
+        while queue:
+            block_id = queue.pop()
+            visited += 1
+            weight = blocks_by_id[block_id].weight
+            for target in successors[block_id]:
+                block_target = blocks_by_id[target]
+                if block_target.weight < weight + 1:
+                    block_target.weight = weight + 1
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    queue.append(target)
+
+        self.__levels = []
+        if visited < len(blocks_by_id):
+            cycle = [str(block_id) for block_id in blocks_by_id
+                     if in_degree[block_id] > 0]
+            System.log("Cycle detected between blocks: " + ", ".join(cycle))
+            return False
+        return self.__fill_levels()
+
+    # ----------------------------------------------------------------------
+    def __fill_levels(self):
+        """
+        This method groups the blocks by weight, keeping the diagram order
+        inside each weight level.
+        """
+        self.__levels = []
+        for block in self.__block_list:
+            while len(self.__levels) <= block.weight:
+                self.__levels.append([])
+            self.__levels[block.weight].append(block)
         return True
 
     # ----------------------------------------------------------------------
     def __generate_block_code_parts(self):
         """
-        This method sorts the blocks to code generation.
+        This method generates the code of every block, level by level.
         """
         if self.__diagram.code_template is None:
             return False
+        self.__connections = []
         # Create an array of codes to each code part
         for key in self.__diagram.code_template.code_parts:
             self.__codes[key] = []
 
-        active_weight = 0
-        # The maxWeight is, in the worst case, the block list lenght
-        max_weight = len(self.__block_list)
-        while active_weight <= max_weight:
-            if len(self.__block_list) == 0:
-                break
-            for block in self.__block_list:
-                if block.weight == active_weight:
-                    # If it is your time, lets generate your code and remove you
-                    self.__generate_block_code(block)
-            active_weight += 1
+        for level in self.__levels:
+            for block in level:
+                self.__generate_block_code(block)
         return True
 
     # ----------------------------------------------------------------------
     def __generate_port_var_name_code(self, block, port):
         """
-        This method generate the block code.
+        This method generate the port variable name.
         """
-        value = port.var_name
-
-        # Replace all port[stuff] values
-        for attribute in port.__dict__:
-            my_key = "$port[" + attribute + "]$"
-            my_value = str(port.__dict__[attribute])
-            my_value = my_value.replace(" ", "_")
-            my_value = my_value.lower()
-            value = value.replace(my_key, my_value)
+        def resolve(name, argument):
+            if name == "port":
+                value = _port_field(port, argument)
+                if value is not _MISSING:
+                    return str(value).replace(" ", "_").lower()
+            if name == "block" and argument in block.__dict__:
+                return str(block.__dict__[argument]).replace(" ", "_")
+            return None
 
-        # Replace all block[stuff] values
-        for attribute in block.__dict__:
-            my_key = "$block[" + attribute + "]$"
-            my_value = str(block.__dict__[attribute])
-            my_value = my_value.replace(" ", "_")
-            value = value.replace(my_key, my_value)
-
-        return value
+        return WildcardTemplate.compile(port.var_name).render(resolve)
 
     # ----------------------------------------------------------------------
     def __generate_block_code(self, block):
@@ -120,34 +217,15 @@ class CodeGenerator():
         logger.debug(f"[DEBUG] __generate_block_code - bloco id={getattr(block, 'id', None)}, type={getattr(block, 'type', type(block))}, label={getattr(block, 'label', None)}")
         logger.debug(f"[DEBUG] __generate_block_code - block.codes keys: {list(block.codes.keys()) if hasattr(block, 'codes') else 'N/A'}")
 
-        # Empty the previous generated codes, if exist
-        block.gen_codes = {}
-
-        # For each code part, we need to replace wildcards
-        for key in block.codes:
-            logger.debug(f"[DEBUG] __generate_block_code - processando code part: {key}")
-            block.gen_codes[key] = block.codes[key]
-
-            # First we replace in ports
-            for port in block.ports:
-                my_key = "$port[" + port.name + "]$"
-                my_value = self.__generate_port_var_name_code(block, port)
-                block.gen_codes[key] = block.gen_codes[key].replace(
-                    my_key, my_value)
-
-            # Then we replace object attributes by their values
-            for attribute in block.__dict__:
-                my_key = "$" + attribute + "$"
-                value = str(block.__dict__[attribute])
-                block.gen_codes[key] = block.gen_codes[key].replace(
-                    my_key, value)
-
-            # Then we replace properties by their values
-            for prop in block.get_properties():
-                my_key = "$prop[" + prop.get("name") + "]$"
-                value = str(prop.get("value"))
-                block.gen_codes[key] = block.gen_codes[key].replace(
-                    my_key, value)
+        # Reuse the previous expansion if nothing it depends on has changed
+        fingerprint = self.__fingerprint(block)
+        cached = self.__cache.get(block.id)
+        if cached is not None and cached[0] == fingerprint:
+            block.gen_codes = dict(cached[1])
+            connections = cached[2]
+        else:
+            gen_codes, connections = self.__expand_block_code(block)
+            self.__cache[block.id] = (fingerprint, dict(gen_codes), connections)
 
         # Append it all to Generator Codes
         for key in self.__codes:
@@ -156,91 +234,194 @@ class CodeGenerator():
             else:
                 self.__codes[key].append('')
 
-        connections = ""
-        print(block.connections)
+        self.__connections.append(connections)
+        return True
+
+    # ----------------------------------------------------------------------
+    def __expand_block_code(self, block):
+        """
+        This method replaces the wildcards of the block codes and of its
+        output connections.
+
+            Returns:
+                * **Types** (:class:`tuple<tuple>`): generated codes and
+                  connections code.
+        """
+        logger = logging.getLogger("mosaicode.mosaicode.control.codegenerator")
+        # Empty the previous generated codes, if exist
+        block.gen_codes = {}
+
+        # Wildcard values are computed at most once per block
+        port_values = {}
+        properties = None
+
+        def resolve(name, argument):
+            nonlocal properties
+            # $port[name]$ is replaced by the port variable name
+            if name == "port" and argument is not None:
+                if argument not in port_values:
+                    port_values[argument] = None
+                    for port in block.ports:
+                        if port.name == argument:
+                            port_values[argument] = \
+                                self.__generate_port_var_name_code(block, port)
+                            break
+                return port_values[argument]
+            # $prop[name]$ is replaced by the property value
+            if name == "prop" and argument is not None:
+                if properties is None:
+                    properties = {}
+                    for prop in block.get_properties():
+                        properties.setdefault(prop.get("name"),
+                                              str(prop.get("value")))
+                return properties.get(argument)
+            # $attribute$ is replaced by the object attribute value
+            if argument is None and name in block.__dict__:
+                return str(block.__dict__[name])
+            return None
+
+        # For each code part, we need to replace wildcards
+        for key in block.codes:
+            logger.debug(f"[DEBUG] __generate_block_code - processando code part: {key}")
+            template = WildcardTemplate.compile(block.codes[key])
+            block.gen_codes[key] = template.render(resolve)
+
+        connections = []
         for connection in block.connections:
             connection_code = getattr(connection.output_port, 'code', None)
             if connection_code is None:
                 logger.error(f"Porta de saída da conexão não possui atributo 'code': {connection.output_port}")
                 continue
-            # Replace output
-            value = self.__generate_port_var_name_code(
-                connection.output, connection.output_port)
-            connection_code = connection_code.replace("$output$", value)
-            # Replace input
-            value = self.__generate_port_var_name_code(
-                connection.input, connection.input_port)
-            connection_code = connection_code.replace("$input$", value)
-            connections += connection_code
-        print(connections)
-        self.__connections.append(connections)
-        return True
+            values = {}
+
+            def resolve_connection(name, argument):
+                if argument is not None or name not in ("output", "input"):
+                    return None
+                if name not in values:
+                    if name == "output":
+                        values[name] = self.__generate_port_var_name_code(
+                            connection.output, connection.output_port)
+                    else:
+                        values[name] = self.__generate_port_var_name_code(
+                            connection.input, connection.input_port)
+                return values[name]
+
+            template = WildcardTemplate.compile(connection_code)
+            connections.append(template.render(resolve_connection))
+        return block.gen_codes, "".join(connections)
+
+    # ----------------------------------------------------------------------
+    def __wildcard_values(self, code, block, port=None):
+        """
+        This method lists the values of the block and port attributes
+        referenced by the wildcards of a code.
+        """
+        if not isinstance(code, str):
+            return (code,)
+        values = [code]
+        for name, argument in WildcardTemplate.compile(code).wildcards:
+            if argument is None:
+                if name in block.__dict__:
+                    values.append(str(block.__dict__[name]))
+            elif name == "block":
+                values.append(str(block.__dict__.get(argument)))
+            elif name == "port" and port is not None:
+                value = _port_field(port, argument)
+                values.append(str(None if value is _MISSING else value))
+        return tuple(values)
+
+    # ----------------------------------------------------------------------
+    def __fingerprint(self, block):
+        """
+        This method computes a value that changes whenever anything used to
+        expand the block codes changes: label, id, properties, ports,
+        referenced attributes and output connections.
+        """
+        fingerprint = [block.id, block.label]
+        for key in block.codes:
+            fingerprint.append(key)
+            fingerprint.append(self.__wildcard_values(block.codes[key], block))
+        for prop in block.get_properties():
+            fingerprint.append((prop.get("name"), str(prop.get("value"))))
+        for port in block.ports:
+            fingerprint.append((port.name,
+                self.__wildcard_values(port.var_name, block, port)))
+        for connection in block.connections:
+            fingerprint.append((
+                getattr(connection.output_port, 'code', None),
+                self.__wildcard_values(connection.output_port.var_name,
+                                       connection.output,
+                                       connection.output_port),
+                connection.input.id,
+                self.__wildcard_values(connection.input_port.var_name,
+                                       connection.input,
+                                       connection.input_port)))
+        return fingerprint
 
     # ----------------------------------------------------------------------
     def __generate_file_code(self, code):
         """
-        This method generate the block code.
+        This method generate the file code.
         """
         code_template = self.__diagram.code_template
-        # We first substitute data from the code template itself
-        code = code.replace("$author$", System.get_preferences().author)
-        code = code.replace("$license$", System.get_preferences().license)
-        code = code.replace("$dir_name$", System.get_dir_name(self.__diagram))
-        code = code.replace("$command$", code_template.command)
-        code = code.replace("$name$", code_template.name)
-        code = code.replace("$description$", code_template.description)
+        template = WildcardTemplate.compile(code)
 
+        properties = {}
         for prop in code_template.properties:
-            my_key = "$prop[" + prop.get("name") + "]$"
-            value = str(prop.get("value"))
-            code = code.replace(my_key, value)
+            properties.setdefault(prop.get("name"), str(prop.get("value")))
 
-        # Then we substitute the code parts with blocks
-        for key in self.__codes:
-            # Check for single_code generation
-            code_name = "$single_code[" + key + "]$"
-            if code_name in code:
-                temp_header = []
-                temp_code = ""
-
-                for header_code in self.__codes[key]:
-                    if header_code not in temp_header:
-                        temp_header.append(header_code)
-                for header_code in temp_header:
-                    temp_code += header_code
-                code = code.replace(code_name, temp_code)
-            # Check for code generation
-            code_name = "$code[" + key + "]$"
-            if code_name in code:
-                temp_code = ""
-                for x in self.__codes[key]:
-                    temp_code += x
-                code = code.replace(code_name, temp_code)
-            # Check for code + connections generation
-            code_name = "$code[" + key + ", connection]$"
-            if code_name in code:
-                temp_code = ""
+        def join_codes(key, with_connections=None):
+            if with_connections is None:
+                return "".join(self.__codes[key])
+            parts = []
+            if with_connections == "after":
                 for x, y in zip(self.__codes[key], self.__connections):
-                    temp_code += x
-                    temp_code += y
-                code = code.replace(code_name, temp_code)
-
-            # Check for connections + code generation
-            code_name = "$code[connection, " + key + "]$"
-            if code_name in code:
-                temp_code = ""
+                    parts.append(x)
+                    parts.append(y)
+            else:
                 for x, y in zip(self.__connections, self.__codes[key]):
-
-                    temp_code += x
-                    temp_code += y
-                code = code.replace(code_name, temp_code)
-
-        # Replace only connection
-        connection_block = ""
-        for conn in self.__connections:
-            connection_block += conn + "\n"
-        code = code.replace("$connections$", connection_block)
-        return code
+                    parts.append(x)
+                    parts.append(y)
+            return "".join(parts)
+
+        def resolve(name, argument):
+            # We first substitute data from the code template itself
+            if argument is None:
+                if name == "author":
+                    return System.get_preferences().author
+                if name == "license":
+                    return System.get_preferences().license
+                if name == "dir_name":
+                    if self.__dir_name is not None:
+                        return self.__dir_name
+                    return System.get_dir_name(self.__diagram)
+                if name == "command":
+                    return code_template.command
+                if name == "name":
+                    return code_template.name
+                if name == "description":
+                    return code_template.description
+                if name == "connections":
+                    return "".join(conn + "\n" for conn in self.__connections)
+                return None
+            if name == "prop":
+                return properties.get(argument)
+            # Then we substitute the code parts with blocks
+            if name == "single_code" and argument in self.__codes:
+                # Each distinct code only once, in order of appearance
+                return "".join(dict.fromkeys(self.__codes[argument]))
+            if name == "code":
+                if argument in self.__codes:
+                    return join_codes(argument)
+                if argument.endswith(", connection") and \
+                        argument[:-len(", connection")] in self.__codes:
+                    return join_codes(argument[:-len(", connection")], "after")
+                if argument.startswith("connection, ") and \
+                        argument[len("connection, "):] in self.__codes:
+                    return join_codes(argument[len("connection, "):], "before")
+            return None
+
+        return template.render(resolve)
 
     # ----------------------------------------------------------------------
     def generate_code(self):
@@ -254,7 +435,13 @@ class CodeGenerator():
             logger.debug(f"[DEBUG] generate_code - bloco id={getattr(v, 'id', k)}, type={getattr(v, 'type', type(v))}, label={getattr(v, 'label', None)}")
 
         self.__prepare_block_list()
-        self.__sort_block_list()
+        # Forget blocks that are no longer in the diagram
+        for block_id in list(self.__cache):
+            if block_id not in self.__diagram.blocks:
+                del self.__cache[block_id]
+        if not self.__sort_block_list():
+            System.log("Code not generated: the diagram has a cycle")
+            return {}
         self.__generate_block_code_parts()
 
         if self.__diagram.code_template is None:
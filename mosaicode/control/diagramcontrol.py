@@ -4,13 +4,14 @@
 This module contains the DiagramControl class.
 """
 import os
+from contextlib import contextmanager
 import gi
 gi.require_version('Gdk', '3.0')
 from gi.repository import Gdk
 from copy import deepcopy
 from copy import copy
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 import logging
 
 from mosaicode.system import System as System
@@ -19,6 +20,13 @@ from mosaicode.GUI.comment import Comment
 from mosaicode.model.commentmodel import CommentModel
 from mosaicode.model.blockmodel import BlockModel
 from mosaicode.model.connectionmodel import ConnectionModel
+from mosaicode.model.commandhistory import (
+    AddBlock, AddComment, AddConnection, Command, CommandHistory, MoveBlocks,
+    RemoveBlock, RemoveComment, RemoveConnection, SetProperties)
+
+
+class _PasteError(Exception):
+    """A clipboard item could not be pasted: the paste is undone."""
 
 
 class DiagramControl:
@@ -58,18 +66,27 @@ class DiagramControl:
             System.log("Block language is different from diagram language.")
             return False
 
-        self.do("Add Block")
         self.diagram.last_id = max(int(self.diagram.last_id), int(block.id))
         if block.id < 0:
             block.id = self.diagram.last_id
         self.diagram.last_id += 1
         self.diagram.blocks[block.id] = block
+        self.do("Add Block", AddBlock(block))
         # logging.warning(f'[DEBUG] Bloco adicionado com sucesso: {block.type} (ID: {block.id})')
         return True
 
     # ---------------------------------------------------------------------
     def paste(self) -> None:
         logging.warning('[DEBUG] DiagramControl.paste chamado')
+        try:
+            with self.transaction("Paste"):
+                self.__paste()
+        except _PasteError as error:
+            # The transaction removed the items already pasted
+            System.log(str(error))
+
+    # ---------------------------------------------------------------------
+    def __paste(self) -> None:
         replace: Dict[int, BlockModel] = {}
         self.diagram.deselect_all()
         # interact into blocks, add blocks and change their id
@@ -93,7 +110,8 @@ class DiagramControl:
             block.id = -1
             block = self.diagram.main_window.main_control.add_block(block)
             if block is None:
-                return
+                raise _PasteError("Paste failed: block " + str(widget.type) +
+                                  " could not be added")
             replace[widget.id] = block
 
         # interact into connections changing block ids
@@ -153,35 +171,46 @@ class DiagramControl:
     # ---------------------------------------------------------------------
     def cut(self) -> None:
         logging.warning('[DEBUG] DiagramControl.cut chamado')
-        self.do("Cut")
         self.copy()
-        self.delete()
+        self.delete("Cut")
         logging.warning(f'[DEBUG] Clipboard após cut: {self.diagram.main_window.main_control.get_clipboard()}')
         logging.warning(f'[DEBUG] Blocos após cut: {list(self.diagram.blocks.keys())}')
         logging.warning('[DEBUG] DiagramControl.cut finalizado')
 
     # ---------------------------------------------------------------------
-    def delete(self) -> None:
+    def delete(self, name: str = "Delete") -> None:
         """
         This method delete a block or connection.
+
+        Args:
+            name: Name of the action in the history
         """
-        self.do("Delete")
+        with self.transaction(name):
+            self.__delete(name)
+
+    # ----------------------------------------------------------------------
+    def __delete(self, name: str) -> None:
+        commands: List[Command] = []
         for key in self.diagram.blocks.copy():
-            if not self.diagram.blocks[key].is_selected:
+            block = self.diagram.blocks[key]
+            if not block.is_selected:
                 continue
-            del self.diagram.blocks[key]
-        for con in self.diagram.connectors:
+            commands.append(RemoveBlock(block, self.diagram.remove_block(key)))
+        for con in list(self.diagram.connectors):
             if not con.is_selected:
                 continue
-            if con not in self.diagram.connectors:
-                continue
-            self.diagram.connectors.remove(con)
-        for comment in self.diagram.comments:
+            if self.diagram.remove_connection(con):
+                commands.append(RemoveConnection(con))
+        for index in reversed(range(len(self.diagram.comments))):
+            comment = self.diagram.comments[index]
             if not comment.is_selected:
                 continue
-            self.diagram.comments.remove(comment)
+            del self.diagram.comments[index]
+            commands.append(RemoveComment(comment, index))
+        self.do(name, *commands)
 
         self.diagram.deselect_all()
+        self.diagram.update_flows()
         self.diagram.redraw()
 
     # ----------------------------------------------------------------------
@@ -195,9 +224,9 @@ class DiagramControl:
         Returns:
             The created Comment instance or None if failed
         """
-        self.do("Add Comment")
         new_comment: Comment = Comment(self.diagram, comment)
         self.diagram.comments.append(new_comment)
+        self.do("Add Comment", AddComment(new_comment, len(self.diagram.comments) - 1))
         if comment is None:
             new_comment.is_selected = True
             self.diagram.show_comment_property(new_comment)
@@ -215,8 +244,8 @@ class DiagramControl:
         Returns:
             True if connection was added successfully
         """
-        self.do("Add Connection")
-        self.diagram.connectors.append(connection)
+        self.diagram.add_connection(connection)
+        self.do("Add Connection", AddConnection(connection))
         return True
 
     # ----------------------------------------------------------------------
@@ -238,6 +267,11 @@ class DiagramControl:
     # ----------------------------------------------------------------------
     def align(self, alignment: str) -> None:
         logging.warning(f'[DEBUG] DiagramControl.align chamado com alignment={alignment}')
+        with self.transaction("Align"):
+            self.__align(alignment)
+
+    # ----------------------------------------------------------------------
+    def __align(self, alignment: str) -> None:
         top: int = self.diagram.main_window.get_size()[1]
         bottom: int = 0
         left: int = self.diagram.main_window.get_size()[0]
@@ -252,6 +286,7 @@ class DiagramControl:
             if bottom < y: bottom = y
             if left > x: left = x
             if right < x: right = x
+        positions = {}
         for key in self.diagram.blocks:
             if not self.diagram.blocks[key].is_selected:
                 continue
@@ -264,6 +299,9 @@ class DiagramControl:
                 self.diagram.blocks[key].move(left - x, 0)
             if alignment == "RIGHT":
                 self.diagram.blocks[key].move(right - x, 0)
+            positions[key] = ((x, y), self.diagram.blocks[key].get_position())
+        if positions:
+            self.do("Align", MoveBlocks(positions))
         self.diagram.update_flows()
         self.diagram.redraw()
         logging.warning('[DEBUG] DiagramControl.align finalizado')
@@ -280,329 +318,80 @@ class DiagramControl:
             self.diagram.show_grid = status
 
     # ---------------------------------------------------------------------
-    def do(self, new_msg: str) -> None:
+    def set_properties(self, block: Any, data: Dict[str, Any]) -> None:
         """
-        This method do something
-        
+        This method set the properties of a block, recording the change.
+
+        Args:
+            block: The block
+            data: Property values by name
+        """
+        old = block.get_properties()
+        block.set_properties(data)
+        if block.get_properties() is not old:
+            self.do("Set Properties", SetProperties(block, old, block.get_properties()))
+
+    # ---------------------------------------------------------------------
+    @contextmanager
+    def transaction(self, name: str) -> Iterator[None]:
+        """
+        This method groups the changes made inside a with block in a single
+        action of the history, with a single redraw at its end:
+
+            with diagram_control.transaction("Paste"):
+                ...
+
+        The changes are undone if the block raises an exception.
+
+        Args:
+            name: Name of the action
+        """
+        history = CommandHistory(self.diagram)
+        history.begin(name)
+        try:
+            yield
+        except BaseException:
+            deferred = history.end(commit=False)
+            if deferred is not None:
+                self.diagram.redraw()
+            raise
+        deferred = history.end()
+        if not deferred:
+            return
+        # The calls deferred during the transaction, once each
+        if "update_flows" in deferred:
+            self.diagram.update_flows()
+        if "redraw" in deferred:
+            self.diagram.redraw()
+        if "set_modified" in deferred:
+            self.diagram.set_modified(True)
+
+    # ---------------------------------------------------------------------
+    def do(self, new_msg: str, *commands: Command) -> None:
+        """
+        This method records an action already done, as the commands that
+        undo and redo it.
+
         Args:
             new_msg: Action message
+            commands: The changes made by the action
         """
-        # Salvar o estado ANTES da ação para poder desfazer
-        serialized_blocks = {}
-        for block_id, block in self.diagram.blocks.items():
-            # Criar uma cópia serializada do bloco
-            serialized_block = {
-                'id': block.id,
-                'type': block.type,
-                'language': block.language,
-                'x': block.x,
-                'y': block.y,
-                'label': block.label,
-                'color': block.color,
-                'group': block.group,
-                'help': block.help,
-                'version': block.version,
-                'extension': block.extension,
-                'file': block.file,
-                'is_collapsed': block.is_collapsed,
-                'ports': block.ports.copy() if hasattr(block, 'ports') else [],
-                'properties': block.properties.copy() if hasattr(block, 'properties') else [],
-                'codes': block.codes.copy() if hasattr(block, 'codes') else {},
-                'gen_codes': block.gen_codes.copy() if hasattr(block, 'gen_codes') else {},
-                'weight': block.weight,
-                'connections': block.connections.copy() if hasattr(block, 'connections') else [],
-                'maxIO': block.maxIO
-            }
-            serialized_blocks[block_id] = serialized_block
-        
-        # Serializar conectores e comentários
-        serialized_connectors = []
-        for conn in self.diagram.connectors:
-            serialized_conn = {
-                'output': {'id': conn.output.id} if hasattr(conn, 'output') and conn.output else None,
-                'input': {'id': conn.input.id} if hasattr(conn, 'input') and conn.input else None,
-                'output_port': conn.output_port,
-                'input_port': conn.input_port
-            }
-            serialized_connectors.append(serialized_conn)
-        
-        serialized_comments = []
-        for comment in self.diagram.comments:
-            serialized_comment = {
-                'id': comment.id,
-                'x': comment.x,
-                'y': comment.y,
-                'text': comment.text,
-                'color': comment.color
-            }
-            serialized_comments.append(serialized_comment)
-        
-        action: Tuple[Dict[int, Any], List[Any], List[Any], str] = (serialized_blocks,    #0
-                  serialized_connectors,#1
-                  serialized_comments,  #2
-                  new_msg)              #3
-        self.diagram.undo_stack.append(action)
+        CommandHistory(self.diagram).push(new_msg, list(commands))
         self.diagram.set_modified(True)
-        logging.warning(f'[DEBUG] do() - Ação salva: {new_msg}, blocos: {list(serialized_blocks.keys())}, undo_stack: {len(self.diagram.undo_stack)}')
 
     # ---------------------------------------------------------------------
     def undo(self) -> None:
-        logging.warning('[DEBUG] DiagramControl.undo chamado')
-        if len(self.diagram.undo_stack) < 1:
-            logging.warning('[DEBUG] undo_stack vazio')
+        if CommandHistory(self.diagram).undo() is None:
             return
         self.diagram.set_modified(True)
-        
-        # Salvar o estado atual no redo_stack antes de restaurar
-        current_state = self._serialize_current_state("Current State")
-        self.diagram.redo_stack.append(current_state)
-        
-        action: Tuple[Dict[int, Any], List[Any], List[Any], str] = self.diagram.undo_stack.pop()
-        
-        logging.warning(f'[DEBUG] undo() - Blocos antes: {list(self.diagram.blocks.keys())}')
-        logging.warning(f'[DEBUG] undo() - Ação a ser desfeita: {action[3]}')
-        logging.warning(f'[DEBUG] undo() - Dados serializados: {list(action[0].keys())}')
-        
-        # Recriar blocos a partir dos dados serializados
-        serialized_blocks = action[0]
-        self.diagram.blocks = {}
-        for block_id, block_data in serialized_blocks.items():
-            # Criar novo BlockModel a partir dos dados serializados
-            from mosaicode.model.blockmodel import BlockModel
-            new_block = BlockModel()
-            for key, value in block_data.items():
-                if hasattr(new_block, key):
-                    setattr(new_block, key, value)
-            self.diagram.blocks[block_id] = new_block
-            logging.warning(f'[DEBUG] undo() - Bloco recriado: {new_block.type} (ID: {new_block.id})')
-        
-        # Recriar conectores como objetos ConnectionModel
-        serialized_connectors = action[1]
-        self.diagram.connectors = []
-        for conn_data in serialized_connectors:
-            try:
-                # Encontrar os blocos de entrada e saída
-                output_block = None
-                input_block = None
-                if conn_data.get('output') and 'id' in conn_data['output']:
-                    output_id = conn_data['output']['id']
-                    if output_id in self.diagram.blocks:
-                        output_block = self.diagram.blocks[output_id]
-                
-                if conn_data.get('input') and 'id' in conn_data['input']:
-                    input_id = conn_data['input']['id']
-                    if input_id in self.diagram.blocks:
-                        input_block = self.diagram.blocks[input_id]
-                
-                # Criar nova conexão apenas se ambos os blocos existirem
-                if output_block and input_block:
-                    from mosaicode.model.connectionmodel import ConnectionModel
-                    new_connection = ConnectionModel(
-                        diagram=self.diagram,
-                        output=output_block,
-                        output_port=conn_data.get('output_port'),
-                        input=input_block,
-                        input_port=conn_data.get('input_port')
-                    )
-                    self.diagram.connectors.append(new_connection)
-                    logging.warning(f'[DEBUG] undo() - Conexão recriada: {output_block.id} -> {input_block.id}')
-            except Exception as e:
-                logging.warning(f'[DEBUG] undo() - Erro ao recriar conexão: {e}')
-                continue
-        
-        # Recriar comentários
-        serialized_comments = action[2]
-        self.diagram.comments = []
-        for comment_data in serialized_comments:
-            try:
-                from mosaicode.model.commentmodel import CommentModel
-                new_comment = CommentModel()
-                new_comment.id = comment_data.get('id', -1)
-                new_comment.x = comment_data.get('x', 0)
-                new_comment.y = comment_data.get('y', 0)
-                # Definir propriedades se houver texto
-                if 'text' in comment_data:
-                    new_comment.properties = [{
-                        'name': 'text',
-                        'value': comment_data['text'],
-                        'type': 'comment'
-                    }]
-                self.diagram.comments.append(new_comment)
-                logging.warning(f'[DEBUG] undo() - Comentário recriado: {new_comment.id}')
-            except Exception as e:
-                logging.warning(f'[DEBUG] undo() - Erro ao recriar comentário: {e}')
-                continue
-        
-        msg: str = action[3]
-        logging.warning(f'[DEBUG] undo() - Blocos após recriação: {list(self.diagram.blocks.keys())}')
         self.diagram.redraw()
-        logging.warning(f'[DEBUG] undo_stack: {len(self.diagram.undo_stack)}, redo_stack: {len(self.diagram.redo_stack)}')
-        logging.warning(f'[DEBUG] Blocos após undo: {list(self.diagram.blocks.keys())}')
 
     # ---------------------------------------------------------------------
     def redo(self) -> None:
-        logging.warning('[DEBUG] DiagramControl.redo chamado')
-        if len(self.diagram.redo_stack) < 1:
-            logging.warning('[DEBUG] redo_stack vazio')
+        if CommandHistory(self.diagram).redo() is None:
             return
         self.diagram.set_modified(True)
-        
-        # Salvar o estado atual no undo_stack antes de restaurar
-        current_state = self._serialize_current_state("Current State")
-        self.diagram.undo_stack.append(current_state)
-        
-        action: Tuple[Dict[int, Any], List[Any], List[Any], str] = self.diagram.redo_stack.pop()
-        
-        logging.warning(f'[DEBUG] redo() - Blocos antes: {list(self.diagram.blocks.keys())}')
-        logging.warning(f'[DEBUG] redo() - Ação a ser refeita: {action[3]}')
-        logging.warning(f'[DEBUG] redo() - Dados serializados: {list(action[0].keys())}')
-        
-        # Recriar blocos a partir dos dados serializados
-        serialized_blocks = action[0]
-        self.diagram.blocks = {}
-        for block_id, block_data in serialized_blocks.items():
-            # Criar novo BlockModel a partir dos dados serializados
-            from mosaicode.model.blockmodel import BlockModel
-            new_block = BlockModel()
-            for key, value in block_data.items():
-                if hasattr(new_block, key):
-                    setattr(new_block, key, value)
-            self.diagram.blocks[block_id] = new_block
-            logging.warning(f'[DEBUG] redo() - Bloco recriado: {new_block.type} (ID: {new_block.id})')
-        
-        # Recriar conectores como objetos ConnectionModel
-        serialized_connectors = action[1]
-        self.diagram.connectors = []
-        for conn_data in serialized_connectors:
-            try:
-                # Encontrar os blocos de entrada e saída
-                output_block = None
-                input_block = None
-                if conn_data.get('output') and 'id' in conn_data['output']:
-                    output_id = conn_data['output']['id']
-                    if output_id in self.diagram.blocks:
-                        output_block = self.diagram.blocks[output_id]
-                
-                if conn_data.get('input') and 'id' in conn_data['input']:
-                    input_id = conn_data['input']['id']
-                    if input_id in self.diagram.blocks:
-                        input_block = self.diagram.blocks[input_id]
-                
-                # Criar nova conexão apenas se ambos os blocos existirem
-                if output_block and input_block:
-                    from mosaicode.model.connectionmodel import ConnectionModel
-                    new_connection = ConnectionModel(
-                        diagram=self.diagram,
-                        output=output_block,
-                        output_port=conn_data.get('output_port'),
-                        input=input_block,
-                        input_port=conn_data.get('input_port')
-                    )
-                    self.diagram.connectors.append(new_connection)
-                    logging.warning(f'[DEBUG] redo() - Conexão recriada: {output_block.id} -> {input_block.id}')
-            except Exception as e:
-                logging.warning(f'[DEBUG] redo() - Erro ao recriar conexão: {e}')
-                continue
-        
-        # Recriar comentários
-        serialized_comments = action[2]
-        self.diagram.comments = []
-        for comment_data in serialized_comments:
-            try:
-                from mosaicode.model.commentmodel import CommentModel
-                new_comment = CommentModel()
-                new_comment.id = comment_data.get('id', -1)
-                new_comment.x = comment_data.get('x', 0)
-                new_comment.y = comment_data.get('y', 0)
-                # Definir propriedades se houver texto
-                if 'text' in comment_data:
-                    new_comment.properties = [{
-                        'name': 'text',
-                        'value': comment_data['text'],
-                        'type': 'comment'
-                    }]
-                self.diagram.comments.append(new_comment)
-                logging.warning(f'[DEBUG] redo() - Comentário recriado: {new_comment.id}')
-            except Exception as e:
-                logging.warning(f'[DEBUG] redo() - Erro ao recriar comentário: {e}')
-                continue
-        
-        msg: str = action[3]
-        logging.warning(f'[DEBUG] redo() - Blocos após recriação: {list(self.diagram.blocks.keys())}')
         self.diagram.redraw()
-        logging.warning(f'[DEBUG] undo_stack: {len(self.diagram.undo_stack)}, redo_stack: {len(self.diagram.redo_stack)}')
-        logging.warning(f'[DEBUG] Blocos após redo: {list(self.diagram.blocks.keys())}')
-        
-    # ---------------------------------------------------------------------
-    def _serialize_current_state(self, msg: str) -> Tuple[Dict[int, Any], List[Any], List[Any], str]:
-        """
-        Serialize the current state of the diagram.
-        
-        Args:
-            msg: Message describing the state
-            
-        Returns:
-            Serialized state tuple
-        """
-        # Serializar os blocos para evitar problemas com GObject
-        serialized_blocks = {}
-        for block_id, block in self.diagram.blocks.items():
-            # Criar uma cópia serializada do bloco
-            serialized_block = {
-                'id': block.id,
-                'type': block.type,
-                'language': block.language,
-                'x': block.x,
-                'y': block.y,
-                'label': block.label,
-                'color': block.color,
-                'group': block.group,
-                'help': block.help,
-                'version': block.version,
-                'extension': block.extension,
-                'file': block.file,
-                'is_collapsed': block.is_collapsed,
-                'ports': block.ports.copy() if hasattr(block, 'ports') else [],
-                'properties': block.properties.copy() if hasattr(block, 'properties') else [],
-                'codes': block.codes.copy() if hasattr(block, 'codes') else {},
-                'gen_codes': block.gen_codes.copy() if hasattr(block, 'gen_codes') else {},
-                'weight': block.weight,
-                'connections': block.connections.copy() if hasattr(block, 'connections') else [],
-                'maxIO': block.maxIO
-            }
-            serialized_blocks[block_id] = serialized_block
-        
-        # Serializar conectores e comentários
-        serialized_connectors = []
-        for conn in self.diagram.connectors:
-            serialized_conn = {
-                'output': {'id': conn.output.id} if hasattr(conn, 'output') and conn.output else None,
-                'input': {'id': conn.input.id} if hasattr(conn, 'input') and conn.input else None,
-                'output_port': conn.output_port,
-                'input_port': conn.input_port
-            }
-            serialized_connectors.append(serialized_conn)
-        
-        serialized_comments = []
-        for comment in self.diagram.comments:
-            # Get text from properties
-            text = ""
-            if hasattr(comment, 'get_properties') and comment.get_properties():
-                for prop in comment.get_properties():
-                    if prop.get('name') == 'text':
-                        text = prop.get('value', '')
-                        break
-            
-            serialized_comment = {
-                'id': comment.id,
-                'x': comment.x,
-                'y': comment.y,
-                'text': text,
-                'color': getattr(comment, 'color', 'black')
-            }
-            serialized_comments.append(serialized_comment)
-        
-        return (serialized_blocks, serialized_connectors, serialized_comments, msg)
 
     # ----------------------------------------------------------------------
     def load(self, file_name: Optional[str] = None) -> bool:
@@ -627,8 +416,9 @@ class DiagramControl:
             return False
 
         result: bool = DiagramPersistence.load(self.diagram)
-        self.diagram.redo_stack = []
-        self.diagram.undo_stack = []
+        CommandHistory(self.diagram).clear()
+        if self.diagram._journal is not None:
+            self.diagram._journal.reset()
 
         return result
 
@@ -640,7 +430,11 @@ class DiagramControl:
         Returns:
             Tuple of (success, message)
         """
-        return DiagramPersistence.save(self.diagram)
+        result = DiagramPersistence.save(self.diagram)
+        # The changes are in the file now
+        if result[0] and self.diagram._journal is not None:
+            self.diagram._journal.reset()
+        return result
 
     # ----------------------------------------------------------------------
     def get_min_max(self) -> Tuple[int, int, int, int]:
@@ -660,19 +454,12 @@ class DiagramControl:
         if not self.diagram.blocks:
             return 0, 0, 800, 600
 
-        for block_id in self.diagram.blocks:
-            block: Any = self.diagram.blocks[block_id]
-            x: int
-            y: int
-            x, y = block.get_position()
-            if x < min_x:
-                min_x = x
-            if y < min_y:
-                min_y = y
-            if x + block.width > max_x:
-                max_x = x + block.width
-            if y + block.height > max_y:
-                max_y = y + block.height
+        # Bounds of the blocks, connectors and comments, from the index
+        x1, y1, x2, y2 = self.diagram.get_extent()
+        min_x = min(min_x, x1)
+        min_y = min(min_y, y1)
+        max_x = max(max_x, x2)
+        max_y = max(max_y, y2)
 
         # Add margins to avoid cutting blocks
         margin = 50
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+"""
+This module contains the GenerationDaemon class and the ``mosaicode-gend``
+command: a local server that keeps the extensions loaded and generates or
+validates diagrams on request.
+
+Clients talk to it through a Unix domain socket, one JSON object per line:
+
+    {"command": "generate", "file": "...", "output_dir": "...",
+     "template": null}
+    {"command": "validate", "file": "..."}
+    {"command": "ping"}
+    {"command": "shutdown"}
+
+Each request is answered with one JSON object per line containing at least
+``success`` and ``message``.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from mosaicode.system import System as System
+from mosaicode.control.batchgenerator import BatchGenerator
+from mosaicode.control.codegenerator import CodeGenerator
+from mosaicode.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class GenerationDaemon(socketserver.ThreadingMixIn,
+                       socketserver.UnixStreamServer):
+    """
+    This class contains the generation server.
+    """
+
+    daemon_threads = True
+
+    # ----------------------------------------------------------------------
+    def __init__(self, socket_path: str, interval: float = 1.0) -> None:
+        """
+        Initialize the server and load the extensions.
+
+        Args:
+            socket_path: Path of the Unix domain socket
+            interval: Minimum time, in seconds, between two checks of the
+                extension directories
+        """
+        self.socket_path: str = socket_path
+        self.interval: float = interval
+        # Requests use the System singleton: run them one at a time
+        self.lock = threading.Lock()
+        self.__last_check: float = 0
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path,
+                                               GenerationRequestHandler)
+        self.__load()
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_default_socket(cls) -> str:
+        """
+        Get the default socket path.
+        """
+        return str(System.get_user_dir() / "mosaicode-gen.sock")
+
+    # ----------------------------------------------------------------------
+    def __load(self) -> None:
+        """
+        Load the extensions and remember the state of their files.
+        """
+        System()
+        System.reload()
+        # Keep every language warm
+        System.load_language()
+        CodeGenerator.clear_cache()
+        self.__last_check = time.monotonic()
+        logger.info(f"Extensions loaded: {len(System.get_blocks())} blocks")
+
+    # ----------------------------------------------------------------------
+    def check_extensions(self) -> bool:
+        """
+        Apply the extension files added, changed or removed since the last
+        check (see System.refresh).
+
+        Returns:
+            True if the extensions changed
+        """
+        now = time.monotonic()
+        if now - self.__last_check < self.interval:
+            return False
+        self.__last_check = now
+        if not System.refresh():
+            return False
+        logger.info("Extension files changed")
+        CodeGenerator.clear_cache()
+        return True
+
+    # ----------------------------------------------------------------------
+    def handle_command(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute one client request.
+
+        Args:
+            request: The decoded request
+
+        Returns:
+            The response
+        """
+        command = request.get("command")
+        if command == "ping":
+            return {"success": True, "message": "pong"}
+        if command == "shutdown":
+            threading.Thread(target=self.shutdown).start()
+            return {"success": True, "message": "Shutting down"}
+
+        file_name = request.get("file")
+        if not isinstance(file_name, str):
+            return {"success": False, "message": "Missing diagram file"}
+
+        with self.lock:
+            self.check_extensions()
+            if command == "validate":
+                errors = BatchGenerator.validate(file_name)
+                return {"success": len(errors) == 0,
+                        "message": "Valid" if not errors else errors[0],
+                        "errors": errors}
+            if command == "generate":
+                output_dir = request.get("output_dir", ".")
+                name, success, message = BatchGenerator.generate(
+                    file_name, output_dir, request.get("template"))
+                return {"success": success, "message": message}
+        return {"success": False, "message": "Unknown command " + str(command)}
+
+    # ----------------------------------------------------------------------
+    def server_close(self) -> None:
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def request(cls, socket_path: str,
+                requests: List[Dict[str, Any]],
+                timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Send requests to a running daemon.
+
+        Args:
+            socket_path: Path of the daemon socket
+            requests: Requests to send
+            timeout: Socket timeout in seconds
+
+        Returns:
+            The responses, in the same order
+
+        Raises:
+            OSError: If the daemon is not reachable
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            stream = client.makefile('rw', encoding='utf-8')
+            responses = []
+            for request in requests:
+                stream.write(json.dumps(request) + "\n")
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise OSError("Connection closed by the daemon")
+                responses.append(json.loads(line))
+            return responses
+
+
+class GenerationRequestHandler(socketserver.StreamRequestHandler):
+    """
+    This class reads the requests of one client connection.
+    """
+
+    # ----------------------------------------------------------------------
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request is not an object")
+                response = self.server.handle_command(request)
+            except ValueError as error:
+                response = {"success": False, "message": str(error)}
+            except Exception as error:
+                logger.error(f"Error handling request: {error}")
+                response = {"success": False, "message": str(error)}
+            self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+
+# ----------------------------------------------------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of the ``mosaicode-gend`` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog="mosaicode-gend",
+        description="Keep the Mosaicode extensions loaded and serve code "
+                    "generation requests.")
+    parser.add_argument('-s', '--socket', type=str, default=None,
+                        help="Path of the Unix domain socket")
+    parser.add_argument('-i', '--interval', type=float, default=1.0,
+                        help="Seconds between checks of the extension files")
+    args = parser.parse_args(argv)
+
+    socket_path = args.socket or GenerationDaemon.get_default_socket()
+    server = GenerationDaemon(socket_path, args.interval)
+    print("Listening on " + socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# ----------------------------------------------------------------------
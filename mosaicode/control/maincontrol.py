@@ -21,7 +21,7 @@ import gi
 # Importação direta e segura do Gtk
 try:
     gi.require_version('Gtk', '3.0')
-    from gi.repository import Gtk
+    from gi.repository import GLib, Gtk
 except (ImportError, ValueError):
     raise ImportError('GTK 3.0 não está disponível. Instale o pacote python3-gi e libgtk-3-dev.')
 from mosaicode.control.blockcontrol import BlockControl
@@ -44,11 +44,12 @@ from mosaicode.model.blockmodel import BlockModel
 from mosaicode.model.codetemplate import CodeTemplate
 from mosaicode.model.port import Port
 from mosaicode.model.commentmodel import CommentModel
+from mosaicode.persistence.autosave import Autosave
 from mosaicode.persistence.preferencespersistence import PreferencesPersistence
 from mosaicode.persistence.portpersistence import PortPersistence
 from mosaicode.persistence.blockpersistence import BlockPersistence
 from mosaicode.persistence.codetemplatepersistence import CodeTemplatePersistence
-from mosaicode.system import System as System
+from mosaicode.system import ExtensionChanges, System as System
 from mosaicode.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -60,6 +61,10 @@ class MainControl:
     """
     This class contains methods related the MainControl class.
     """
+
+    # Seconds between checks of the extension files
+    REFRESH_INTERVAL = 2
+
     # ----------------------------------------------------------------------
 
     def __init__(self, main_window: Any) -> None:
@@ -78,30 +83,110 @@ class MainControl:
     def init(self) -> None:
         """Initialize the main control."""
         logger.debug("[DEBUG] MainControl.init() - Iniciando inicialização")
-        self.update_blocks()
-        logger.debug("[DEBUG] MainControl.init() - update_blocks() concluído")
+        System.add_listener(self.__on_extensions_changed)
+        self.update_block_views()
+        logger.debug("[DEBUG] MainControl.init() - update_block_views() concluído")
         self.main_window.menu.update_recent_files(
             System.get_preferences().recent_files)
         logger.debug("[DEBUG] MainControl.init() - update_recent_files() concluído")
-        System.reload()
-        logger.debug("[DEBUG] MainControl.init() - System.reload() concluído")
         self.main_window.menu.update_examples(System.get_examples())
+        # Extension files edited outside the application
+        GLib.timeout_add_seconds(self.REFRESH_INTERVAL, self.__refresh_extensions)
+        self.__recover_diagrams()
         logger.debug("[DEBUG] MainControl.init() - Inicialização concluída")
 
     # ----------------------------------------------------------------------
     def update_blocks(self) -> None:
         """Update blocks in the system."""
-        System.reload()
-        blocks = System.get_blocks()
+        System.refresh()
+
+    # ----------------------------------------------------------------------
+    def __refresh_extensions(self) -> bool:
+        System.refresh()
+        return True
+
+    # ----------------------------------------------------------------------
+    def __on_extensions_changed(self, changes: ExtensionChanges) -> None:
+        """
+        Patch the menu and the block notebook with the changed blocks.
+
+        Args:
+            changes: Registry entries changed by System.refresh()
+        """
+        if changes.languages:
+            self.update_block_views()
+            return
+        blocks: Dict[str, BlockModel] = dict(changes.added["blocks"])
+        blocks.update(changes.changed["blocks"])
+        removed = changes.removed["blocks"]
+        if not blocks and not removed:
+            return
+        for block_type in removed:
+            self.main_window.menu.remove_block(block_type)
+        for block in blocks.values():
+            self.main_window.menu.add_block(block)
+        self.main_window.block_notebook.apply_changes(removed, blocks)
+
+    # ----------------------------------------------------------------------
+    def update_block_views(self) -> None:
+        """
+        Show the loaded blocks in the menu and in the block notebook. The
+        languages not loaded yet are shown as notebook placeholders.
+        """
+        blocks: Dict[str, BlockModel] = {}
+        placeholders: List[str] = []
+        for language in System.get_languages():
+            if System.is_language_loaded(language):
+                blocks.update(System.get_blocks(language))
+            else:
+                placeholders.append(language)
         self.main_window.menu.update_blocks(blocks)
-        self.main_window.block_notebook.update_blocks(blocks)
+        self.main_window.block_notebook.update_blocks(blocks, placeholders)
+
+    # ----------------------------------------------------------------------
+    def load_language(self, language: str) -> None:
+        """
+        Load the extensions of a language and show its blocks.
+
+        Args:
+            language: Language directory name
+        """
+        if System.is_language_loaded(language):
+            return
+        System.load_language(language)
+        self.update_block_views()
+
+    # ----------------------------------------------------------------------
+    def __recover_diagrams(self) -> None:
+        """
+        This method offers to recover the diagrams not saved when the
+        application stopped.
+        """
+        for key, file_name in Autosave.get_recoverable():
+            msg: str = _("Diagram ") + file_name + \
+                _(" has changes not saved.\nRecover them?")
+            result: int = ConfirmDialog(msg, self.main_window).run()
+            if result != Gtk.ResponseType.OK:
+                Autosave.remove(key)
+                continue
+            diagram: Diagram = Diagram(self.main_window)
+            if not Autosave.recover(diagram, key):
+                System.log("Problem recovering the diagram " + file_name)
+                continue
+            self.main_window.work_area.add_diagram(diagram)
+            diagram.redraw()
+            diagram.set_modified(True)
+            # The recovered changes are the base of the next ones
+            Autosave(diagram).snapshot()
 
     # ----------------------------------------------------------------------
     def new(self) -> None:
         """
         This method create a new the diagram file.
         """
-        self.main_window.work_area.add_diagram(Diagram(self.main_window))
+        diagram: Diagram = Diagram(self.main_window)
+        Autosave(diagram)
+        self.main_window.work_area.add_diagram(diagram)
 
     # ----------------------------------------------------------------------
     def select_open(self) -> None:
@@ -128,10 +213,15 @@ class MainControl:
         """
         diagram: Diagram = Diagram(self.main_window)
         self.main_window.work_area.add_diagram(diagram)
+        languages = [language for language in System.get_languages()
+                     if not System.is_language_loaded(language)]
         if not DiagramControl(diagram).load(file_name):
             System.log("Problem Loading the Diagram")
-        diagram.redraw()
         diagram.set_modified(False)
+        Autosave(diagram)
+        # The diagram may have loaded the extensions of its language
+        if any(System.is_language_loaded(language) for language in languages):
+            self.update_block_views()
 
         self.set_recent_files(file_name)
 
@@ -181,7 +271,7 @@ class MainControl:
                 System.log("File not saved")
                 return False
 
-            if not name.endswith("mscd"):
+            if not name.endswith((".mscd", ".mscdb")):
                 name = (("%s" + ".mscd") % name)
 
             if Path(name).exists():
@@ -263,6 +353,9 @@ class MainControl:
         PreferencesPersistence.save(
             System.get_preferences(), System.get_user_dir())
         if self.main_window.work_area.close_tabs():
+            # The autosave files of the closed diagrams are removed in the
+            # background, the only wait is here
+            Autosave.wait_stopped(timeout=5)
             Gtk.main_quit()
         else:
             return
@@ -331,7 +424,7 @@ class MainControl:
             return CodeGenerator(diagram)
 
         template_list: List[CodeTemplate] = []
-        code_templates: Dict[str, CodeTemplate] = System.get_code_templates()
+        code_templates: Dict[str, CodeTemplate] = System.get_code_templates(diagram.language)
 
         for key in code_templates:
             if code_templates[key].language == diagram.language:
@@ -717,12 +810,8 @@ class MainControl:
         if diagram is None:
             return None
 
-        # Create a deep copy of the block to avoid conflicts with multiple instances
-        from copy import deepcopy
-        new_block: BlockModel = deepcopy(block)
-        
-        # Reset ID to ensure it gets a new unique ID
-        new_block.id = -1
+        # A new instance sharing the block type data, with its own state
+        new_block: BlockModel = block.new_instance()
 
         # Se o diagrama não tem linguagem definida, usar a linguagem do bloco
         if diagram.language is None or diagram.language == 'None':
@@ -739,15 +828,17 @@ class MainControl:
         new_block.id = diagram.last_id
         diagram.last_id += 1
 
+        # The widget is created now, as the redraw waits for the end of
+        # an open transaction (paste connects the new blocks before it)
+        block_widget: Block = Block(diagram, new_block)
+
         # Use DiagramControl to add the block to the diagram
         diagram_control: DiagramControl = DiagramControl(diagram)
-        if not diagram_control.add_block(new_block):
+        if not diagram_control.add_block(block_widget):
             return None
 
-        # Create the Block widget
-        block_widget: Block = Block(diagram, new_block)
-        block_widget.is_selected = True
         diagram.redraw()
+        block_widget.is_selected = True
         logging.warning(f'[DEBUG] MainControl: Bloco criado com sucesso: {new_block.type} (ID: {new_block.id})')
         return block_widget
 
@@ -969,9 +1060,8 @@ class MainControl:
                 logger.warning(f"Unknown extension type: {type(element)}")
                 return
             
-            # Reload system to include new extension
-            System.reload()
-            self.update_blocks()
+            # Load the new extension file
+            System.refresh()
             logger.info(f"Extension added successfully: {element.type if hasattr(element, 'type') else 'unknown'}")
         except Exception as e:
             logger.error(f"Error adding extension: {e}")
@@ -999,9 +1089,8 @@ class MainControl:
                 return
             
             if success:
-                # Reload system to reflect changes
-                System.reload()
-                self.update_blocks()
+                # Unload the removed extension file
+                System.refresh()
                 logger.info(f"Extension deleted successfully: {element_name}")
             else:
                 logger.warning(f"Failed to delete extension: {element_name}")
@@ -1228,7 +1317,7 @@ class MainControl:
             except Exception as e:
                 logging.info(r"[ERRO] Erro ao importar {file_name}: {e}")
                 error_count += 1
-        System.reload()
+        System.refresh()
         # Mensagem final
         if hasattr(self.main_window, 'get_window') and self.main_window.get_window() is not None:
             if success_count > 0:
@@ -138,6 +138,34 @@ class BlockModel:
             logger = logging.getLogger(__name__)
             logger.debug(f"Failed to load defaults for block: {e}")
 
+    # ----------------------------------------------------------------------
+    def new_instance(self) -> "BlockModel":
+        """
+        Create a block of this type to place in a diagram.
+
+        The new block shares the data that does not change between blocks
+        of the same type (codes, help, ports, strings) with this one, the
+        registry block, instead of copying it. It owns its id, position,
+        collapsed flag, property values and code generation state; the
+        property dictionaries are only copied when set_properties()
+        changes them. The shared data must not be changed in place (the
+        Block Manager edits copies of the registry blocks).
+
+        Returns:
+            The new block
+        """
+        block = object.__new__(type(self))
+        state = block.__dict__
+        state.update(self.__dict__)
+        # Cached properties are computed again from the new block
+        for name in _CACHED_PROPERTIES:
+            state.pop(name, None)
+        block.id = -1
+        block.gen_codes = {}
+        block.weight = 0
+        block.connections = []
+        return block
+
     # ----------------------------------------------------------------------
     def get_color_as_rgba(self) -> str:
         """
@@ -165,15 +193,30 @@ class BlockModel:
 
     # ----------------------------------------------------------------------
     def set_properties(self, data: Dict[str, Any]) -> None:
-        """Set properties from data dictionary."""
+        """
+        Set properties from data dictionary.
+
+        The property dictionaries may be shared with the registry block
+        (see new_instance), so the changed ones are replaced, not modified.
+        The list is kept when no value changes.
+        """
+        properties = []
+        changed = False
         for prop in self.get_properties():
             key = prop.get("name")
             if key in data:
-                prop["value"] = data[key]
+                if prop.get("value") != data[key]:
+                    prop = dict(prop, value=data[key])
+                    changed = True
             else:
                 # Import System here to avoid circular import
                 from mosaicode.system import System
                 System.log(f"BlockModel.set_property ({self.type}) ERROR: key {key} not present")
+            properties.append(prop)
+        if not changed:
+            return
+        self.properties = properties
+        self.__dict__.pop("properties_dict", None)
 
     # ----------------------------------------------------------------------
     def get_properties(self) -> List[Dict[str, Any]]:
@@ -184,4 +227,8 @@ class BlockModel:
     def __str__(self) -> str:
         return str(self.id)
 
+
+_CACHED_PROPERTIES = tuple(name for name, value in vars(BlockModel).items()
+                           if isinstance(value, cached_property))
+
 # ------------------------------------------------------------------------------
@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the diagram commands and the CommandHistory class.
+
+Each command records only what one edit changed, so it can be undone and
+redone without copying the rest of the diagram.
+"""
+import sys
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _object_size(obj: Any) -> int:
+    """Estimate the bytes kept by an object, without following references."""
+    size = sys.getsizeof(obj)
+    values = getattr(obj, "__dict__", None)
+    if values is not None:
+        size += sys.getsizeof(values)
+        for value in values.values():
+            if isinstance(value, (str, bytes, list, dict)):
+                size += sys.getsizeof(value)
+    return size
+
+
+def _move_to(item: Any, position: Tuple[float, float]) -> None:
+    # Widgets are moved on the canvas, models only keep the coordinates
+    if hasattr(item, "get_position"):
+        x, y = item.get_position()
+        item.move(position[0] - x, position[1] - y)
+    else:
+        item.x, item.y = position
+
+
+class Command(ABC):
+    """
+    This class is the base of the diagram commands.
+    """
+
+    # ----------------------------------------------------------------------
+    @abstractmethod
+    def undo(self, diagram: Any) -> None:
+        """Revert the command on the diagram."""
+
+    # ----------------------------------------------------------------------
+    @abstractmethod
+    def redo(self, diagram: Any) -> None:
+        """Apply the command to the diagram again."""
+
+    # ----------------------------------------------------------------------
+    def get_size(self) -> int:
+        """Estimate the bytes kept by the command."""
+        return _object_size(self)
+
+    # ----------------------------------------------------------------------
+    def merge(self, command: "Command") -> bool:
+        """
+        Merge a command done right after this one.
+
+        Returns:
+            True if the command was merged
+        """
+        return False
+
+
+class AddBlock(Command):
+    """A block was added."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, block: Any) -> None:
+        self.block = block
+
+    # ----------------------------------------------------------------------
+    def undo(self, diagram: Any) -> None:
+        diagram.remove_block(self.block.id)
+
+    # ----------------------------------------------------------------------
+    def redo(self, diagram: Any) -> None:
+        diagram.blocks[self.block.id] = self.block
+
+
+class RemoveBlock(Command):
+    """A block was removed, with its connections."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, block: Any, connections: List[Any]) -> None:
+        self.block = block
+        self.connections = connections
+
+    # ----------------------------------------------------------------------
+    def undo(self, diagram: Any) -> None:
+        diagram.blocks[self.block.id] = self.block
+        for connection in self.connections:
+            diagram.add_connection(connection)
+
+    # ----------------------------------------------------------------------
+    def redo(self, diagram: Any) -> None:
+        diagram.remove_block(self.block.id)
+
+    # ----------------------------------------------------------------------
+    def get_size(self) -> int:
+        # The removed block is kept only by the history
+        return Command.get_size(self) + _object_size(self.block) + \
+            sum(_object_size(connection) for connection in self.connections)
+
+
+class AddConnection(Command):
+    """A connection was added."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, connection: Any) -> None:
+        self.connection = connection
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def find(cls, diagram: Any, connection: Any) -> Optional[Any]:
+        """
+        Find a connection in the diagram. The connection models are
+        replaced by their widgets when drawn, so equal ends also match.
+        """
+        found = None
+        for item in diagram.get_outgoing(connection.output.id):
+            if item is connection:
+                return item
+            if found is None and \
+                    item.output_port == connection.output_port and \
+                    item.input is not None and connection.input is not None and \
+                    item.input.id == connection.input.id and \
+                    item.input_port == connection.input_port:
+                found = item
+        return found
+
+    # ----------------------------------------------------------------------
+    def undo(self, diagram: Any) -> None:
+        connection = self.find(diagram, self.connection)
+        if connection is not None:
+            diagram.remove_connection(connection)
+            self.connection = connection
+
+    # ----------------------------------------------------------------------
+    def redo(self, diagram: Any) -> None:
+        diagram.add_connection(self.connection)
+
+
+class RemoveConnection(AddConnection):
+    """A connection was removed."""
+
+    # ----------------------------------------------------------------------
+    def undo(self, diagram: Any) -> None:
+        AddConnection.redo(self, diagram)
+
+    # ----------------------------------------------------------------------
+    def redo(self, diagram: Any) -> None:
+        AddConnection.undo(self, diagram)
+
+    # ----------------------------------------------------------------------
+    def get_size(self) -> int:
+        return Command.get_size(self) + _object_size(self.connection)
+
+
+class AddComment(Command):
+    """A comment was added."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, comment: Any, index: int) -> None:
+        self.comment = comment
+        self.index = index
+
+    # ----------------------------------------------------------------------
+    def undo(self, diagram: Any) -> None:
+        for i, item in enumerate(diagram.comments):
+            if item is self.comment:
+                del diagram.comments[i]
+                return
+
+    # ----------------------------------------------------------------------
+    def redo(self, diagram: Any) -> None:
+        diagram.comments.insert(self.index, self.comment)
+
+
+class RemoveComment(AddComment):
+    """A comment was removed."""
+
+    # ----------------------------------------------------------------------
+    def undo(self, diagram: Any) -> None:
+        AddComment.redo(self, diagram)
+
+    # ----------------------------------------------------------------------
+    def redo(self, diagram: Any) -> None:
+        AddComment.undo(self, diagram)
+
+    # ----------------------------------------------------------------------
+    def get_size(self) -> int:
+        return Command.get_size(self) + _object_size(self.comment)
+
+
+class MoveBlocks(Command):
+    """Some blocks were moved."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, positions: Dict[Any, Tuple[Tuple[float, float],
+                                                   Tuple[float, float]]]) -> None:
+        """
+        Args:
+            positions: block id -> (old position, new position)
+        """
+        self.positions = positions
+
+    # ----------------------------------------------------------------------
+    def __apply(self, diagram: Any, index: int) -> None:
+        for block_id, positions in self.positions.items():
+            block = diagram.blocks.get(block_id)
+            if block is not None:
+                _move_to(block, positions[index])
+
+    # ----------------------------------------------------------------------
+    def undo(self, diagram: Any) -> None:
+        self.__apply(diagram, 0)
+
+    # ----------------------------------------------------------------------
+    def redo(self, diagram: Any) -> None:
+        self.__apply(diagram, 1)
+
+    # ----------------------------------------------------------------------
+    def get_size(self) -> int:
+        return Command.get_size(self) + 200 * len(self.positions)
+
+    # ----------------------------------------------------------------------
+    def merge(self, command: Command) -> bool:
+        if not isinstance(command, MoveBlocks) or \
+                set(command.positions) != set(self.positions):
+            return False
+        for block_id, positions in command.positions.items():
+            self.positions[block_id] = (self.positions[block_id][0], positions[1])
+        return True
+
+
+class SetProperties(Command):
+    """
+    The properties of a block were changed. BlockModel.set_properties
+    replaces the property list, so both lists are kept as they are and
+    only the changed dictionaries take memory.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, block: Any, old: List[Dict[str, Any]],
+                 new: List[Dict[str, Any]]) -> None:
+        self.block_id = block.id
+        self.old = old
+        self.new = new
+        self.keys = self.__get_keys(old, new)
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __get_keys(old: List[Dict[str, Any]],
+                   new: List[Dict[str, Any]]) -> frozenset:
+        """Get the keys of the properties changed."""
+        keys = set()
+        for i in range(max(len(old), len(new))):
+            before = old[i] if i < len(old) else None
+            after = new[i] if i < len(new) else None
+            if before != after:
+                changed = after or before
+                keys.add(changed.get("name", changed.get("key")))
+        return frozenset(keys)
+
+    # ----------------------------------------------------------------------
+    def __apply(self, diagram: Any, properties: List[Dict[str, Any]]) -> None:
+        block = diagram.blocks.get(self.block_id)
+        if block is not None:
+            block.properties = properties
+            block.__dict__.pop("properties_dict", None)
+
+    # ----------------------------------------------------------------------
+    def undo(self, diagram: Any) -> None:
+        self.__apply(diagram, self.old)
+
+    # ----------------------------------------------------------------------
+    def redo(self, diagram: Any) -> None:
+        self.__apply(diagram, self.new)
+
+    # ----------------------------------------------------------------------
+    def get_size(self) -> int:
+        size = Command.get_size(self) + sys.getsizeof(self.old) + \
+            sys.getsizeof(self.new)
+        for new, old in zip(self.new, self.old):
+            if new is not old:
+                size += sys.getsizeof(new) + sys.getsizeof(old)
+        return size
+
+    # ----------------------------------------------------------------------
+    def merge(self, command: Command) -> bool:
+        # Typing in a property field sets the properties on each key: the
+        # edits of the same field are one action, other fields are not
+        if not isinstance(command, SetProperties) or \
+                command.block_id != self.block_id or command.keys != self.keys:
+            return False
+        self.new = command.new
+        return True
+
+
+@dataclass
+class HistoryEntry:
+    """
+    The commands of one user action.
+    """
+    name: str
+    commands: List[Command] = field(default_factory=list)
+    size: int = 0
+
+    # ----------------------------------------------------------------------
+    def update_size(self) -> int:
+        self.size = sys.getsizeof(self) + sum(command.get_size() for command in self.commands)
+        return self.size
+
+
+class CommandHistory:
+    """
+    This class keeps the undo and redo stacks of a diagram as commands.
+
+    The stacks are the diagram undo_stack and redo_stack lists. The oldest
+    actions are dropped when the estimated size of the history goes over
+    the byte budget.
+    """
+
+    # Default byte budget of each diagram history
+    BUDGET = 16 * 1024 * 1024
+
+    # ----------------------------------------------------------------------
+    def __init__(self, diagram: Any, budget: Optional[int] = None) -> None:
+        """
+        Args:
+            diagram: The diagram changed by the commands
+            budget: Byte budget, BUDGET if not given
+        """
+        self.diagram = diagram
+        self.budget: int = self.BUDGET if budget is None else budget
+
+    # ----------------------------------------------------------------------
+    def get_size(self) -> int:
+        """Get the estimated size of the history, in bytes."""
+        stacks = (self.diagram.undo_stack, self.diagram.redo_stack)
+        counts = (len(stacks[0]), len(stacks[1]))
+        cached = getattr(self.diagram, "_history_stacks", None)
+        # Recount if the stacks were replaced or changed directly
+        if not isinstance(cached, tuple) or cached[0] is not stacks[0] or \
+                cached[1] is not stacks[1] or cached[2] != counts:
+            size = sum(getattr(entry, "size", 0)
+                       for stack in stacks for entry in stack)
+            self.__store(size)
+        return self.diagram._history_size
+
+    # ----------------------------------------------------------------------
+    def __store(self, size: int) -> None:
+        self.diagram._history_size = size
+        self.diagram._history_stacks = (
+            self.diagram.undo_stack, self.diagram.redo_stack,
+            (len(self.diagram.undo_stack), len(self.diagram.redo_stack)))
+
+    # ----------------------------------------------------------------------
+    def __journal(self, commands: List[Command], undo: bool) -> None:
+        # The autosave journal records the changes of each action
+        journal = getattr(self.diagram, "_journal", None)
+        if journal is not None:
+            journal.record(commands, undo)
+
+    # ----------------------------------------------------------------------
+    def push(self, name: str, commands: List[Command]) -> Optional[HistoryEntry]:
+        """
+        Record an action already done. Discards the actions undone.
+
+        Args:
+            name: Name of the action
+            commands: The changes of the action, in the order done
+
+        Returns:
+            The history entry, or None if there was nothing to record
+        """
+        if not commands:
+            return None
+        transaction = getattr(self.diagram, "_transaction", None)
+        if isinstance(transaction, HistoryEntry):
+            transaction.commands.extend(commands)
+            return transaction
+        size = self.get_size()
+        size -= sum(getattr(entry, "size", 0) for entry in self.diagram.redo_stack)
+        self.diagram.redo_stack.clear()
+
+        undo_stack = self.diagram.undo_stack
+        last = undo_stack[-1] if undo_stack else None
+        if len(commands) == 1 and isinstance(last, HistoryEntry) and \
+                last.name == name and len(last.commands) == 1 and \
+                last.commands[0].merge(commands[0]):
+            entry = last
+            size -= entry.size
+        else:
+            entry = HistoryEntry(name, list(commands))
+            undo_stack.append(entry)
+        size += entry.update_size()
+
+        # Keep at least the last action
+        dropped = 0
+        while size > self.budget and dropped < len(undo_stack) - 1:
+            size -= getattr(undo_stack[dropped], "size", 0)
+            dropped += 1
+        del undo_stack[:dropped]
+        self.__store(size)
+        self.__journal(commands, False)
+        return entry
+
+    # ----------------------------------------------------------------------
+    def begin(self, name: str) -> None:
+        """
+        Open a transaction: the commands pushed until it ends make a single
+        action. Transactions may be nested, the outer one names the action.
+        """
+        if not isinstance(getattr(self.diagram, "_transaction", None), HistoryEntry):
+            self.diagram._transaction = HistoryEntry(name)
+            self.diagram._transaction_depth = 0
+            self.diagram._deferred = []
+        self.diagram._transaction_depth += 1
+
+    # ----------------------------------------------------------------------
+    def end(self, commit: bool = True) -> Optional[List[str]]:
+        """
+        Close a transaction. When the outer one ends, its commands are
+        pushed as one action, or undone if it is not committed.
+
+        Args:
+            commit: False to undo the changes of the transaction
+
+        Returns:
+            The calls deferred during the transaction if it was the outer
+            one, None otherwise
+        """
+        self.diagram._transaction_depth -= 1
+        if self.diagram._transaction_depth > 0:
+            return None
+        entry = self.diagram._transaction
+        deferred = list(self.diagram._deferred)
+        self.diagram._transaction = None
+        self.diagram._deferred = []
+        if commit:
+            self.push(entry.name, entry.commands)
+        else:
+            for command in reversed(entry.commands):
+                command.undo(self.diagram)
+        return deferred
+
+    # ----------------------------------------------------------------------
+    def __move(self, source: List[Any], target: List[Any],
+               undo: bool) -> Optional[HistoryEntry]:
+        size = self.get_size()
+        while source:
+            entry = source.pop()
+            if not isinstance(entry, HistoryEntry):
+                continue  # Not a command (older history format)
+            if undo:
+                for command in reversed(entry.commands):
+                    command.undo(self.diagram)
+            else:
+                for command in entry.commands:
+                    command.redo(self.diagram)
+            target.append(entry)
+            self.__store(size)
+            self.__journal(entry.commands, undo)
+            return entry
+        self.__store(self.get_size())
+        return None
+
+    # ----------------------------------------------------------------------
+    def undo(self) -> Optional[HistoryEntry]:
+        """
+        Undo the last action.
+
+        Returns:
+            The entry undone, or None if there is nothing to undo
+        """
+        return self.__move(self.diagram.undo_stack, self.diagram.redo_stack, True)
+
+    # ----------------------------------------------------------------------
+    def redo(self) -> Optional[HistoryEntry]:
+        """
+        Redo the last action undone.
+
+        Returns:
+            The entry redone, or None if there is nothing to redo
+        """
+        return self.__move(self.diagram.redo_stack, self.diagram.undo_stack, False)
+
+    # ----------------------------------------------------------------------
+    def clear(self) -> None:
+        """Discard all the actions."""
+        self.diagram.undo_stack.clear()
+        self.diagram.redo_stack.clear()
+        self.__store(0)
+
+# ----------------------------------------------------------------------
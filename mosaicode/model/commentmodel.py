@@ -31,9 +31,9 @@ class CommentModel:
     @staticmethod
     def _get_comment_type() -> str:
         """Get comment field type."""
-        # Import fieldtypes here to avoid GTK dependency during module import
-        from mosaicode.GUI.fieldtypes import MOSAICODE_COMMENT
-        return MOSAICODE_COMMENT
+        # Same value as mosaicode.GUI.fieldtypes.MOSAICODE_COMMENT. It is not
+        # imported so that comments can be loaded without GTK.
+        return "Comment"
 
     # ----------------------------------------------------------------------
     def set_properties(self, data: Optional[Dict[str, Any]]) -> None:
@@ -3,9 +3,11 @@
 This module contains the DiagramModel class.
 """
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 
+from mosaicode.model.spatialindex import Bounds, SpatialIndex
+
 
 @dataclass
 class DiagramModel:
@@ -29,6 +31,39 @@ class DiagramModel:
     redo_stack: List[Any] = field(default_factory=list)
     authors: List[str] = field(default_factory=list)
 
+    # Connection indexes, kept by the connection methods below:
+    # block id -> connections, (block id, port) -> connections
+    _incoming: Dict[Any, List[Any]] = field(default_factory=dict, repr=False, compare=False)
+    _outgoing: Dict[Any, List[Any]] = field(default_factory=dict, repr=False, compare=False)
+    _port_connections: Dict[Tuple[Any, int], List[Any]] = field(
+        default_factory=dict, repr=False, compare=False)
+    # Connection list indexed and its length, to notice changes made
+    # directly to connectors
+    _indexed: Optional[List[Any]] = field(default=None, repr=False, compare=False)
+    _indexed_count: int = field(default=0, repr=False, compare=False)
+    # Topological position of each block id, repaired on each new
+    # connection. None when it must be computed again.
+    _order: Optional[Dict[Any, int]] = field(default=None, repr=False, compare=False)
+    _next_position: int = field(default=0, repr=False, compare=False)
+    _cyclic: bool = field(default=False, repr=False, compare=False)
+    # Estimated size of the undo and redo stacks (see CommandHistory)
+    _history_size: int = field(default=0, repr=False, compare=False)
+    _history_stacks: Optional[Tuple[Any, ...]] = field(default=None, repr=False, compare=False)
+    # Open transaction (see DiagramControl.transaction): its history
+    # entry, nesting depth and the calls deferred to its end
+    _transaction: Optional[Any] = field(default=None, repr=False, compare=False)
+    _transaction_depth: int = field(default=0, repr=False, compare=False)
+    _deferred: List[str] = field(default_factory=list, repr=False, compare=False)
+    # Autosave journal of the history actions (see Autosave)
+    _journal: Optional[Any] = field(default=None, repr=False, compare=False)
+    # Bounds of the blocks, connectors and comments, by id of the item.
+    # None when it must be built again (see get_spatial_index).
+    _spatial: Optional[SpatialIndex] = field(default=None, repr=False, compare=False)
+    _spatial_items: Dict[int, Any] = field(default_factory=dict, repr=False, compare=False)
+    # Positions of the blocks being moved, before the move (see start_move)
+    _move_start: Dict[Any, Tuple[float, float]] = field(
+        default_factory=dict, repr=False, compare=False)
+
     # ----------------------------------------------------------------------
     @property
     def patch_name(self) -> str:
@@ -43,6 +78,431 @@ class DiagramModel:
             name = Path(name).stem
         return name
 
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __port_key(block: Any, port: Any) -> Tuple[Any, int]:
+        # Ports may be shared by blocks of the same type (see
+        # BlockModel.new_instance), so the key includes the block
+        return block.id, id(port)
+
+    # ----------------------------------------------------------------------
+    def __index(self, connection: Any) -> None:
+        self._outgoing.setdefault(connection.output.id, []).append(connection)
+        self._port_connections.setdefault(
+            self.__port_key(connection.output, connection.output_port), []).append(connection)
+        if connection.input is not None:
+            self._incoming.setdefault(connection.input.id, []).append(connection)
+            self._port_connections.setdefault(
+                self.__port_key(connection.input, connection.input_port), []).append(connection)
+
+    # ----------------------------------------------------------------------
+    def __unindex(self, connection: Any) -> None:
+        keys = [(self._outgoing, connection.output.id),
+                (self._port_connections,
+                 self.__port_key(connection.output, connection.output_port))]
+        if connection.input is not None:
+            keys += [(self._incoming, connection.input.id),
+                     (self._port_connections,
+                      self.__port_key(connection.input, connection.input_port))]
+        for index, key in keys:
+            connections = index.get(key)
+            if connections is None:
+                continue
+            for i, item in enumerate(connections):
+                if item is connection:
+                    del connections[i]
+                    break
+            if not connections:
+                del index[key]
+
+    # ----------------------------------------------------------------------
+    def __check_index(self) -> None:
+        """Rebuild the indexes if connectors was changed directly."""
+        if self._indexed is self.connectors and \
+                self._indexed_count == len(self.connectors):
+            return
+        self._incoming.clear()
+        self._outgoing.clear()
+        self._port_connections.clear()
+        for connection in self.connectors:
+            self.__index(connection)
+        self._indexed = self.connectors
+        self._indexed_count = len(self.connectors)
+        self._order = None
+
+    # ----------------------------------------------------------------------
+    def __forget_cycle(self) -> None:
+        # Removing a connection may break the cycle
+        if self._cyclic:
+            self._order = None
+
+    # ----------------------------------------------------------------------
+    def __successors(self, block_id: Any) -> List[Any]:
+        return [connection.input.id for connection in self._outgoing.get(block_id, ())
+                if connection.input is not None]
+
+    # ----------------------------------------------------------------------
+    def __predecessors(self, block_id: Any) -> List[Any]:
+        return [connection.output.id for connection in self._incoming.get(block_id, ())]
+
+    # ----------------------------------------------------------------------
+    def __get_order(self) -> Dict[Any, int]:
+        """
+        Get the topological positions, computing them with Kahn's algorithm
+        if needed. Check _cyclic before using them.
+        """
+        self.__check_index()
+        if self._order is not None:
+            return self._order
+        in_degree = dict.fromkeys([block.id for block in self.blocks.values()], 0)
+        for index in (self._outgoing, self._incoming):
+            for block_id in index:
+                in_degree.setdefault(block_id, 0)
+        block_ids = list(in_degree)
+        for block_id in block_ids:
+            for target in self.__successors(block_id):
+                in_degree[target] += 1
+        queue = [block_id for block_id in block_ids if in_degree[block_id] == 0]
+        order: Dict[Any, int] = {}
+        for block_id in queue:
+            order[block_id] = len(order)
+            for target in self.__successors(block_id):
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    queue.append(target)
+        self._cyclic = len(order) < len(in_degree)
+        self._order = order
+        self._next_position = len(order)
+        return order
+
+    # ----------------------------------------------------------------------
+    def __get_position(self, order: Dict[Any, int], block_id: Any) -> int:
+        # Blocks without connections may be missing: they go last
+        if block_id not in order:
+            order[block_id] = self._next_position
+            self._next_position += 1
+        return order[block_id]
+
+    # ----------------------------------------------------------------------
+    def __reach(self, start: Any, target: Any, order: Dict[Any, int]) -> bool:
+        """
+        Check if target is reachable from start. Only blocks placed before
+        target in the topological order can be on the way.
+        """
+        limit = order[target]
+        stack = [start]
+        seen = {start}
+        while stack:
+            block_id = stack.pop()
+            if block_id == target:
+                return True
+            for successor in self.__successors(block_id):
+                if successor not in seen and order[successor] <= limit:
+                    seen.add(successor)
+                    stack.append(successor)
+        return False
+
+    # ----------------------------------------------------------------------
+    def __repair_order(self, connection: Any) -> None:
+        """
+        Keep the topological order after adding a connection, moving only
+        the blocks between its ends (Pearce-Kelly).
+        """
+        if self._order is None or self._cyclic or connection.input is None:
+            return
+        order = self._order
+        source = connection.output.id
+        target = connection.input.id
+        lower = self.__get_position(order, target)
+        upper = self.__get_position(order, source)
+        if lower > upper:
+            return
+        if source == target:
+            self._cyclic = True
+            return
+
+        forward = [target]
+        seen = {target}
+        for block_id in forward:
+            for successor in self.__successors(block_id):
+                if successor == source:
+                    self._cyclic = True
+                    return
+                if successor not in seen and order[successor] < upper:
+                    seen.add(successor)
+                    forward.append(successor)
+        backward = [source]
+        seen = {source}
+        for block_id in backward:
+            for predecessor in self.__predecessors(block_id):
+                if predecessor not in seen and order[predecessor] > lower:
+                    seen.add(predecessor)
+                    backward.append(predecessor)
+
+        backward.sort(key=order.__getitem__)
+        forward.sort(key=order.__getitem__)
+        moved = backward + forward
+        positions = sorted(order[block_id] for block_id in moved)
+        for block_id, position in zip(moved, positions):
+            order[block_id] = position
+
+    # ----------------------------------------------------------------------
+    def would_create_cycle(self, output_id: Any, input_id: Any) -> bool:
+        """
+        Check if connecting the output of a block to the input of another
+        would create a cycle.
+
+        Args:
+            output_id: Id of the block of the output port
+            input_id: Id of the block of the input port
+        """
+        if output_id == input_id:
+            return True
+        order = self.__get_order()
+        if self._cyclic:
+            # The diagram already has a cycle: search all the graph
+            order = dict.fromkeys(list(self._outgoing) + list(self._incoming), 0)
+            order[output_id] = 0
+            return self.__reach(input_id, output_id, order)
+        if self.__get_position(order, output_id) < \
+                self.__get_position(order, input_id):
+            return False
+        return self.__reach(input_id, output_id, order)
+
+    # ----------------------------------------------------------------------
+    def get_topological_order(self) -> Optional[List[Any]]:
+        """
+        Get the ids of the blocks sorted so every connection goes from a
+        block to a later one.
+
+        Returns:
+            The block ids, or None if the diagram has a cycle
+        """
+        order = self.__get_order()
+        if self._cyclic:
+            return None
+        return sorted((block.id for block in self.blocks.values()),
+                      key=lambda block_id: self.__get_position(order, block_id))
+
+    # ----------------------------------------------------------------------
+    def add_connection(self, connection: Any) -> None:
+        """Add a connection to the diagram."""
+        self.__check_index()
+        self.connectors.append(connection)
+        self.__index(connection)
+        self._indexed_count += 1
+        self.__repair_order(connection)
+
+    # ----------------------------------------------------------------------
+    def remove_connection(self, connection: Any) -> bool:
+        """
+        Remove a connection from the diagram.
+
+        Returns:
+            True if the connection was in the diagram
+        """
+        self.__check_index()
+        for i, item in enumerate(self.connectors):
+            if item is connection:
+                del self.connectors[i]
+                self.__unindex(connection)
+                self._indexed_count -= 1
+                self.__forget_cycle()
+                return True
+        return False
+
+    # ----------------------------------------------------------------------
+    def replace_connection(self, old: Any, new: Any,
+                           position: Optional[int] = None) -> None:
+        """
+        Replace a connection by another one (its widget, for instance).
+
+        Args:
+            old: The connection in the diagram
+            new: The connection to put in its place
+            position: Index of old in connectors, if known
+        """
+        self.__check_index()
+        if position is None or self.connectors[position] is not old:
+            position = next((i for i, item in enumerate(self.connectors)
+                             if item is old), None)
+            if position is None:
+                return
+        self.connectors[position] = new
+        self.__unindex(old)
+        self.__index(new)
+        self.__forget_cycle()
+        self.__repair_order(new)
+
+    # ----------------------------------------------------------------------
+    def set_connections(self, connections: List[Any]) -> None:
+        """Replace all the connections of the diagram."""
+        self.connectors = list(connections)
+        self._indexed = None
+        self.__check_index()
+
+    # ----------------------------------------------------------------------
+    def remove_block(self, block_id: Any) -> List[Any]:
+        """
+        Remove a block and its connections from the diagram.
+
+        Returns:
+            The removed connections
+        """
+        self.blocks.pop(block_id, None)
+        connections = self.get_outgoing(block_id)
+        connections += [connection for connection in self.get_incoming(block_id)
+                        if connection.output.id != block_id]
+        if not connections:
+            return connections
+        removed = set(map(id, connections))
+        self.connectors[:] = [connection for connection in self.connectors
+                              if id(connection) not in removed]
+        for connection in connections:
+            self.__unindex(connection)
+        self._indexed_count = len(self.connectors)
+        self.__forget_cycle()
+        return connections
+
+    # ----------------------------------------------------------------------
+    def get_incoming(self, block_id: Any) -> List[Any]:
+        """Get the connections whose input is a block."""
+        self.__check_index()
+        return list(self._incoming.get(block_id, ()))
+
+    # ----------------------------------------------------------------------
+    def get_outgoing(self, block_id: Any) -> List[Any]:
+        """Get the connections whose output is a block."""
+        self.__check_index()
+        return list(self._outgoing.get(block_id, ()))
+
+    # ----------------------------------------------------------------------
+    def get_port_connections(self, block: Any, port: Any) -> List[Any]:
+        """Get the connections of a block port."""
+        self.__check_index()
+        return list(self._port_connections.get(self.__port_key(block, port), ()))
+
+    # ----------------------------------------------------------------------
+    def defer(self, name: str) -> bool:
+        """
+        Defer a call (redraw, for instance) while a transaction is open.
+
+        Returns:
+            True if the call was deferred to the end of the transaction
+        """
+        if self._transaction is None:
+            return False
+        if name not in self._deferred:
+            self._deferred.append(name)
+        return True
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __get_coordinates(block: Any) -> Tuple[float, float]:
+        # Widgets are on the canvas, models only keep the coordinates
+        if hasattr(block, "get_position"):
+            return tuple(block.get_position())
+        return (block.x, block.y)
+
+    # ----------------------------------------------------------------------
+    def start_move(self, *blocks: Any) -> None:
+        """
+        Remember the position of blocks about to be moved. A drag moves
+        them many times: the first position is kept until end_move.
+        """
+        for block in blocks:
+            if block.id not in self._move_start:
+                self._move_start[block.id] = self.__get_coordinates(block)
+
+    # ----------------------------------------------------------------------
+    def end_move(self) -> Dict[Any, Tuple[Tuple[float, float], Tuple[float, float]]]:
+        """
+        End the move of the blocks given to start_move.
+
+        Returns:
+            block id -> (old position, new position) of the blocks that
+            were moved, as recorded by MoveBlocks
+        """
+        positions = {}
+        for block_id, start in self._move_start.items():
+            block = self.blocks.get(block_id)
+            if block is None:
+                continue
+            end = self.__get_coordinates(block)
+            if end != start:
+                positions[block_id] = (start, end)
+        self._move_start = {}
+        return positions
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def __get_bounds(item: Any) -> Optional[Bounds]:
+        """Get the bounds of a canvas item, or of a model position."""
+        # Blocks and connectors know their area when not on the canvas
+        if hasattr(item, "get_area"):
+            return item.get_area()
+        if hasattr(item, "get_bounds"):
+            bounds = item.get_bounds()
+            return (bounds.x1, bounds.y1, bounds.x2, bounds.y2)
+        x, y = getattr(item, "x", None), getattr(item, "y", None)
+        if x is None or y is None:
+            return None
+        return (x, y, x + getattr(item, "width", 0), y + getattr(item, "height", 0))
+
+    # ----------------------------------------------------------------------
+    def get_spatial_index(self) -> SpatialIndex:
+        """
+        Get the index of the item bounds, built from all the items when
+        it is first used or was invalidated (_spatial set to None).
+        """
+        if self._spatial is None:
+            self._spatial = SpatialIndex()
+            self._spatial_items = {}
+            self.update_bounds(*self.blocks.values(), *self.connectors, *self.comments)
+        return self._spatial
+
+    # ----------------------------------------------------------------------
+    def update_bounds(self, *items: Any) -> None:
+        """Update the bounds of moved or new items in the index."""
+        index = self._spatial
+        if index is None:
+            return
+        for item in items:
+            bounds = self.__get_bounds(item)
+            if bounds is None:
+                index.remove(id(item))
+                self._spatial_items.pop(id(item), None)
+                continue
+            index.insert(id(item), bounds)
+            self._spatial_items[id(item)] = item
+
+    # ----------------------------------------------------------------------
+    def forget_bounds(self, *items: Any) -> None:
+        """Remove items from the index."""
+        if self._spatial is None:
+            return
+        for item in items:
+            self._spatial.remove(id(item))
+            self._spatial_items.pop(id(item), None)
+
+    # ----------------------------------------------------------------------
+    def get_items_in_bounds(self, bounds: Bounds, inside: bool = False) -> List[Any]:
+        """
+        Get the items in an area.
+
+        Args:
+            bounds: The area (x1, y1, x2, y2)
+            inside: True for the items inside the area only, False for the
+                items touching it
+        """
+        index = self.get_spatial_index()
+        return [self._spatial_items[key] for key in index.query(bounds, inside)]
+
+    # ----------------------------------------------------------------------
+    def get_extent(self) -> Optional[Bounds]:
+        """Get the bounds of all the items, or None if there are none."""
+        return self.get_spatial_index().get_extent()
+
     # ----------------------------------------------------------------------
     def __str__(self) -> str:
         return str(self.patch_name)
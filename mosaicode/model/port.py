@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 """
-This module contains the Port class.
+This module contains the Port, PortType and PortRef classes.
 """
-from dataclasses import dataclass, field
+import sys
+from dataclasses import astuple, dataclass, field
 from enum import Enum
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Union
 from pathlib import Path
 
 
@@ -100,3 +101,158 @@ class Port:
     def is_output(self) -> bool:
         """Check if this port is an output port."""
         return str(self.conn_type).lower() == self.OUTPUT
+
+    # ----------------------------------------------------------------------
+    def get_port_type(self) -> "PortType":
+        """
+        Get the shared, immutable description of this port type, used by
+        the block ports (PortRef).
+        """
+        values = (self.type, self.version, self.language, self.hint,
+                  self.color, self.multiple, self.file, self.code, self.var_name)
+        # Kept while the port is not edited
+        cached = self.__dict__.get("_port_type")
+        if cached is None or cached[0] != values:
+            cached = self.__dict__["_port_type"] = (values, PortType.get(*values))
+        return cached[1]
+
+
+@dataclass(frozen=True)
+class PortType:
+    """
+    This class contains the attributes shared by every block port of a
+    type. Equal port types are kept as a single instance (see get()).
+    """
+    type: str
+    version: str = ""
+    language: str = ""
+    hint: str = ""
+    color: str = "#000"
+    multiple: bool = False
+    file: Optional[Union[str, Path]] = None
+    code: str = ""
+    var_name: str = "$block[label]$_$block[id]$_$port[name]$"
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get(cls, *values) -> "PortType":
+        """
+        Get the single instance of a port type.
+
+        Args:
+            values: The port type attributes, in declaration order
+        """
+        port_type = _port_types.get(values)
+        if port_type is None:
+            port_type = cls(sys.intern(values[0]), values[1], sys.intern(values[2]),
+                            *values[3:])
+            _port_types[values] = port_type
+        return port_type
+
+    # ----------------------------------------------------------------------
+    def __reduce__(self) -> tuple:
+        # Unpickled port types (extension cache) are shared as well
+        return PortType.get, astuple(self)
+
+
+# Port type attributes -> the PortType instance
+_port_types: Dict[tuple, PortType] = {}
+
+
+class PortRef:
+    """
+    This class is a port of a block: a shared PortType plus the attributes
+    defined by the block (name, label, connection type and indexes).
+    It can be used wherever a Port is expected.
+    """
+    INPUT = Port.INPUT
+    OUTPUT = Port.OUTPUT
+
+    # Attributes read by the $port[...]$ wildcards
+    FIELDS = frozenset(("type", "version", "language", "hint", "color",
+                        "multiple", "file", "code", "var_name", "conn_type",
+                        "name", "label", "index", "type_index"))
+
+    __slots__ = ("port_type", "conn_type", "name", "label", "index",
+                 "type_index", "_hint")
+
+    # ----------------------------------------------------------------------
+    def __init__(self, port_type: PortType, conn_type: Optional[str] = None,
+                 name: Optional[str] = None, label: Optional[str] = None,
+                 index: int = -1, type_index: int = -1,
+                 hint: Optional[str] = None) -> None:
+        """
+        Args:
+            port_type: The shared port type
+            hint: Hint of this block port, instead of the port type one
+        """
+        self.port_type: PortType = port_type
+        self.conn_type: Optional[str] = conn_type
+        self.name: Optional[str] = name
+        self.label: Optional[str] = label
+        self.index: int = index
+        self.type_index: int = type_index
+        self._hint: Optional[str] = hint
+
+    # Attributes of the port type
+    type = property(lambda self: self.port_type.type)
+    version = property(lambda self: self.port_type.version)
+    language = property(lambda self: self.port_type.language)
+    color = property(lambda self: self.port_type.color)
+    multiple = property(lambda self: self.port_type.multiple)
+    file = property(lambda self: self.port_type.file)
+    code = property(lambda self: self.port_type.code)
+    var_name = property(lambda self: self.port_type.var_name)
+
+    # ----------------------------------------------------------------------
+    @property
+    def hint(self) -> str:
+        if self._hint is None:
+            return self.port_type.hint
+        return self._hint
+
+    @hint.setter
+    def hint(self, value: Optional[str]) -> None:
+        self._hint = value
+
+    # ----------------------------------------------------------------------
+    def is_input(self) -> bool:
+        """Check if this port is an input port."""
+        return str(self.conn_type).lower() == self.INPUT
+
+    # ----------------------------------------------------------------------
+    def is_output(self) -> bool:
+        """Check if this port is an output port."""
+        return str(self.conn_type).lower() == self.OUTPUT
+
+    # ----------------------------------------------------------------------
+    def __state(self) -> tuple:
+        return (self.port_type, self.conn_type, self.name, self.label,
+                self.index, self.type_index, self._hint)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, PortRef):
+            return NotImplemented
+        return self.__state() == other.__state()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return (f"PortRef(type={self.type!r}, conn_type={self.conn_type!r}, "
+                f"name={self.name!r}, label={self.label!r}, index={self.index}, "
+                f"type_index={self.type_index})")
+
+    # ----------------------------------------------------------------------
+    def __copy__(self) -> "PortRef":
+        return PortRef(*self.__state())
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "PortRef":
+        # The port type is immutable: copies share it
+        return self.__copy__()
+
+    def __getstate__(self) -> tuple:
+        return self.__state()
+
+    def __setstate__(self, state: tuple) -> None:
+        (self.port_type, self.conn_type, self.name, self.label,
+         self.index, self.type_index, self._hint) = state
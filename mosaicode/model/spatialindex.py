@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the SpatialIndex class.
+"""
+import math
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+# (x1, y1, x2, y2)
+Bounds = Tuple[float, float, float, float]
+
+
+class SpatialIndex:
+    """
+    This class indexes bounding boxes in a uniform grid, so the boxes in
+    an area are found by looking at the cells of the area only.
+
+    Boxes covering more than MAX_CELLS cells (long connectors) are kept
+    apart and always checked.
+    """
+
+    # Side of the grid cells
+    CELL_SIZE = 128
+    MAX_CELLS = 64
+
+    # ----------------------------------------------------------------------
+    def __init__(self, cell_size: Optional[float] = None) -> None:
+        self.cell_size: float = self.CELL_SIZE if cell_size is None else cell_size
+        self.__bounds: Dict[Any, Bounds] = {}
+        # cell -> keys of the boxes touching it
+        self.__cells: Dict[Tuple[int, int], Set[Any]] = {}
+        self.__large: Set[Any] = set()
+        # Bounds of all the boxes, None when it must be computed again
+        self.__extent: Optional[Bounds] = None
+
+    # ----------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.__bounds)
+
+    # ----------------------------------------------------------------------
+    def __contains__(self, key: Any) -> bool:
+        return key in self.__bounds
+
+    # ----------------------------------------------------------------------
+    def __range(self, bounds: Bounds) -> Tuple[int, int, int, int]:
+        size = self.cell_size
+        return (math.floor(bounds[0] / size), math.floor(bounds[1] / size),
+                math.floor(bounds[2] / size), math.floor(bounds[3] / size))
+
+    # ----------------------------------------------------------------------
+    def __cells_of(self, bounds: Bounds) -> Optional[Iterator[Tuple[int, int]]]:
+        """
+        Get the cells of a box, or None if it is too large.
+        """
+        x1, y1, x2, y2 = self.__range(bounds)
+        if (x2 - x1 + 1) * (y2 - y1 + 1) > self.MAX_CELLS:
+            return None
+        return ((x, y) for x in range(x1, x2 + 1) for y in range(y1, y2 + 1))
+
+    # ----------------------------------------------------------------------
+    def get(self, key: Any) -> Optional[Bounds]:
+        return self.__bounds.get(key)
+
+    # ----------------------------------------------------------------------
+    def insert(self, key: Any, bounds: Bounds) -> None:
+        """
+        Add a box, or move it if the key is already indexed.
+        """
+        bounds = (min(bounds[0], bounds[2]), min(bounds[1], bounds[3]),
+                  max(bounds[0], bounds[2]), max(bounds[1], bounds[3]))
+        old = self.__bounds.get(key)
+        if old == bounds:
+            return
+        if old is not None:
+            self.remove(key)
+        self.__bounds[key] = bounds
+        cells = self.__cells_of(bounds)
+        if cells is None:
+            self.__large.add(key)
+        else:
+            for cell in cells:
+                self.__cells.setdefault(cell, set()).add(key)
+        extent = self.__extent
+        if extent is not None or len(self.__bounds) == 1:
+            extent = extent or bounds
+            self.__extent = (min(extent[0], bounds[0]), min(extent[1], bounds[1]),
+                             max(extent[2], bounds[2]), max(extent[3], bounds[3]))
+
+    # ----------------------------------------------------------------------
+    def remove(self, key: Any) -> bool:
+        """
+        Remove a box.
+
+        Returns:
+            True if the key was indexed
+        """
+        bounds = self.__bounds.pop(key, None)
+        if bounds is None:
+            return False
+        if key in self.__large:
+            self.__large.discard(key)
+        else:
+            for cell in self.__cells_of(bounds):
+                keys = self.__cells.get(cell)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self.__cells[cell]
+        # A box on the border of the extent makes it unknown
+        extent = self.__extent
+        if extent is not None and (bounds[0] <= extent[0] or bounds[1] <= extent[1] or
+                                   bounds[2] >= extent[2] or bounds[3] >= extent[3]):
+            self.__extent = None
+        return True
+
+    # ----------------------------------------------------------------------
+    def clear(self) -> None:
+        self.__bounds.clear()
+        self.__cells.clear()
+        self.__large.clear()
+        self.__extent = None
+
+    # ----------------------------------------------------------------------
+    def query(self, bounds: Bounds, inside: bool = False) -> List[Any]:
+        """
+        Get the keys of the boxes in an area.
+
+        Args:
+            bounds: The area
+            inside: True for the boxes inside the area only, False for the
+                boxes touching it
+
+        Returns:
+            The keys, in no particular order
+        """
+        x1, y1, x2, y2 = (min(bounds[0], bounds[2]), min(bounds[1], bounds[3]),
+                          max(bounds[0], bounds[2]), max(bounds[1], bounds[3]))
+        cx1, cy1, cx2, cy2 = self.__range((x1, y1, x2, y2))
+        candidates: Set[Any] = set(self.__large)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self.__cells):
+            # A large area: the cells in use are less than the cells of it
+            for (x, y), keys in self.__cells.items():
+                if cx1 <= x <= cx2 and cy1 <= y <= cy2:
+                    candidates.update(keys)
+        else:
+            for x in range(cx1, cx2 + 1):
+                for y in range(cy1, cy2 + 1):
+                    keys = self.__cells.get((x, y))
+                    if keys:
+                        candidates.update(keys)
+        result = []
+        for key in candidates:
+            bx1, by1, bx2, by2 = self.__bounds[key]
+            if inside:
+                if x1 <= bx1 and y1 <= by1 and bx2 <= x2 and by2 <= y2:
+                    result.append(key)
+            elif bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2:
+                result.append(key)
+        return result
+
+    # ----------------------------------------------------------------------
+    def get_extent(self) -> Optional[Bounds]:
+        """
+        Get the bounds of all the boxes, or None if there are none.
+        """
+        if self.__extent is None and self.__bounds:
+            boxes = self.__bounds.values()
+            self.__extent = (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                             max(box[2] for box in boxes), max(box[3] for box in boxes))
+        return self.__extent
+
+# ----------------------------------------------------------------------
@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+"""
+This module contains the Autosave class.
+"""
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from mosaicode.model.commandhistory import (
+    AddBlock, AddComment, AddConnection, MoveBlocks, RemoveBlock,
+    RemoveConnection, SetProperties)
+from mosaicode.persistence.diagrampersistence import DiagramPersistence
+from mosaicode.persistence.jsonstream import JSONStreamReader
+from mosaicode.system import System as System
+from mosaicode.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Autosave:
+    """
+    This class keeps the unsaved changes of a diagram on disk, so they can
+    be recovered after a crash.
+
+    Each action of the diagram history is appended to a journal as a few
+    records, built from its commands: the cost is the size of the change,
+    not the size of the diagram. The journal is written by a background
+    thread, which syncs it to disk at most once each SYNC_INTERVAL.
+
+    After COMPACT_RECORDS records the diagram is written to a snapshot and
+    the journal starts again. Both files carry a generation number, so a
+    journal is only replayed over the snapshot it was started from.
+
+    A diagram is recovered from its snapshot (or from its file, when there
+    is no snapshot yet) and the records of its journal.
+    """
+
+    FORMAT = 1
+    # Seconds between the syncs of the journal
+    SYNC_INTERVAL = 1.0
+    # Records in the journal before it is compacted in a snapshot
+    COMPACT_RECORDS = 1000
+    # Threads of the closed diagrams still writing (see wait_stopped)
+    __stopping: List[threading.Thread] = []
+
+    # ----------------------------------------------------------------------
+    def __init__(self, diagram: Any, directory: Optional[str] = None) -> None:
+        """
+        Start recording the changes of a diagram.
+
+        Args:
+            diagram: The diagram
+            directory: Directory of the autosave files, "autosave" in the
+                user directory by default
+        """
+        if directory is None:
+            directory = str(System.get_user_dir() / "autosave")
+        self.directory: Path = Path(directory)
+        self.diagram: Any = diagram
+        self.key: str = self.get_key(diagram.file_name)
+        self.__generation: int = 0
+        # Records written since the last snapshot
+        self.__records: int = 0
+        self.__queue: "queue.Queue[Tuple[Any, ...]]" = queue.Queue()
+        self.__thread: Optional[threading.Thread] = None
+        diagram._journal = self
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_key(cls, file_name: Optional[str]) -> str:
+        """
+        Get the name of the autosave files of a diagram file.
+        """
+        if not file_name or file_name == "Untitled":
+            return uuid.uuid4().hex
+        return hashlib.sha1(os.path.abspath(file_name).encode("utf-8")).hexdigest()[:16]
+
+    # ----------------------------------------------------------------------
+    def get_journal_name(self) -> str:
+        return str(self.directory / (self.key + ".journal"))
+
+    # ----------------------------------------------------------------------
+    def get_snapshot_name(self) -> str:
+        return str(self.directory / (self.key + ".mscd"))
+
+    # ----------------------------------------------------------------------
+    def __header(self) -> Dict[str, Any]:
+        return {"format": self.FORMAT,
+                "generation": self.__generation,
+                "file_name": self.diagram.file_name}
+
+    # ----------------------------------------------------------------------
+    def __put(self, *item: Any) -> None:
+        if self.__thread is None or not self.__thread.is_alive():
+            self.__thread = threading.Thread(target=self.__run,
+                                             name="autosave-" + self.key,
+                                             daemon=True)
+            self.__thread.start()
+        self.__queue.put(item)
+
+    # ----------------------------------------------------------------------
+    def record(self, commands: List[Any], undo: bool = False) -> None:
+        """
+        Record an action of the diagram history. Called by CommandHistory
+        after the action was done, undone or redone.
+
+        Args:
+            commands: The commands of the action
+            undo: True if the action was undone
+        """
+        records = self.get_records(commands, undo)
+        if not records:
+            return
+        self.__put("write", self.get_journal_name(), self.__header(), records)
+        self.__records += len(records)
+        if self.__records >= self.COMPACT_RECORDS:
+            self.snapshot()
+
+    # ----------------------------------------------------------------------
+    def get_records(self, commands: List[Any], undo: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get the journal records of an action.
+        """
+        records = []
+        comments = False
+        for command in reversed(commands) if undo else commands:
+            if isinstance(command, AddComment):
+                # Comments have no id: the list is recorded once
+                comments = True
+            elif isinstance(command, AddConnection):
+                added = isinstance(command, RemoveConnection) == undo
+                record = {"op": "add_connection" if added else "remove_connection"}
+                record.update(DiagramPersistence.get_connection_data(command.connection))
+                records.append(record)
+            elif isinstance(command, (AddBlock, RemoveBlock)):
+                if isinstance(command, RemoveBlock) != undo:
+                    records.append({"op": "remove_block", "id": command.block.id})
+                    continue
+                records.append({"op": "add_block",
+                                "block": DiagramPersistence.get_block_data(command.block)})
+                for connection in getattr(command, "connections", []):
+                    record = {"op": "add_connection"}
+                    record.update(DiagramPersistence.get_connection_data(connection))
+                    records.append(record)
+            elif isinstance(command, MoveBlocks):
+                index = 0 if undo else 1
+                records.append({"op": "move",
+                                "positions": {str(block_id): list(positions[index])
+                                              for block_id, positions in
+                                              command.positions.items()}})
+            elif isinstance(command, SetProperties):
+                properties = command.old if undo else command.new
+                records.append({"op": "properties",
+                                "id": command.block_id,
+                                "properties": [{"key": str(prop["name"]),
+                                                "value": str(prop["value"])}
+                                               for prop in properties]})
+        if comments:
+            records.append({"op": "comments",
+                            "comments": [DiagramPersistence.get_comment_data(comment)
+                                         for comment in self.diagram.comments]})
+        return records
+
+    # ----------------------------------------------------------------------
+    def snapshot(self) -> None:
+        """
+        Write the whole diagram to the snapshot and start a new journal.
+        The data is built here and written by the background thread.
+        """
+        self.__generation += 1
+        self.__records = 0
+        data = {"autosave": self.__header()}
+        for key, value in DiagramPersistence.get_data(self.diagram).items():
+            data[key] = list(value) if isinstance(value, map) else value
+        self.__put("snapshot", self.get_snapshot_name(), data,
+                   self.get_journal_name(), self.__header())
+
+    # ----------------------------------------------------------------------
+    def reset(self) -> None:
+        """
+        Drop the journal and the snapshot, after the diagram was saved (or
+        loaded). The next changes are recorded over the diagram file.
+        """
+        self.__put("remove", [self.get_journal_name(), self.get_snapshot_name()])
+        self.key = self.get_key(self.diagram.file_name)
+        self.__generation = 0
+        self.__records = 0
+
+    # ----------------------------------------------------------------------
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the records are on disk.
+
+        Returns:
+            True if the background thread finished in time
+        """
+        if self.__thread is None or not self.__thread.is_alive():
+            return True
+        done = threading.Event()
+        self.__queue.put(("flush", done))
+        return done.wait(timeout)
+
+    # ----------------------------------------------------------------------
+    def discard(self) -> None:
+        """
+        Stop recording and remove the autosave files, when the diagram is
+        closed. The background thread finishes on its own; it is not
+        waited for (see wait_stopped).
+        """
+        self.__put("remove", [self.get_journal_name(), self.get_snapshot_name()])
+        self.__queue.put(("stop",))
+        if self.diagram._journal is self:
+            self.diagram._journal = None
+        stopping = Autosave.__stopping
+        stopping[:] = [thread for thread in stopping if thread.is_alive()]
+        stopping.append(self.__thread)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def wait_stopped(cls, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the threads of the discarded autosaves, at exit.
+
+        Returns:
+            True if they finished in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in list(Autosave.__stopping):
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        Autosave.__stopping[:] = [thread for thread in Autosave.__stopping
+                                  if thread.is_alive()]
+        return not Autosave.__stopping
+
+    # ----------------------------------------------------------------------
+    def __run(self) -> None:
+        """
+        Write the queued records, snapshots and removals in order.
+        """
+        journal = None
+        journal_name = None
+        synced = True
+        last_sync = time.monotonic()
+        while True:
+            try:
+                item = self.__queue.get(timeout=None if synced else self.SYNC_INTERVAL)
+            except queue.Empty:
+                item = None
+            try:
+                if item is None or item[0] in ("flush", "stop"):
+                    pass
+                elif item[0] == "write":
+                    name, header, records = item[1:]
+                    if journal is None or journal_name != name:
+                        if journal is not None:
+                            journal.close()
+                        journal = self.__open_journal(name, header)
+                        journal_name = name
+                    journal.write("".join(json.dumps(record) + "\n" for record in records))
+                    synced = False
+                elif item[0] == "snapshot":
+                    name, data, journal_name, header = item[1:]
+                    if journal is not None:
+                        journal.close()
+                    self.__write_snapshot(name, data)
+                    # The journal is started again only after the snapshot
+                    # replaced the old one
+                    journal = self.__open_journal(journal_name, header)
+                    synced = True
+                elif item[0] == "remove":
+                    if journal is not None and journal_name in item[1]:
+                        journal.close()
+                        journal = None
+                    for name in item[1]:
+                        if os.path.exists(name):
+                            os.unlink(name)
+                if journal is not None and not synced and \
+                        (item is None or item[0] != "write" or
+                         time.monotonic() - last_sync >= self.SYNC_INTERVAL):
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                    synced = True
+                    last_sync = time.monotonic()
+            except (OSError, ValueError) as error:
+                logger.warning(f"Autosave of {self.diagram.file_name} failed: {error}")
+            if item is not None and item[0] == "flush":
+                item[1].set()
+            elif item is not None and item[0] == "stop":
+                if journal is not None:
+                    journal.close()
+                return
+
+    # ----------------------------------------------------------------------
+    def __open_journal(self, name: str, header: Dict[str, Any]) -> Any:
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+        journal = open(name, "w", encoding="utf-8")
+        journal.write(json.dumps(header) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+        return journal
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __write_snapshot(cls, name: str, data: Dict[str, Any]) -> None:
+        directory = os.path.dirname(name)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as snapshot:
+                snapshot.write(json.dumps(data))
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(temp_name, name)
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __read_journal(cls, name: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Read the header and the records of a journal. A record cut by a
+        crash ends the journal.
+        """
+        header: Dict[str, Any] = {}
+        records = []
+        try:
+            with open(name, "r", encoding="utf-8") as journal:
+                for i, line in enumerate(journal):
+                    try:
+                        value = json.loads(line)
+                    except ValueError:
+                        break
+                    if i == 0:
+                        header = value
+                    else:
+                        records.append(value)
+        except OSError:
+            pass
+        return header, records
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_recoverable(cls, directory: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        Get the diagrams left by a previous session.
+
+        Returns:
+            List of (key, diagram file name)
+        """
+        if directory is None:
+            directory = str(System.get_user_dir() / "autosave")
+        diagrams = []
+        for journal in sorted(Path(directory).glob("*.journal")):
+            header, records = cls.__read_journal(str(journal))
+            snapshot = journal.with_suffix(".mscd")
+            if not records and not snapshot.exists():
+                continue
+            diagrams.append((journal.stem, str(header.get("file_name", "Untitled"))))
+        return diagrams
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def recover(cls, diagram: Any, key: str, directory: Optional[str] = None) -> bool:
+        """
+        Rebuild a diagram model from its autosave files, and remove them.
+        The widgets of a GUI diagram are created by its redraw.
+
+        Returns:
+            True if the diagram was recovered
+        """
+        if directory is None:
+            directory = str(System.get_user_dir() / "autosave")
+        journal_name = os.path.join(directory, key + ".journal")
+        snapshot_name = os.path.join(directory, key + ".mscd")
+        header, records = cls.__read_journal(journal_name)
+        file_name = str(header.get("file_name", "Untitled"))
+        generation = header.get("generation", 0)
+
+        base = None
+        if os.path.exists(snapshot_name):
+            base = snapshot_name
+            try:
+                with JSONStreamReader(snapshot_name) as snapshot:
+                    autosave = snapshot.get("autosave", {})
+            except ValueError:
+                autosave = {}
+            if not header:
+                file_name = str(autosave.get("file_name", file_name))
+            # A journal older than the snapshot was already compacted
+            if autosave.get("generation") != generation:
+                records = []
+        elif generation == 0 and file_name != "Untitled" and os.path.exists(file_name):
+            base = file_name
+        elif generation != 0:
+            System.log("Autosave snapshot of " + file_name + " not found")
+            return False
+
+        if base is not None:
+            diagram.file_name = base
+            if not DiagramPersistence.load_model(diagram):
+                diagram.file_name = file_name
+                return False
+        diagram.file_name = file_name
+        for record in records:
+            cls.__apply(diagram, record)
+        cls.remove(key, directory)
+        return True
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def remove(cls, key: str, directory: Optional[str] = None) -> None:
+        """
+        Remove the autosave files left by a previous session.
+        """
+        if directory is None:
+            directory = str(System.get_user_dir() / "autosave")
+        for extension in (".journal", ".mscd"):
+            name = os.path.join(directory, key + extension)
+            if os.path.exists(name):
+                os.unlink(name)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __apply(cls, diagram: Any, record: Dict[str, Any]) -> None:
+        """
+        Apply a journal record to a diagram model.
+        """
+        language = diagram.language
+        if language == 'None':
+            language = None
+        op = record.get("op")
+        if op == "add_block":
+            block = DiagramPersistence.create_block(record["block"],
+                                                    System.get_blocks(language),
+                                                    System.get_ports(language))
+            if block is None:
+                return
+            if block.id in diagram.blocks:
+                diagram.remove_block(block.id)
+            if language is None:
+                diagram.language = block.language
+            diagram.blocks[block.id] = block
+            diagram.last_id = max(int(diagram.last_id), block.id + 1)
+        elif op == "remove_block":
+            if record["id"] in diagram.blocks:
+                diagram.remove_block(record["id"])
+        elif op == "add_connection":
+            connection = DiagramPersistence.create_connection(diagram, record)
+            if connection is not None:
+                diagram.add_connection(connection)
+        elif op == "remove_connection":
+            for connection in diagram.get_outgoing(record["from_block"]):
+                if connection.output_port.index == record["from_out"] and \
+                        connection.input.id == record["to_block"] and \
+                        connection.input_port.index == record["to_in"]:
+                    diagram.remove_connection(connection)
+                    break
+        elif op == "move":
+            for block_id, position in record["positions"].items():
+                block = diagram.blocks.get(int(block_id))
+                if block is not None:
+                    block.x, block.y = position
+        elif op == "properties":
+            block = diagram.blocks.get(record["id"])
+            if block is not None:
+                block.set_properties({prop["key"]: prop["value"]
+                                      for prop in record["properties"]})
+        elif op == "comments":
+            diagram.comments[:] = [DiagramPersistence.create_comment(comment)
+                                   for comment in record["comments"]]
+
+# ----------------------------------------------------------------------
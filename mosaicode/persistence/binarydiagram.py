@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+"""
+This module contains the BinaryDiagram class and the ``mosaicode-convert``
+command, which converts diagrams between the JSON (.mscd) and the binary
+(.mscdb) formats.
+
+The binary file keeps the same data as the JSON one:
+
+* a header with the magic, the format, flags and the sections table;
+* a JSON section with everything but the packed arrays;
+* a string table (offsets and UTF-8 data) for block types, property keys
+  and values;
+* packed arrays of blocks, block properties and connections.
+
+Blocks and connections that do not fit the packed records (hand written
+files with other keys or value types) are kept in the JSON section, so
+the conversion is always lossless.
+"""
+import argparse
+import json
+import mmap
+import struct
+import sys
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from mosaicode.utils.FileUtils import atomic_write
+
+MAGIC = b"MSCDB\0\0\0"
+# magic, format, flags, then (offset, count) of each section
+HEADER = struct.Struct("<8sII12Q")
+# id, type, x, y, flags, first property, property count
+BLOCK = struct.Struct("<qIddBII")
+# key, value (VALUE_JSON set when the value is not a string)
+PROPERTY = struct.Struct("<II")
+# from_block, from_out, to_block, to_in
+CONNECTION = struct.Struct("<qiqi")
+OFFSET = struct.Struct("<Q")
+
+BLOCK_KEYS = ["type", "id", "collapsed", "x", "y", "properties"]
+PROPERTY_KEYS = ["key", "value"]
+CONNECTION_KEYS = ["from_block", "from_out", "to_block", "to_in"]
+
+# Header flags
+BLOCKS_PACKED = 1
+CONNECTIONS_PACKED = 2
+# Block flags
+COLLAPSED = 1
+X_INT = 2
+Y_INT = 4
+VALUE_JSON = 0x80000000
+
+INT32 = (-2 ** 31, 2 ** 31)
+INT64 = (-2 ** 63, 2 ** 63)
+EXACT_FLOAT = 2 ** 53
+
+
+def _is_int(value: Any, limits: Tuple[int, int]) -> bool:
+    return type(value) is int and limits[0] <= value < limits[1]
+
+
+def _is_number(value: Any) -> bool:
+    return type(value) is float or \
+        (type(value) is int and -EXACT_FLOAT <= value <= EXACT_FLOAT)
+
+
+class _Records(Sequence):
+    """
+    Records of a packed array, unpacked when read.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, buffer: Any, offset: int, count: int,
+                 record: struct.Struct, decode: Any) -> None:
+        self.__buffer = buffer
+        self.__offset = offset
+        self.__count = count
+        self.__record = record
+        self.__decode = decode
+
+    # ----------------------------------------------------------------------
+    def __len__(self) -> int:
+        return self.__count
+
+    # ----------------------------------------------------------------------
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.__count))]
+        if index < 0:
+            index += self.__count
+        if not 0 <= index < self.__count:
+            raise IndexError("record index out of range")
+        return self.__decode(self.__record.unpack_from(
+            self.__buffer, self.__offset + index * self.__record.size))
+
+    # ----------------------------------------------------------------------
+    def __iter__(self) -> Iterator[Any]:
+        end = self.__offset + self.__count * self.__record.size
+        view = memoryview(self.__buffer)[self.__offset:end]
+        try:
+            for values in self.__record.iter_unpack(view):
+                yield self.__decode(values)
+        finally:
+            view.release()
+
+
+class BinaryDiagram(Mapping):
+    """
+    This class reads a binary diagram file as the mapping loaded from the
+    JSON file. The file is mapped in memory and the blocks, their
+    properties and the connections are decoded only when read.
+    """
+
+    EXTENSION = ".mscdb"
+    FORMAT = 1
+
+    # ----------------------------------------------------------------------
+    def __init__(self, file_name: str) -> None:
+        """
+        Open a binary diagram file.
+
+        Raises:
+            ValueError: if it is not a binary diagram
+        """
+        self.file_name: str = str(file_name)
+        with open(self.file_name, 'rb') as binary_file:
+            try:
+                self.__buffer = mmap.mmap(binary_file.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ValueError("Empty file " + self.file_name)
+        try:
+            self.__read_header()
+        except Exception:
+            self.close()
+            raise
+
+    # ----------------------------------------------------------------------
+    def __read_header(self) -> None:
+        if len(self.__buffer) < HEADER.size:
+            raise ValueError("Not a binary diagram: " + self.file_name)
+        values = HEADER.unpack_from(self.__buffer, 0)
+        if values[0] != MAGIC:
+            raise ValueError("Not a binary diagram: " + self.file_name)
+        if values[1] != self.FORMAT:
+            raise ValueError("Unknown binary diagram format " + str(values[1]))
+        flags = values[2]
+        sections = [values[i:i + 2] for i in range(3, 15, 2)]
+        # Size in bytes of each section
+        sizes = [sections[0][1], (sections[1][1] + 1) * OFFSET.size,
+                 sections[2][1], sections[3][1] * BLOCK.size,
+                 sections[4][1] * PROPERTY.size,
+                 sections[5][1] * CONNECTION.size]
+        for (offset, count), size in zip(sections, sizes):
+            if offset + size > len(self.__buffer):
+                raise ValueError("Truncated binary diagram: " + self.file_name)
+
+        offset, size = sections[0]
+        self.__data: Dict[str, Any] = json.loads(
+            bytes(self.__buffer[offset:offset + size]).decode("utf-8"))
+        self.__string_offsets = sections[1][0]
+        self.__string_count = sections[1][1]
+        self.__string_data = sections[2][0]
+        self.__strings: Dict[int, str] = {}
+
+        self.__properties = _Records(self.__buffer, *sections[4], PROPERTY,
+                                     self.__decode_property)
+        if flags & BLOCKS_PACKED:
+            self.__data["blocks"] = _Records(self.__buffer, *sections[3], BLOCK,
+                                             self.__decode_block)
+        if flags & CONNECTIONS_PACKED:
+            self.__data["connections"] = _Records(
+                self.__buffer, *sections[5], CONNECTION,
+                lambda values: dict(zip(CONNECTION_KEYS, values)))
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def is_binary(cls, file_name: str) -> bool:
+        """
+        Check if a file is a binary diagram, by its magic.
+        """
+        try:
+            with open(str(file_name), 'rb') as binary_file:
+                return binary_file.read(len(MAGIC)) == MAGIC
+        except OSError:
+            return False
+
+    # ----------------------------------------------------------------------
+    def get_string(self, index: int) -> str:
+        """
+        Get a string of the string table.
+        """
+        string = self.__strings.get(index)
+        if string is None:
+            if not 0 <= index < self.__string_count:
+                raise ValueError("Invalid string index " + str(index))
+            start, end = struct.unpack_from(
+                "<2Q", self.__buffer, self.__string_offsets + index * OFFSET.size)
+            string = bytes(self.__buffer[self.__string_data + start:
+                                         self.__string_data + end]).decode("utf-8")
+            self.__strings[index] = string
+        return string
+
+    # ----------------------------------------------------------------------
+    def __decode_property(self, values: Tuple[int, int]) -> Dict[str, Any]:
+        key, value = values
+        if value & VALUE_JSON:
+            return {"key": self.get_string(key),
+                    "value": json.loads(self.get_string(value & ~VALUE_JSON))}
+        return {"key": self.get_string(key), "value": self.get_string(value)}
+
+    # ----------------------------------------------------------------------
+    def __decode_block(self, values: Tuple[Any, ...]) -> Dict[str, Any]:
+        block_id, block_type, x, y, flags, first, count = values
+        return {"type": self.get_string(block_type),
+                "id": block_id,
+                "collapsed": bool(flags & COLLAPSED),
+                "x": int(x) if flags & X_INT else x,
+                "y": int(y) if flags & Y_INT else y,
+                "properties": self.__properties[first:first + count]}
+
+    # ----------------------------------------------------------------------
+    def __getitem__(self, key: str) -> Any:
+        return self.__data[key]
+
+    # ----------------------------------------------------------------------
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__data)
+
+    # ----------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    # ----------------------------------------------------------------------
+    def to_data(self) -> Dict[str, Any]:
+        """
+        Get all the data, as loaded from the JSON file.
+        """
+        data = {}
+        for key, value in self.__data.items():
+            data[key] = list(value) if isinstance(value, _Records) else value
+        return data
+
+    # ----------------------------------------------------------------------
+    def close(self) -> None:
+        # Records still referencing the buffer keep it alive
+        if not self.__buffer.closed:
+            try:
+                self.__buffer.close()
+            except BufferError:
+                pass
+
+    # ----------------------------------------------------------------------
+    def __enter__(self) -> "BinaryDiagram":
+        return self
+
+    # ----------------------------------------------------------------------
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __packable_block(cls, block: Any) -> bool:
+        if not isinstance(block, dict) or list(block) != BLOCK_KEYS or \
+                type(block["type"]) is not str or \
+                not _is_int(block["id"], INT64) or \
+                type(block["collapsed"]) is not bool or \
+                not _is_number(block["x"]) or not _is_number(block["y"]) or \
+                not isinstance(block["properties"], list):
+            return False
+        return all(isinstance(prop, dict) and list(prop) == PROPERTY_KEYS and
+                   type(prop["key"]) is str for prop in block["properties"])
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __packable_connection(cls, connection: Any) -> bool:
+        return isinstance(connection, dict) and \
+            list(connection) == CONNECTION_KEYS and \
+            _is_int(connection["from_block"], INT64) and \
+            _is_int(connection["from_out"], INT32) and \
+            _is_int(connection["to_block"], INT64) and \
+            _is_int(connection["to_in"], INT32)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def dumps(cls, data: Dict[str, Any]) -> bytes:
+        """
+        Encode the diagram data (as saved to JSON) in the binary format.
+        """
+        strings: Dict[str, int] = {}
+
+        def intern(string: str) -> int:
+            index = strings.get(string)
+            if index is None:
+                index = strings[string] = len(strings)
+            return index
+
+        blocks = data.get("blocks")
+        connections = data.get("connections")
+        flags = 0
+        header = dict(data)
+        block_data = bytearray()
+        property_data = bytearray()
+        property_count = 0
+        if isinstance(blocks, list) and \
+                all(cls.__packable_block(block) for block in blocks):
+            flags |= BLOCKS_PACKED
+            header["blocks"] = None
+            block_data = bytearray(BLOCK.size * len(blocks))
+            for i, block in enumerate(blocks):
+                block_flags = COLLAPSED if block["collapsed"] else 0
+                if type(block["x"]) is int:
+                    block_flags |= X_INT
+                if type(block["y"]) is int:
+                    block_flags |= Y_INT
+                BLOCK.pack_into(block_data, i * BLOCK.size, block["id"],
+                                intern(block["type"]), block["x"], block["y"],
+                                block_flags, property_count,
+                                len(block["properties"]))
+                for prop in block["properties"]:
+                    value = prop["value"]
+                    if type(value) is str:
+                        value = intern(value)
+                    else:
+                        value = intern(json.dumps(value)) | VALUE_JSON
+                    property_data += PROPERTY.pack(intern(prop["key"]), value)
+                    property_count += 1
+
+        connection_data = bytearray()
+        if isinstance(connections, list) and \
+                all(cls.__packable_connection(conn) for conn in connections):
+            flags |= CONNECTIONS_PACKED
+            header["connections"] = None
+            connection_data = bytearray(CONNECTION.size * len(connections))
+            for i, conn in enumerate(connections):
+                CONNECTION.pack_into(connection_data, i * CONNECTION.size,
+                                     conn["from_block"], conn["from_out"],
+                                     conn["to_block"], conn["to_in"])
+
+        header_data = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        string_data = bytearray()
+        string_offsets = bytearray(OFFSET.pack(0))
+        for string in strings:
+            string_data += string.encode("utf-8")
+            string_offsets += OFFSET.pack(len(string_data))
+
+        sections = [(header_data, len(header_data)),
+                    (string_offsets, len(strings)),
+                    (string_data, len(string_data)),
+                    (block_data, len(blocks) if flags & BLOCKS_PACKED else 0),
+                    (property_data, property_count),
+                    (connection_data,
+                     len(connections) if flags & CONNECTIONS_PACKED else 0)]
+        table = []
+        offset = HEADER.size
+        for section, count in sections:
+            table += [offset, count]
+            offset += len(section)
+        return b"".join([HEADER.pack(MAGIC, cls.FORMAT, flags, *table)] +
+                        [bytes(section) for section, count in sections])
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def write(cls, file_name: str, data: Dict[str, Any]) -> None:
+        """
+        Write the diagram data to a binary file, replacing it at once.
+        """
+        content = cls.dumps(data)
+        with atomic_write(str(file_name), 'wb') as binary_file:
+            binary_file.write(content)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def convert(cls, source: str, target: str) -> None:
+        """
+        Convert a diagram file between the JSON and the binary formats.
+        The format of the target is given by its extension.
+        """
+        if cls.is_binary(source):
+            with cls(source) as binary:
+                data = binary.to_data()
+        else:
+            with open(source, 'r') as data_file:
+                data = json.load(data_file)
+        if str(target).endswith(cls.EXTENSION):
+            cls.write(target, data)
+        else:
+            with atomic_write(str(target)) as data_file:
+                data_file.write(json.dumps(data, indent=4))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of the ``mosaicode-convert`` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog="mosaicode-convert",
+        description="Convert Mosaicode diagrams between JSON (.mscd) and "
+                    "binary (.mscdb) files.")
+    parser.add_argument('file', type=str, nargs='+',
+                        help="Diagram files")
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help="Output file (a single input file only). By "
+                             "default the extension of each file is swapped")
+    args = parser.parse_args(argv)
+    if args.output is not None and len(args.file) > 1:
+        parser.error("--output needs a single input file")
+
+    status = 0
+    for file_name in args.file:
+        target = args.output
+        if target is None:
+            path = Path(file_name)
+            extension = ".mscd" if BinaryDiagram.is_binary(file_name) \
+                else BinaryDiagram.EXTENSION
+            target = str(path.with_suffix(extension))
+        try:
+            BinaryDiagram.convert(file_name, target)
+        except (OSError, ValueError) as error:
+            print(file_name + ": " + str(error), file=sys.stderr)
+            status = 1
+            continue
+        print(file_name + ": " + target)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# ----------------------------------------------------------------------
@@ -3,13 +3,13 @@
 """
 This module contains the BlockPersistence class.
 """
-import copy
 import ast
 import inspect  # For module inspect
 from pathlib import Path
 import pkgutil  # For dynamic package load
 import json
 import logging
+import sys
 from mosaicode.model.blockmodel import BlockModel
 from mosaicode.persistence.persistence import Persistence
 from typing import Dict, List, Optional, Any, Union
@@ -23,10 +23,15 @@ class BlockPersistence():
 
     # ----------------------------------------------------------------------
     @classmethod
-    def load(cls, file_name: str) -> Optional[BlockModel]:
+    def load(cls, file_name: str,
+             ports: Optional[Dict[str, Any]] = None) -> Optional[BlockModel]:
         """
         This method loads the block from JSON file.
 
+        Args:
+            file_name: Path to the block file
+            ports: Registry ports by type (defaults to System.get_ports())
+
         Returns:
 
             * **Types** (:class:`boolean<boolean>`)
@@ -47,13 +52,14 @@ class BlockPersistence():
                 return None
 
             # Definir o tipo do bloco a partir do JSON
-            block.type = data.get("type", "")
-            block.language = data.get("language", "")
-            block.extension = data.get("extension", "")
+            # (strings shared by many blocks are interned)
+            block.type = sys.intern(data.get("type", ""))
+            block.language = sys.intern(data.get("language", ""))
+            block.extension = sys.intern(data.get("extension", ""))
             block.help = data.get("help", "")
             block.label = data.get("label", "")
             block.color = data.get("color", "#000000")
-            block.group = data.get("group", "Undefined")
+            block.group = sys.intern(data.get("group", "Undefined"))
             block.version = data.get("version", "0.0.1")
 
             # Validate and fix generic labels
@@ -85,29 +91,32 @@ class BlockPersistence():
                         prop_norm[k] = prop[k]
                 block.properties.append(prop_norm)
 
-            # Portas
-            ports = data["ports"]
+            # Portas: the block ports share the registry port types
+            from mosaicode.model.port import Port, PortRef
+            if ports is None:
+                from mosaicode.system import System as System
+                ports = System.get_ports()
             in_port: int = 0
             out_port: int = 0
+            port_types = {}
 
-            for idx, port_data in enumerate(ports):
-                from mosaicode.model.port import Port
-                from mosaicode.system import System as System
-                port = copy.deepcopy(System.get_ports()[port_data.get("type", "")])
+            for idx, port_data in enumerate(data["ports"]):
+                port_type = port_data.get("type", "")
+                if port_type not in port_types:
+                    port_types[port_type] = ports[port_type].get_port_type()
                 conn_type = port_data.get("conn_type", "OUTPUT")
                 if str(conn_type).upper() == "INPUT":
-                    port.conn_type = Port.INPUT
-                    port.type_index = in_port
+                    conn_type = Port.INPUT
                     in_port += 1
                 else:
-                    port.conn_type = Port.OUTPUT
-                    port.type_index = out_port
+                    conn_type = Port.OUTPUT
                     out_port += 1
-                port.name = port_data.get("name", "")
-                port.label = port_data.get("label", "")
-                port.type_index = port_data.get("type_index", idx)
-                port.hint = port_data.get("hint", "")
-                block.ports.append(port)
+                block.ports.append(PortRef(port_types[port_type],
+                                           conn_type=conn_type,
+                                           name=port_data.get("name", ""),
+                                           label=port_data.get("label", ""),
+                                           type_index=port_data.get("type_index", idx),
+                                           hint=port_data.get("hint", "")))
 
             block.maxIO = max(in_port, out_port)
 
@@ -4,12 +4,8 @@
 This module contains the DiagramPersistence class.
 """
 import os
-import gi
-import json
 from copy import deepcopy
 from pathlib import Path
-gi.require_version('Gdk', '3.0')
-from gi.repository import Gdk
 from datetime import datetime
 from mosaicode.system import System as System
 from mosaicode.model.connectionmodel import ConnectionModel
@@ -17,6 +13,9 @@ from mosaicode.model.commentmodel import CommentModel
 from mosaicode.model.authormodel import AuthorModel
 from mosaicode.model.diagrammodel import DiagramModel
 from mosaicode.control.blockcontrol import BlockControl
+from mosaicode.persistence.binarydiagram import BinaryDiagram
+from mosaicode.persistence.jsonstream import JSONStreamReader, JSONStreamWriter
+from mosaicode.utils.FileUtils import atomic_write
 
 class DiagramPersistence():
     """
@@ -38,240 +37,405 @@ class DiagramPersistence():
         if not isinstance(diagram, DiagramModel):
             System.log("Problem loading the diagram. Is this a Diagram?")
             return False
-        from mosaicode.control.diagramcontrol import DiagramControl
-        dc = DiagramControl(diagram)
-        # load the diagram
-        data = ""
 
+        data = None
         try:
-            data_file = open(diagram.file_name, 'r')
-            data = json.load(data_file)
-            data_file.close()
+            data = cls.__read(diagram)
+            if data is None:
+                return False
+            cls.__build(diagram, data)
+        except Exception as e:
+            System.log("Problem loading the diagram: " + str(e))
+            return False
+        finally:
+            if isinstance(data, (BinaryDiagram, JSONStreamReader)):
+                data.close()
+
+        # The block, connection and comment widgets are created here
+        diagram.redraw()
+        return True
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def load_model(cls, diagram):
+        """
+        This method load the JSON file into a plain DiagramModel, without
+        any GUI object. It is used to generate code without GTK.
 
-            if data["data"] != "DIAGRAM":
-                System.log("Problem loading the diagram. Are you sure this is a valid file?")
+            :param diagram: DiagramModel to load.
+            :return: operation status (True or False)
+        """
+        if not Path(diagram.file_name).exists():
+            System.log("Problem loading the diagram. File does not exist.")
+            return False
+
+        data = None
+        try:
+            data = cls.__read(diagram)
+            if data is None:
                 return False
+            cls.__build(diagram, data)
+        except Exception as e:
+            System.log("Problem loading the diagram: " + str(e))
+            return False
+        finally:
+            if isinstance(data, (BinaryDiagram, JSONStreamReader)):
+                data.close()
+
+        return True
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __build(cls, diagram, data):
+        """
+        This method builds the diagram content from the file data in one
+        pass. It does not go through the editing path (history, language
+        checks and redraws of each added item).
+
+            :param diagram: diagram to fill.
+            :param data: the file data.
+        """
+        language = cls.__get_language(diagram)
+        system_blocks = System.get_blocks(language)
+        system_ports = System.get_ports(language)
+
+        blocks = {}
+        for block in data.get("blocks", []):
+            new_block = cls.create_block(block, system_blocks, system_ports)
+            if new_block is None:
+                continue
+            if language is None:
+                language = diagram.language = new_block.language
+            elif new_block.language != language:
+                System.log("Block language is different from diagram language.")
+                continue
+            blocks[new_block.id] = new_block
+        diagram.blocks.update(blocks)
+        if blocks:
+            diagram.last_id = max(int(diagram.last_id), max(blocks)) + 1
+
+        connections = []
+        # Input ports already connected: (block id, port index)
+        used_inputs = set()
+        for conn in data.get("connections", []):
+            connection = cls.create_connection(diagram, conn)
+            if connection is None:
+                continue
+            key = (connection.input.id, connection.input_port.index)
+            if key in used_inputs and not connection.input_port.multiple:
+                System.log("Diagram error: input port already connected")
+                continue
+            used_inputs.add(key)
+            connections.append(connection)
+        # Indexed once, instead of on each connection
+        diagram.set_connections(diagram.connectors + connections)
+
+        diagram.comments.extend(
+            cls.create_comment(com) for com in data.get("comments", []))
+        cls.__load_authors(diagram, data)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def open_data(cls, file_name):
+        """
+        This method opens a diagram file, JSON or binary, as a mapping.
+        Blocks and connections are decoded while they are read; the data
+        must be closed.
 
-            if "zoom" in data:
-                diagram.zoom = float(data["zoom"])
-            if "language" in data:
-                diagram.language = data["language"]
-
-            # Loading Code Template
-            if "code_template" in data:
-                code_template_data = data["code_template"]
-                if "type" in code_template_data:
-                    code_template = code_template_data["type"]
-                    if code_template not in System.get_code_templates():
-                        System.log("Code Template " + code_template + " not found")
-                    else:
-                        code_template = System.get_code_templates()[code_template]
-                        diagram.code_template = deepcopy(code_template)
-                if "properties" in code_template_data:
-                    properties = code_template_data["properties"]
-                    props = {}
-                    for prop in properties:
-                        props[prop["key"]] = prop["value"]
-                    diagram.code_template.set_properties(props)
-
-            # Loading Blocks
-            if "blocks" in data:        
-                blocks = data["blocks"]
-                system_blocks = System.get_blocks()
-                system_ports = System.get_ports()
-                for block in blocks:
-                    block_type = block["type"]
-                    if block_type not in system_blocks:
-                        System.log("Block " + block_type + " not found")
-                        continue
-                    block_id = int(block["id"])
-                    collapsed = block["collapsed"]
-                    x = block["x"]
-                    y = block["y"]
-                    properties = block["properties"]
-                    props = {}
-                    for prop in properties:
-                        props[prop["key"]] = prop["value"]
-                    new_block = deepcopy(system_blocks[block_type])
-                    new_block.set_properties(props)
-                    new_block.id = block_id
-                    new_block.x = float(x)
-                    new_block.y = float(y)
-                    new_block.is_collapsed = collapsed
-                    
-                    # Garantir que as portas sejam indexadas corretamente
-                    BlockControl.load_ports(new_block, system_ports)
-                    
-                    dc.add_block(new_block)
-
-            # Loading connections
-            connections = data["connections"]
-            for conn in connections:
-                try:
-                    from_block = diagram.blocks[int(conn["from_block"])]
-                    to_block = diagram.blocks[int(conn["to_block"])]
-                    port_index = int(conn["from_out"])
-                    if port_index >= 0 and port_index < len(from_block.ports):
-                        from_block_out = from_block.ports[port_index]
-                        if from_block_out.is_input():
-                            System.log("Diagram error: Output port is an input port")
-                            continue
-                    else:
-                        System.log("Diagram error: invalid output port index " + str(port_index))
-                        continue
-                    port_index = int(conn["to_in"])
-                    if port_index >= 0 and port_index < len(to_block.ports):
-                        to_block_in = to_block.ports[port_index]
-                        if not to_block_in.is_input():
-                            System.log("Diagram error: Input port is an output port")
-                            continue
-                    else:
-                        System.log("Diagram error: invalid input port index " + str(port_index))
-                        continue
-                except Exception as e:
-                    System.log("Diagram error: " + str(e))
-                    pass
-                    continue
-                connection = ConnectionModel(diagram,
-                                    from_block,
-                                    from_block_out,
-                                    to_block,
-                                    to_block_in)
-                dc.add_connection(connection)
-
-            # Loading comments
-            comments = data["comments"]
-            for com in comments:
-                comment = CommentModel()
-                comment.x = float(com["x"])
-                comment.y = float(com["y"])
-                properties = com["properties"]
+            :return: BinaryDiagram or JSONStreamReader.
+        """
+        if BinaryDiagram.is_binary(file_name):
+            return BinaryDiagram(file_name)
+        return JSONStreamReader(file_name)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __read(cls, diagram):
+        """
+        This method reads the diagram file (JSON or binary) and loads its
+        header: zoom, language and code template.
+
+            :return: the file data or None if it is not a diagram.
+        """
+        data = cls.open_data(diagram.file_name)
+        try:
+            is_diagram = cls.__read_header(diagram, data)
+        except BaseException:
+            data.close()
+            raise
+        if not is_diagram:
+            data.close()
+            return None
+        return data
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __read_header(cls, diagram, data):
+        """
+        This method loads the diagram header.
+
+            :return: False if it is not a diagram.
+        """
+        if data["data"] != "DIAGRAM":
+            System.log("Problem loading the diagram. Are you sure this is a valid file?")
+            return False
+        if "zoom" in data:
+            diagram.zoom = float(data["zoom"])
+        if "language" in data:
+            diagram.language = data["language"]
+
+        # Loading Code Template
+        if "code_template" in data:
+            code_template_data = data["code_template"]
+            if "type" in code_template_data:
+                code_template = code_template_data["type"]
+                code_templates = System.get_code_templates(cls.__get_language(diagram))
+                if code_template not in code_templates:
+                    System.log("Code Template " + code_template + " not found")
+                else:
+                    diagram.code_template = deepcopy(code_templates[code_template])
+            if "properties" in code_template_data and \
+                    diagram.code_template is not None:
+                properties = code_template_data["properties"]
                 props = {}
                 for prop in properties:
                     props[prop["key"]] = prop["value"]
-                comment.set_properties(props)
-                dc.add_comment(comment)
+                diagram.code_template.set_properties(props)
+        return True
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __get_language(cls, diagram):
+        """
+        This method returns the diagram language, used to load only the
+        extensions of that language, or None when it is not known.
+        """
+        if diagram.language is None or diagram.language == 'None':
+            return None
+        return diagram.language
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def create_block(cls, block, system_blocks, system_ports):
+        """
+        This method creates a block from its file data.
 
-            # Loading authors
-            authors = data["authors"]
-            for author in authors:
-                auth = AuthorModel()
-                auth.name = author["author"]
-                auth.license = author["license"]
-                auth.date = author["date"]
-                diagram.authors.append(auth)
+            :return: the new block or None if its type is not available.
+        """
+        block_type = block["type"]
+        if block_type not in system_blocks:
+            System.log("Block " + block_type + " not found")
+            return None
+        properties = block["properties"]
+        props = {}
+        for prop in properties:
+            props[prop["key"]] = prop["value"]
+        new_block = system_blocks[block_type].new_instance()
+        new_block.set_properties(props)
+        new_block.id = int(block["id"])
+        new_block.x = float(block["x"])
+        new_block.y = float(block["y"])
+        new_block.is_collapsed = block["collapsed"]
 
-            diagram.redraw()
+        # Garantir que as portas sejam indexadas corretamente
+        BlockControl.load_ports(new_block, system_ports)
+        return new_block
 
+    # ----------------------------------------------------------------------
+    @classmethod
+    def create_connection(cls, diagram, conn):
+        """
+        This method creates a connection from its file data.
 
+            :return: the new connection or None if it is not valid.
+        """
+        try:
+            from_block = diagram.blocks[int(conn["from_block"])]
+            to_block = diagram.blocks[int(conn["to_block"])]
+            port_index = int(conn["from_out"])
+            if port_index >= 0 and port_index < len(from_block.ports):
+                from_block_out = from_block.ports[port_index]
+                if from_block_out.is_input():
+                    System.log("Diagram error: Output port is an input port")
+                    return None
+            else:
+                System.log("Diagram error: invalid output port index " + str(port_index))
+                return None
+            port_index = int(conn["to_in"])
+            if port_index >= 0 and port_index < len(to_block.ports):
+                to_block_in = to_block.ports[port_index]
+                if not to_block_in.is_input():
+                    System.log("Diagram error: Input port is an output port")
+                    return None
+            else:
+                System.log("Diagram error: invalid input port index " + str(port_index))
+                return None
         except Exception as e:
-            pass
-            return False
+            System.log("Diagram error: " + str(e))
+            return None
+        return ConnectionModel(diagram,
+                               from_block,
+                               from_block_out,
+                               to_block,
+                               to_block_in)
 
-        return True
+    # ----------------------------------------------------------------------
+    @classmethod
+    def create_comment(cls, com):
+        """
+        This method creates a comment from its file data.
+        """
+        comment = CommentModel()
+        comment.x = float(com["x"])
+        comment.y = float(com["y"])
+        properties = com["properties"]
+        props = {}
+        for prop in properties:
+            props[prop["key"]] = prop["value"]
+        comment.set_properties(props)
+        return comment
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __load_authors(cls, diagram, data):
+        """
+        This method loads the authors of the diagram.
+        """
+        for author in data["authors"]:
+            auth = AuthorModel()
+            auth.name = author["author"]
+            auth.license = author["license"]
+            auth.date = author["date"]
+            diagram.authors.append(auth)
 
     # ----------------------------------------------------------------------
     @classmethod
     def save(cls, diagram):
         """
-        This method save a file.
+        This method save a file. JSON files are written item by item, so
+        the whole document is never kept in memory, and replace the old
+        file only when complete.
 
         Returns:
 
-            * **Types** (:class:`boolean<boolean>`)
+            * **Types** (:class:`tuple<tuple>`) (success, message)
         """
+        auth = AuthorModel()
+        auth.name = System.get_preferences().author
+        auth.license = System.get_preferences().license
+        auth.date = str(datetime.now())
+        diagram.authors.insert(0,auth)
+
+        x = cls.get_data(diagram)
+        file_name = str(diagram.file_name)
+        try:
+            if file_name.endswith(BinaryDiagram.EXTENSION):
+                BinaryDiagram.write(file_name, {key: list(value)
+                                                if isinstance(value, map) else value
+                                                for key, value in x.items()})
+            else:
+                with atomic_write(file_name) as save_file:
+                    JSONStreamWriter.dump(x, save_file, indent=4)
+        except Exception as e:
+            System.log("Problem saving the diagram: " + str(e))
+            return False, str(e)
+
+        diagram.set_modified(False)
+        return True, "Success"
 
-        x = {
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_data(cls, diagram):
+        """
+        This method returns the file data of the diagram. The blocks,
+        connections, comments and authors are iterators, that build the
+        data of each item when read.
+        """
+        return {
             "source": "JSON",
             "data": "DIAGRAM",
             "version": System.VERSION,
             "zoom": diagram.zoom,
             "language": diagram.language,
-            "code_template": {},
-            "blocks": [],
-            "connections": [],
-            "comments": [],
-            "authors": []
+            "code_template": cls.__code_template_data(diagram),
+            "blocks": map(cls.get_block_data, list(diagram.blocks.values())),
+            "connections": map(cls.get_connection_data, list(diagram.connectors)),
+            "comments": map(cls.get_comment_data, list(diagram.comments)),
+            "authors": map(cls.__author_data, list(diagram.authors))
         }
 
-        if diagram.code_template:
-            code_template_data = {
-                "type": diagram.code_template.type,
-                "properties": []
-                }
-            props = diagram.code_template.properties
-            for prop in props:
-                code_template_data["properties"].append({
-                        "key": str(prop["name"]),
-                        "value": str(prop["value"])
-                        })
-            x["code_template"] = code_template_data
-
-        for block_id in diagram.blocks:
-            block = diagram.blocks[block_id]
-            pos = block.get_position()
-            block_data = {
-                    "type": block.type,
-                    "id": block.id,
-                    "collapsed": block.is_collapsed,
-                    "x": pos[0],
-                    "y": pos[1],
-                    "properties": []
-                }
-            props = block.get_properties()
-            for prop in props:
-                block_data["properties"].append({
-                        "key": str(prop["name"]),
-                        "value": str(prop["value"])
-                        }
-                        )
-            x["blocks"].append(block_data)
-
-        for connector in diagram.connectors:
-            x["connections"].append({
-                               "from_block": connector.output.id,
-                               "from_out": int(connector.output_port.index),
-                               "to_block": connector.input.id,
-                               "to_in": int(connector.input_port.index)
-                               })
-
-        for comment in diagram.comments:
-            pos = comment.get_position()
-            comment_data = {
-                               "x": pos[0],
-                               "y": pos[1],
-                               "properties": []
-                               }
-            props = comment.get_properties()
-            for prop in props:
-                comment_data["properties"].append({
-                                       "key": str(prop["name"]),
-                                       "value": str(prop["value"])
-                                       })
-            x["comments"].append(comment_data)
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __code_template_data(cls, diagram):
+        if not diagram.code_template:
+            return {}
+        return {
+            "type": diagram.code_template.type,
+            "properties": cls.__properties_data(diagram.code_template.properties)
+            }
 
-        auth = AuthorModel()
-        auth.name = System.get_preferences().author
-        auth.license = System.get_preferences().license
-        auth.date = str(datetime.now())
-        diagram.authors.insert(0,auth)
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __properties_data(cls, props):
+        return [{"key": str(prop["name"]), "value": str(prop["value"])}
+                for prop in props]
 
-        for author in diagram.authors:
-            x["authors"].append({
-                               "author": author.name,
-                               "license": author.license,
-                               "date": author.date
-                               })
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __get_position(cls, item):
+        # Models out of the canvas only keep the coordinates
+        if hasattr(item, "get_position"):
+            return item.get_position()
+        return item.x, item.y
 
-        try:
-            save_file = open(str(diagram.file_name), "w")
-            save_file.write(json.dumps(x, indent=4))
-            save_file.close()
-        except Exception as e:
-            pass
-        except IOError as e:
-            pass
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_block_data(cls, block):
+        """
+        This method returns the file data of a block.
+        """
+        pos = cls.__get_position(block)
+        return {
+                "type": block.type,
+                "id": block.id,
+                "collapsed": block.is_collapsed,
+                "x": pos[0],
+                "y": pos[1],
+                "properties": cls.__properties_data(block.get_properties())
+            }
 
-        diagram.set_modified(False)
-        return True, "Success"
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_connection_data(cls, connector):
+        """
+        This method returns the file data of a connection.
+        """
+        return {
+                "from_block": connector.output.id,
+                "from_out": int(connector.output_port.index),
+                "to_block": connector.input.id,
+                "to_in": int(connector.input_port.index)
+                }
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_comment_data(cls, comment):
+        """
+        This method returns the file data of a comment.
+        """
+        pos = cls.__get_position(comment)
+        return {
+                "x": pos[0],
+                "y": pos[1],
+                "properties": cls.__properties_data(comment.get_properties())
+                }
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __author_data(cls, author):
+        return {
+                "author": author.name,
+                "license": author.license,
+                "date": author.date
+                }
 # ------------------------------------------------------------------------------
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+"""
+This module contains the ExtensionCache class.
+"""
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from mosaicode.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# (mtime in nanoseconds, size in bytes)
+Signature = Tuple[int, int]
+
+
+class ExtensionCache:
+    """
+    This class keeps the parsed extension files (ports, blocks and code
+    templates) in a single file, so unchanged files are not parsed again.
+
+    Each entry is keyed by the file path and is valid while the file keeps
+    its modification time and size. Blocks also record the signature of the
+    port files they were built from, since the block ports are copies of the
+    registry ports.
+    """
+
+    # Increment when the cached objects change their layout
+    FORMAT = 2
+
+    # ----------------------------------------------------------------------
+    def __init__(self, file_name: Optional[str] = None) -> None:
+        if file_name is None:
+            from mosaicode.system import System as System
+            file_name = str(System.get_user_dir() / "cache" / "extensions.pickle")
+        self.file_name: str = str(file_name)
+        # path -> (signature, object, {port type: port signature})
+        self.__entries: Dict[str, Tuple[Signature, Any, Dict[str, Any]]] = {}
+        self.__used = set()
+        self.__modified: bool = False
+        self.hits: int = 0
+        self.misses: int = 0
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def signature(cls, file_name: str) -> Optional[Signature]:
+        """
+        Get the (mtime, size) of a file, or None if it does not exist.
+        """
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    # ----------------------------------------------------------------------
+    def load(self) -> bool:
+        """
+        Read the cache file. A missing, outdated or corrupted file results
+        in an empty cache.
+
+        Returns:
+            True if the cache file was read
+        """
+        from mosaicode.system import System as System
+        self.__entries = {}
+        try:
+            with open(self.file_name, 'rb') as cache_file:
+                data = pickle.load(cache_file)
+        except FileNotFoundError:
+            return False
+        except Exception as error:
+            logger.warning(f"Ignoring extension cache {self.file_name}: {error}")
+            return False
+        if not isinstance(data, dict) or \
+                data.get("format") != self.FORMAT or \
+                data.get("version") != System.VERSION:
+            return False
+        self.__entries = data.get("entries", {})
+        return True
+
+    # ----------------------------------------------------------------------
+    def get(self, file_name: str, signature: Optional[Signature],
+            ports: Optional[Dict[str, Any]] = None) -> Tuple[bool, Any]:
+        """
+        Get the object parsed from a file.
+
+        Args:
+            file_name: Path of the extension file
+            signature: Current signature of the file
+            ports: Current port signatures by type, checked against the ports
+                used by the cached object
+
+        Returns:
+            Tuple of (found, object)
+        """
+        entry = self.__entries.get(file_name)
+        if entry is None or signature is None or entry[0] != signature:
+            self.misses += 1
+            return False, None
+        for port_type, port_signature in entry[2].items():
+            if ports is None or ports.get(port_type) != port_signature:
+                self.misses += 1
+                return False, None
+        self.__used.add(file_name)
+        self.hits += 1
+        return True, entry[1]
+
+    # ----------------------------------------------------------------------
+    def put(self, file_name: str, signature: Optional[Signature], value: Any,
+            ports: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Store the object parsed from a file.
+
+        Args:
+            file_name: Path of the extension file
+            signature: Signature of the file when it was parsed
+            value: The parsed object (None for invalid files)
+            ports: Signatures of the ports the object was built from
+        """
+        if signature is None:
+            return
+        self.__entries[file_name] = (signature, value, dict(ports or {}))
+        self.__used.add(file_name)
+        self.__modified = True
+
+    # ----------------------------------------------------------------------
+    def save(self, prefixes: Optional[List[str]] = None) -> bool:
+        """
+        Write the cache file, dropping the entries of files that were not
+        requested since it was loaded (removed extensions).
+
+        Args:
+            prefixes: Only drop unused entries inside these directories
+                (the ones that were scanned). All of them when None.
+
+        Returns:
+            True if the cache file is up to date
+        """
+        from mosaicode.system import System as System
+        if prefixes is not None:
+            prefixes = tuple(os.path.join(prefix, "") for prefix in prefixes)
+        unused = [key for key in self.__entries if key not in self.__used and
+                  (prefixes is None or key.startswith(prefixes))]
+        if not self.__modified and not unused:
+            return True
+        for key in unused:
+            del self.__entries[key]
+
+        directory = Path(self.file_name).parent
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            descriptor, temp_name = tempfile.mkstemp(dir=str(directory),
+                                                     suffix=".tmp")
+            try:
+                with os.fdopen(descriptor, 'wb') as cache_file:
+                    pickle.dump({"format": self.FORMAT,
+                                 "version": System.VERSION,
+                                 "entries": self.__entries},
+                                cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_name, self.file_name)
+            except BaseException:
+                os.unlink(temp_name)
+                raise
+        except Exception as error:
+            logger.warning(f"Could not save extension cache: {error}")
+            return False
+        self.__modified = False
+        return True
+
+# ----------------------------------------------------------------------
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------
+"""
+This module contains the JSONStreamWriter and JSONStreamReader classes,
+used to save and load big diagrams without holding the whole document
+(or its text) in memory.
+"""
+import json
+from collections.abc import Iterator as IteratorType, Mapping
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+
+class JSONStreamWriter:
+    """
+    This class writes a JSON object member by member. Members whose value
+    is an iterator (not a list) are written as arrays, item by item, as
+    they are produced.
+
+    The output is the same text of ``json.dumps(data, indent=indent)``.
+    """
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def dump(cls, data: Dict[str, Any], stream: TextIO, indent: int = 4) -> None:
+        """
+        Write the object to a text stream.
+
+        Args:
+            data: Members of the object. Iterator values are streamed.
+            stream: File opened for writing
+            indent: Indentation, as in json.dumps
+        """
+        if not data:
+            stream.write("{}")
+            return
+        encoder = json.JSONEncoder(indent=indent)
+        member = " " * indent
+        item = member * 2
+        separator = "{\n"
+        for key, value in data.items():
+            stream.write(separator + member + json.dumps(key) + ": ")
+            separator = ",\n"
+            if not isinstance(value, IteratorType):
+                stream.write(cls.__dumps(encoder, value, member))
+                continue
+            item_separator = "[\n"
+            for value_item in value:
+                stream.write(item_separator + item +
+                             cls.__dumps(encoder, value_item, item))
+                item_separator = ",\n"
+            stream.write("[]" if item_separator == "[\n" else "\n" + member + "]")
+        stream.write("\n}")
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def __dumps(cls, encoder: json.JSONEncoder, value: Any, prefix: str) -> str:
+        # Strings are escaped, so every new line is an indentation
+        return encoder.encode(value).replace("\n", "\n" + prefix)
+
+
+class JSONStreamReader(Mapping):
+    """
+    This class reads a JSON object from a file member by member, as its
+    keys are requested.
+
+    Arrays are returned as iterators that parse one item at a time. They
+    must be read before the next member: the items left are kept in a
+    list when other members are requested. Members skipped to reach a key
+    are kept in memory, so reading the keys in the file order is the
+    cheapest way.
+    """
+
+    CHUNK = 1 << 16
+
+    # ----------------------------------------------------------------------
+    def __init__(self, file_name: str) -> None:
+        self.file_name: str = str(file_name)
+        self.__file: TextIO = open(self.file_name, 'r', encoding="utf-8")
+        self.__decoder = json.JSONDecoder()
+        self.__buffer: str = ""
+        self.__position: int = 0
+        self.__eof: bool = False
+        # Members read so far, in the file order
+        self.__values: Dict[str, Any] = {}
+        # Array being read: (key, iterator)
+        self.__active: Optional[Any] = None
+        self.__started: bool = False
+        self.__finished: bool = False
+
+    # ----------------------------------------------------------------------
+    def __fill(self) -> bool:
+        """
+        Read more text, at least as much as the text not parsed yet, so
+        long values are parsed a few times only.
+        """
+        if self.__eof:
+            return False
+        self.__buffer = self.__buffer[self.__position:]
+        self.__position = 0
+        text = self.__file.read(max(self.CHUNK, len(self.__buffer)))
+        if not text:
+            self.__eof = True
+            return False
+        self.__buffer += text
+        return True
+
+    # ----------------------------------------------------------------------
+    def __peek(self) -> str:
+        """
+        Skip the white space and return the next character ("" at the end).
+        """
+        while True:
+            buffer = self.__buffer
+            position = self.__position
+            while position < len(buffer) and buffer[position] in " \t\n\r":
+                position += 1
+            self.__position = position
+            if position < len(buffer):
+                return buffer[position]
+            if not self.__fill():
+                return ""
+
+    # ----------------------------------------------------------------------
+    def __expect(self, characters: str) -> str:
+        character = self.__peek()
+        if character == "" or character not in characters:
+            raise ValueError("Invalid JSON in " + self.file_name +
+                             ": expected " + " or ".join(characters))
+        self.__position += 1
+        return character
+
+    # ----------------------------------------------------------------------
+    def __decode(self) -> Any:
+        self.__peek()
+        while True:
+            try:
+                value, end = self.__decoder.raw_decode(self.__buffer, self.__position)
+            except json.JSONDecodeError:
+                if not self.__fill():
+                    raise
+                continue
+            # A number may continue in the next chunk
+            if end == len(self.__buffer) and self.__fill():
+                continue
+            self.__position = end
+            return value
+
+    # ----------------------------------------------------------------------
+    def __items(self) -> Iterator[Any]:
+        if self.__peek() == "]":
+            self.__position += 1
+            return
+        while True:
+            yield self.__decode()
+            if self.__expect(",]") == "]":
+                return
+
+    # ----------------------------------------------------------------------
+    def __next_member(self) -> Optional[str]:
+        """
+        Read the next member and keep it in the values.
+
+            :return: the key or None at the end of the object.
+        """
+        if self.__finished:
+            return None
+        if self.__active is not None:
+            key, items = self.__active
+            self.__active = None
+            self.__values[key] = list(items)
+        if not self.__started:
+            self.__expect("{")
+            self.__started = True
+            if self.__peek() == "}":
+                self.__position += 1
+                self.__finished = True
+                return None
+        elif self.__expect(",}") == "}":
+            self.__finished = True
+            return None
+        key = self.__decode()
+        if not isinstance(key, str):
+            raise ValueError("Invalid JSON in " + self.file_name + ": expected a key")
+        self.__expect(":")
+        if self.__peek() == "[":
+            self.__position += 1
+            items = self.__items()
+            self.__active = (key, items)
+            self.__values[key] = items
+        else:
+            self.__values[key] = self.__decode()
+        return key
+
+    # ----------------------------------------------------------------------
+    def __getitem__(self, key: str) -> Any:
+        while key not in self.__values:
+            if self.__next_member() is None:
+                raise KeyError(key)
+        return self.__values[key]
+
+    # ----------------------------------------------------------------------
+    def __iter__(self) -> Iterator[str]:
+        while self.__next_member() is not None:
+            pass
+        return iter(list(self.__values))
+
+    # ----------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    # ----------------------------------------------------------------------
+    def close(self) -> None:
+        self.__file.close()
+
+    # ----------------------------------------------------------------------
+    def __enter__(self) -> "JSONStreamReader":
+        return self
+
+    # ----------------------------------------------------------------------
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+# ----------------------------------------------------------------------
@@ -32,7 +32,6 @@ class PortPersistence():
             return None
 
         data = ""
-        port = Port()
 
         try:
             with open(file_name, 'r') as data_file:
@@ -44,7 +43,6 @@ class PortPersistence():
             port = Port()
             port.type = data["type"]
             port.version = data["version"]
-            port.type = data["type"]
             port.language = data["language"]
             port.hint = data["hint"]
             if not port.hint:
@@ -5,6 +5,7 @@
 This module contains the PortManager class.
 """
 import os
+import copy
 import gi
 gi.require_version('Gtk', '3.0')
 gi.require_version('GtkSource', '3.0')
@@ -117,7 +118,10 @@ class Manager(Gtk.Dialog):
     # ----------------------------------------------------------------------
     def __run_editor(self, element):
         if self.editor is not None:
-            editor = self.editor(self, element)
+            # The editors change the element in place: the registry one
+            # shares its codes, ports and properties with the blocks placed
+            # in the diagrams
+            editor = self.editor(self, copy.deepcopy(element))
             result = editor.run()
             if result == Gtk.ResponseType.OK:
                 element = editor.get_element()
@@ -160,7 +164,7 @@ class Manager(Gtk.Dialog):
     # ----------------------------------------------------------------------
     def update(self):
         System()
-        System.reload()
+        System.refresh()
         item_list = []
         if self.get_items is not None:
             items = self.get_items()
@@ -3,16 +3,19 @@
 This module contains the System class.
 """
 import datetime
+import importlib
 import inspect  # For module inspect
 import logging
 import os
 import pkgutil  # For dynamic package load
 import sys
 import time
-from copy import copy
-from functools import lru_cache, cached_property
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache, cached_property, partial
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Any, Set
 import glob
 
 from mosaicode.control.blockcontrol import BlockControl
@@ -22,14 +25,54 @@ from mosaicode.model.blockmodel import BlockModel
 from mosaicode.model.codetemplate import CodeTemplate
 from mosaicode.model.port import Port
 from mosaicode.model.preferences import Preferences
+from mosaicode.persistence.extensioncache import ExtensionCache
 from mosaicode.persistence.preferencespersistence import PreferencesPersistence
 from mosaicode.exceptions import ConfigurationError, FileOperationError
+from mosaicode.utils.filetracker import FileChanges, FileTracker, Signature
 from mosaicode.utils.logger import get_logger
 
 # Configure logging
 logger = get_logger(__name__)
 
 
+@dataclass
+class ExtensionChanges:
+    """
+    Registry entries added, changed and removed by System.refresh(), by
+    kind ("ports", "blocks" and "codetemplates").
+    """
+    added: Dict[str, Dict[str, Any]] = field(
+        default_factory=lambda: {"ports": {}, "blocks": {}, "codetemplates": {}})
+    changed: Dict[str, Dict[str, Any]] = field(
+        default_factory=lambda: {"ports": {}, "blocks": {}, "codetemplates": {}})
+    removed: Dict[str, Set[str]] = field(
+        default_factory=lambda: {"ports": set(), "blocks": set(), "codetemplates": set()})
+    # True when a language directory was added or removed
+    languages: bool = False
+
+    def normalize(self) -> None:
+        """Entries removed and registered again are changed ones."""
+        for kind in self.removed:
+            for key in list(self.removed[kind]):
+                if key in self.added[kind]:
+                    self.changed[kind][key] = self.added[kind].pop(key)
+                    self.removed[kind].discard(key)
+
+    def __bool__(self) -> bool:
+        return self.languages or any(
+            self.added[kind] or self.changed[kind] or self.removed[kind]
+            for kind in self.removed)
+
+
+def _parse_extension_file(loader, file_path: str) -> Any:
+    """Run an extension loader, logging instead of raising (pool worker)."""
+    try:
+        return loader(file_path)
+    except Exception as e:
+        logger.error(f"Erro ao carregar extensão {file_path}: {e}")
+        return None
+
+
 class System:
     """
     This class contains methods related the System class with performance optimizations.
@@ -106,26 +149,50 @@ class System:
     # An inner class instance to be singleton
     # ----------------------------------------------------------------------
     class __Singleton:
-        # ----------------------------------------------------------------------
+        # Kinds of extension files
+        KINDS = ("ports", "blocks", "python_blocks", "codetemplates")
 
+        # ----------------------------------------------------------------------
         def __init__(self):
             self.Log = None
             self.__code_templates: Dict[str, CodeTemplate] = {}
             self.__blocks: Dict[str, BlockModel] = {}
             self.__ports: Dict[str, Port] = {}
+            # Read-only views, see get_generation()
+            self.__generation: int = 0
+            self.__views: Dict[str, Mapping[str, Any]] = {
+                "blocks": MappingProxyType(self.__blocks),
+                "ports": MappingProxyType(self.__ports),
+                "codetemplates": MappingProxyType(self.__code_templates)}
+            # (kind, language) -> (generation, view of the language)
+            self.__language_views: Dict[tuple, tuple] = {}
 
             self.list_of_examples: List[str] = []
             
-            # Lazy loading flags
-            self._blocks_loaded = False
-            self._ports_loaded = False
-            self._templates_loaded = False
+            # Lazy loading: extensions are partitioned by language directory
+            # (extensions/<language>/...) and each partition is loaded the
+            # first time it is requested.
+            self.__partitions: Optional[List[tuple]] = None
+            # language -> {"blocks"|"ports"|"codetemplates": set of types}
+            self.__loaded_languages: Dict[str, Dict[str, set]] = {}
+            # port type -> (file, signature), used to validate cached blocks
+            self.__port_signatures: Dict[str, Any] = {}
+            # file -> [(kind, type)] registered from it, and the reverse
+            self.__sources: Dict[str, List[tuple]] = {}
+            self.__owners: Dict[tuple, str] = {}
+            # Extension file changes, see refresh()
+            self.__tracker: Optional[FileTracker] = None
+            # (mtime, size) of the extension files read, the state the
+            # tracker starts from
+            self.__signatures: Dict[str, Signature] = {}
+            self.__listeners: List[Any] = []
             self._examples_loaded = False
             
             # Create user directory if does not exist
             directories = ["extensions",
                            "images",
-                           "code-gen"]
+                           "code-gen",
+                           "cache"]
             user_dir = System.get_user_dir()
             for name in directories:
                 path = user_dir / name
@@ -152,48 +219,241 @@ class System:
         def reload(self) -> None:
             """Reload extensions and examples."""
             logger.info("Reloading system components")
+            # Only the languages already in use are loaded again
+            loaded = list(self.__loaded_languages)
+            all_loaded = self.__partitions is not None and \
+                all(language in self.__loaded_languages
+                    for language, path in self.__partitions)
             # Reset lazy loading flags
-            self._blocks_loaded = False
-            self._ports_loaded = False
-            self._templates_loaded = False
+            self.__partitions = None
+            self.__loaded_languages.clear()
+            self.__port_signatures.clear()
+            self.__sources.clear()
+            self.__owners.clear()
+            self.__signatures.clear()
+            self.__close_tracker()
             self._examples_loaded = False
             # Clear caches
             self.__blocks.clear()
             self.__ports.clear()
             self.__code_templates.clear()
+            self.__generation += 1
             self.list_of_examples.clear()
             # Reload
             self.__load_examples()
-            self.__load_extensions()
+            if all_loaded:
+                self.__load_extensions()
+            else:
+                languages = self.get_languages()
+                self.__load_extensions([language for language in loaded
+                                        if language in languages])
 
         # ----------------------------------------------------------------------
-        def get_blocks(self) -> Dict[str, BlockModel]:
-            """Get blocks with lazy loading."""
-            if not self._blocks_loaded:
-                self.__load_extensions()
-            return copy(self.__blocks)
+        def refresh(self) -> ExtensionChanges:
+            """
+            Apply the extension files added, changed or removed since the
+            last check to the loaded languages, and notify the listeners.
+
+            Returns:
+                The registry entries that changed
+            """
+            changes = ExtensionChanges()
+            # Listing the language directories is cheap; only the files of
+            # the loaded languages are tracked
+            languages = self.get_languages()
+            self.__partitions = None
+            changes.languages = self.get_languages() != languages
+            if changes.languages:
+                self.__close_tracker()
+            if self.__tracker is None:
+                self.__tracker = self.__create_tracker()
+            files = FileChanges()
+            if self.__tracker is not None:
+                files = self.__tracker.poll()
+            if not files and not changes.languages:
+                return changes
+            logger.info(f"Extension files changed: {len(files.added)} added, "
+                        f"{len(files.changed)} changed, {len(files.removed)} removed")
+
+            for language in list(self.__loaded_languages):
+                if language not in self.get_languages():
+                    for path in [path for path in self.__sources
+                                 if self.__loaded_language_of(path) == language]:
+                        self.__unregister_file(path, changes)
+                    del self.__loaded_languages[language]
+
+            for path in sorted(files.removed | files.changed):
+                self.__unregister_file(path, changes)
+
+            found: Dict[str, List[tuple]] = {kind: [] for kind in self.KINDS}
+            for path in sorted(files.added | files.changed):
+                partition = self.__partition_of(path)
+                if partition is None or partition[0] not in self.__loaded_languages:
+                    continue
+                kind = self.__classify(path, partition[1])
+                if kind is not None:
+                    found[kind].append((partition[0], path))
+
+            cache = ExtensionCache()
+            cache.load()
+            self.__load_files({"ports": found["ports"]}, cache, changes)
+
+            # Blocks copy the registry ports: rebuild the ones using a changed port
+            ports = set(changes.added["ports"]) | changes.removed["ports"]
+            if ports:
+                block_files = set(path for language, path in found["blocks"])
+                for key, block in list(self.__blocks.items()):
+                    path = self.__owners.get(("blocks", key))
+                    if path is None or not path.endswith(".json") or path in block_files:
+                        continue
+                    if any(getattr(port, "type", None) in ports for port in block.ports):
+                        self.__unregister_file(path, changes)
+                        found["blocks"].append((self.__loaded_language_of(path), path))
+                        block_files.add(path)
+            found["ports"] = []
+            self.__load_files(found, cache, changes)
+            cache.save([])
+
+            changes.normalize()
+            if changes:
+                for listener in list(self.__listeners):
+                    try:
+                        listener(changes)
+                    except Exception as e:
+                        logger.error(f"Error in extension listener: {e}")
+            return changes
 
         # ----------------------------------------------------------------------
-        def remove_block(self, block) -> Optional[BlockModel]:
-            try:
-                return self.__blocks.pop(block.type)
-            except KeyError:
-                logger.warning(f"Block not found for removal: {block.type}")
+        def __create_tracker(self) -> Optional[FileTracker]:
+            """
+            Track the files of the loaded languages, starting from their
+            state when they were read, so no change is missed and nothing
+            is walked before the first refresh.
+            """
+            self.get_languages()
+            paths = [path for language, path in self.__partitions
+                     if language in self.__loaded_languages]
+            if not paths:
                 return None
+            return FileTracker(paths, files=self.__signatures)
 
         # ----------------------------------------------------------------------
-        def get_code_templates(self) -> Dict[str, CodeTemplate]:
-            """Get code templates with lazy loading."""
-            if not self._templates_loaded:
+        def __close_tracker(self) -> None:
+            if self.__tracker is not None:
+                self.__tracker.close()
+                self.__tracker = None
+
+        # ----------------------------------------------------------------------
+        def add_listener(self, listener) -> None:
+            if listener not in self.__listeners:
+                self.__listeners.append(listener)
+
+        # ----------------------------------------------------------------------
+        def remove_listener(self, listener) -> None:
+            if listener in self.__listeners:
+                self.__listeners.remove(listener)
+
+        # ----------------------------------------------------------------------
+        def get_languages(self) -> List[str]:
+            """Get the language partitions found in the extension paths."""
+            if self.__partitions is None:
+                self.__partitions = []
+                for base_path in System.get_extension_paths():
+                    try:
+                        names = sorted(os.listdir(base_path))
+                    except OSError:
+                        continue
+                    for name in names:
+                        path = os.path.join(base_path, name)
+                        if os.path.isdir(path):
+                            self.__partitions.append((name, path))
+            languages = []
+            for language, path in self.__partitions:
+                if language not in languages:
+                    languages.append(language)
+            return languages
+
+        # ----------------------------------------------------------------------
+        def is_language_loaded(self, language: str) -> bool:
+            """Check if the extensions of a language are loaded."""
+            return language in self.__loaded_languages
+
+        # ----------------------------------------------------------------------
+        def load_language(self, language: Optional[str] = None) -> None:
+            """
+            Load the extensions of a language, or of every language when it
+            is None or has no extension directory of its own.
+            """
+            languages = self.get_languages()
+            if language is not None and language in languages:
+                self.__load_extensions([language])
+            else:
                 self.__load_extensions()
-            return copy(self.__code_templates)
 
         # ----------------------------------------------------------------------
-        def get_ports(self) -> Dict[str, Port]:
+        def __select(self, kind: str, language: Optional[str]) -> Mapping[str, Any]:
+            """
+            Get a read-only view of the registry entries of a language,
+            loading it if needed. The view of a language is built once per
+            generation.
+            """
+            self.load_language(language)
+            if language is None or language not in self.__loaded_languages:
+                return self.__views[kind]
+            generation, view = self.__language_views.get((kind, language), (None, None))
+            if generation != self.__generation:
+                registry = self.__registry(kind)
+                types = self.__loaded_languages[language][kind]
+                view = MappingProxyType({key: value for key, value in registry.items()
+                                         if key in types})
+                self.__language_views[(kind, language)] = (self.__generation, view)
+            return view
+
+        # ----------------------------------------------------------------------
+        def get_generation(self) -> int:
+            return self.__generation
+
+        # ----------------------------------------------------------------------
+        def get_blocks(self, language: Optional[str] = None) -> Mapping[str, BlockModel]:
+            """Get blocks with lazy loading."""
+            return self.__select("blocks", language)
+
+        # ----------------------------------------------------------------------
+        def get_code_templates(self, language: Optional[str] = None) -> Mapping[str, CodeTemplate]:
+            """Get code templates with lazy loading."""
+            return self.__select("codetemplates", language)
+
+        # ----------------------------------------------------------------------
+        def get_ports(self, language: Optional[str] = None) -> Mapping[str, Port]:
             """Get ports with lazy loading."""
-            if not self._ports_loaded:
-                self.__load_extensions()
-            return copy(self.__ports)
+            return self.__select("ports", language)
+
+        # ----------------------------------------------------------------------
+        def add(self, kind: str, value: Any) -> None:
+            """
+            Add an extension that was not read from the extension files,
+            replacing the one with the same type.
+            """
+            self.__registry(kind)[value.type] = value
+            types = self.__loaded_languages.get(getattr(value, "language", None))
+            if types is not None:
+                types[kind].add(value.type)
+            self.__generation += 1
+
+        # ----------------------------------------------------------------------
+        def remove(self, kind: str, key: str) -> Optional[Any]:
+            """Remove an extension from the registry."""
+            value = self.__registry(kind).pop(key, None)
+            if value is None:
+                logger.warning(f"Extension not found for removal: {key}")
+                return None
+            self.__owners.pop((kind, key), None)
+            if kind == "ports":
+                self.__port_signatures.pop(key, None)
+            for types in self.__loaded_languages.values():
+                types[kind].discard(key)
+            self.__generation += 1
+            return value
 
         # ----------------------------------------------------------------------
         def get_preferences(self) -> Preferences:
@@ -219,155 +479,316 @@ class System:
             self._examples_loaded = True
 
         # ----------------------------------------------------------------------
-        def __load_extensions(self) -> None:
-            """Carrega blocos, portas e templates a partir de arquivos JSON com lazy loading."""
-            logger.info("Carregando extensões do diretório extensions do usuário e do projeto")
+        def __partition_of(self, path: str) -> Optional[tuple]:
+            """Get the (language, directory) partition containing a file."""
+            for language, partition in self.__partitions or []:
+                if path.startswith(os.path.join(partition, "")):
+                    return language, partition
+            return None
+
+        # ----------------------------------------------------------------------
+        def __loaded_language_of(self, path: str) -> Optional[str]:
+            for language, partition in self.__partitions or []:
+                if path.startswith(os.path.join(partition, "")) and \
+                        language in self.__loaded_languages:
+                    return language
+            for language, types in self.__loaded_languages.items():
+                if any(key in types[kind] for kind, key in self.__sources.get(path, [])):
+                    return language
+            return None
+
+        # ----------------------------------------------------------------------
+        def __classify(self, path: str, partition: str) -> Optional[str]:
+            """
+            Get the kind of an extension file: "ports", "blocks" (JSON),
+            "python_blocks", "codetemplates" or None if it is not one.
+            """
+            directory = Path(path).parent
+            parts = directory.relative_to(partition).parts
+            name = Path(path).name
+            # Pular a pasta backup_jsons
+            if "backup_jsons" in parts:
+                return None
+            if name.endswith(".json"):
+                if directory.name == "ports":
+                    return "ports"
+                if directory.name == "codetemplates":
+                    return "codetemplates"
+                if "blocks" in parts:
+                    return "blocks"
+            elif name.endswith(".py") and name != "__init__.py" and \
+                    directory.name == "blocks":
+                return "python_blocks"
+            return None
+
+        # ----------------------------------------------------------------------
+        def __discover_extensions(self, partition: str) -> Dict[str, List[str]]:
+            """
+            Walk a language directory once and classify the extension files.
+
+            Returns:
+                Dictionary with the sorted file lists of "ports", "blocks"
+                (JSON), "python_blocks" and "codetemplates"
+            """
+            found: Dict[str, List[str]] = {kind: [] for kind in self.KINDS}
+            for root, dirs, files in os.walk(partition):
+                # Pular a pasta backup_jsons
+                if "backup_jsons" in dirs:
+                    dirs.remove("backup_jsons")
+                dirs.sort()
+                for file in sorted(files):
+                    file_path = os.path.join(root, file)
+                    kind = self.__classify(file_path, partition)
+                    if kind is not None:
+                        found[kind].append(file_path)
+            return found
+
+        # ----------------------------------------------------------------------
+        def __registry(self, kind: str) -> Dict[str, Any]:
+            if kind == "ports":
+                return self.__ports
+            if kind == "codetemplates":
+                return self.__code_templates
+            return self.__blocks
+
+        # ----------------------------------------------------------------------
+        def __register(self, kind: str, language: str, path: str, value: Any,
+                       changes: Optional[ExtensionChanges] = None) -> None:
+            """Add an extension to the registry, remembering its file."""
+            kind = "blocks" if kind == "python_blocks" else kind
+            key = value.type
+            self.__registry(kind)[key] = value
+            self.__generation += 1
+            self.__loaded_languages[language][kind].add(key)
+            self.__sources.setdefault(path, []).append((kind, key))
+            self.__owners[(kind, key)] = path
+            if changes is not None:
+                changes.added[kind][key] = value
+
+        # ----------------------------------------------------------------------
+        def __unregister_file(self, path: str,
+                              changes: Optional[ExtensionChanges] = None) -> None:
+            """Remove the extensions defined by a file from the registry."""
+            self.__signatures.pop(path, None)
+            for kind, key in self.__sources.pop(path, []):
+                if self.__owners.get((kind, key)) != path:
+                    continue
+                del self.__owners[(kind, key)]
+                self.__registry(kind).pop(key, None)
+                self.__generation += 1
+                if kind == "ports":
+                    self.__port_signatures.pop(key, None)
+                for types in self.__loaded_languages.values():
+                    types[kind].discard(key)
+                if changes is not None:
+                    changes.removed[kind].add(key)
+
+        # ----------------------------------------------------------------------
+        def __load_python_blocks(self, file_path: str, json_blocks) -> List[BlockModel]:
+            """Import a Python block module and instantiate its BlockModel classes."""
+            loaded = []
+            root = Path(file_path).parent
+            logger.debug(f"[DEBUG] Tentando carregar bloco Python: {file_path}")
+            try:
+                # Importa o módulo
+                module_name = str(Path(file_path).relative_to(Path(__file__).parent.parent)).replace("/", ".").replace(".py", "")
+                if module_name.startswith("extensions."):
+                    module_name = module_name[11:]  # Remove "extensions."
+
+                # Adiciona o diretório ao sys.path se necessário
+                if str(root.parent) not in sys.path:
+                    sys.path.insert(0, str(root.parent))
+
+                # Importa o módulo (de novo, se ele mudou)
+                reload_module = module_name in sys.modules
+                module = __import__(module_name, fromlist=["*"])
+                if reload_module:
+                    module = importlib.reload(module)
+
+                # Procura por classes que herdam de BlockModel
+                for name, obj in inspect.getmembers(module):
+                    if (inspect.isclass(obj) and
+                        hasattr(obj, '__bases__') and
+                        any('BlockModel' in str(base) for base in obj.__bases__) and
+                        obj.__name__ != 'BlockModel'):
+                        try:
+                            instance = obj()
+                            # Para blocos sem tipo, usar o nome da classe
+                            if not getattr(instance, 'type', None):
+                                instance.type = obj.__name__
+                            # Só adiciona se não existir um JSON equivalente
+                            if instance.type not in json_blocks:
+                                loaded.append(instance)
+                                logger.info(f"Bloco Python carregado: {instance.type} de {file_path}")
+                            else:
+                                logger.info(f"Bloco Python ignorado (existe JSON): {instance.type} de {file_path}")
+                        except Exception as e:
+                            logger.error(f"Erro ao instanciar bloco Python {obj.__name__}: {e}")
+            except Exception as e:
+                logger.error(f"Erro ao carregar bloco Python {file_path}: {e}")
+            return loaded
+
+        # ----------------------------------------------------------------------
+        def __parse_files(self, tasks: List[tuple]) -> List[Any]:
+            """
+            Parse extension files concurrently.
+
+            Threads are used by default; set "extension_loader" to "process"
+            in the system configuration to parse large libraries in a
+            process pool. "extension_workers" limits the pool size (0 uses
+            the CPU count).
+
+            Args:
+                tasks: List of (loader, file path)
+
+            Returns:
+                The parsed objects, in the order of the tasks
+            """
+            workers = System.get_system_value("extension_workers", 0) or os.cpu_count() or 1
+            workers = min(workers, len(tasks))
+            if workers <= 1:
+                return [_parse_extension_file(loader, file_path)
+                        for loader, file_path in tasks]
+            if System.get_system_value("extension_loader", "thread") == "process":
+                executor = ProcessPoolExecutor(max_workers=workers)
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers)
+            with executor:
+                loaders = [loader for loader, file_path in tasks]
+                file_paths = [file_path for loader, file_path in tasks]
+                chunksize = max(1, len(tasks) // (workers * 4))
+                return list(executor.map(_parse_extension_file, loaders, file_paths,
+                                         chunksize=chunksize))
+
+        # ----------------------------------------------------------------------
+        def __load_files(self, files: Dict[str, List[tuple]], cache,
+                         changes: Optional[ExtensionChanges] = None) -> None:
+            """
+            Parse and register extension files, ports first. Only the files
+            missing from the extension cache are parsed.
+
+            Args:
+                files: Lists of (language, path) by kind
+                cache: The ExtensionCache
+                changes: Collects the registered entries, if given
+            """
             from mosaicode.persistence.blockpersistence import BlockPersistence
             from mosaicode.persistence.portpersistence import PortPersistence
             from mosaicode.persistence.codetemplatepersistence import CodeTemplatePersistence
-            from mosaicode.model.blockmodel import BlockModel
-            from mosaicode.model.port import Port
-            from mosaicode.model.codetemplate import CodeTemplate
-            import os
-
-            # Only clear if not already loaded
-            if not self._blocks_loaded:
-                self.__blocks.clear()
-            if not self._ports_loaded:
-                self.__ports.clear()
-            if not self._templates_loaded:
-                self.__code_templates.clear()
-
-            user_dir = System.get_user_dir() / "extensions"
-            search_paths = []
-            if user_dir.exists():
-                search_paths.append(str(user_dir))
-
-            # Adiciona todas as pastas mosaicode-*/**/extensions do projeto
-            project_root = Path(os.getcwd())
-            for ext_dir in project_root.glob("mosaicode-*/mosaicode_lib_*/extensions"):
-                if ext_dir.is_dir():
-                    search_paths.append(str(ext_dir))
-
-            # Carregar portas (lazy loading)
-            if not self._ports_loaded:
-                for base_path in search_paths:
-                    for root, dirs, files in os.walk(base_path):
-                        if Path(root).name == "ports":
-                            for file in files:
-                                if file.endswith(".json"):
-                                    file_path = str(Path(root) / file)
-                                    port = PortPersistence.load(file_path)
-                                    if port and hasattr(port, 'type'):
-                                        self.__ports[port.type] = port
-                                        logger.info(f"Porta carregada: {port.type} de {file_path}")
-                self._ports_loaded = True
-
-            # Carregar blocos (lazy loading) - Priorizar arquivos JSON sobre Python
-            if not self._blocks_loaded:
-                # Primeiro, carregar blocos de arquivos JSON
-                json_blocks = {}
-                for base_path in search_paths:
-                    logger.debug(f"[DEBUG] Procurando blocos JSON em: {base_path}")
-                    for root, dirs, files in os.walk(base_path):
-                        if Path(root).name == "blocks":
-                            # Pular a pasta backup_jsons
-                            if "backup_jsons" in dirs:
-                                dirs.remove("backup_jsons")
-                                logger.debug(f"[DEBUG] Pulando pasta backup_jsons em: {root}")
-                            
-                            logger.debug(f"[DEBUG] Encontrada pasta de blocos: {root}")
-                            for dirpath, dirnames, filenames in os.walk(root):
-                                # Pular backup_jsons recursivamente
-                                if "backup_jsons" in dirpath:
-                                    continue
-                                    
-                                for file in filenames:
-                                    if file.endswith(".json"):
-                                        file_path = str(Path(dirpath) / file)
-                                        logger.debug(f"[DEBUG] Tentando carregar bloco JSON: {file_path}")
-                                        try:
-                                            block = BlockPersistence.load(file_path)
-                                            if block and hasattr(block, 'type'):
-                                                json_blocks[block.type] = block
-                                                logger.info(f"Bloco JSON carregado: {block.type} de {file_path}")
-                                            else:
-                                                logger.warning(f"Bloco JSON inválido ou sem tipo: {file_path}")
-                                        except Exception as e:
-                                            logger.error(f"Erro ao carregar bloco JSON {file_path}: {e}")
-                
-                # Depois, carregar blocos de arquivos Python apenas se não existir JSON equivalente
-                for base_path in search_paths:
-                    logger.debug(f"[DEBUG] Procurando blocos Python em: {base_path}")
-                    for root, dirs, files in os.walk(base_path):
-                        if Path(root).name == "blocks":
-                            # Pular a pasta backup_jsons
-                            if "backup_jsons" in dirs:
-                                dirs.remove("backup_jsons")
-                                logger.debug(f"[DEBUG] Pulando pasta backup_jsons em: {root}")
-                            
-                            for file in files:
-                                if file.endswith(".py") and file != "__init__.py":
-                                    file_path = str(Path(root) / file)
-                                    logger.debug(f"[DEBUG] Tentando carregar bloco Python: {file_path}")
-                                    try:
-                                        # Importa o módulo
-                                        module_name = str(Path(file_path).relative_to(Path(__file__).parent.parent)).replace("/", ".").replace(".py", "")
-                                        if module_name.startswith("extensions."):
-                                            module_name = module_name[11:]  # Remove "extensions."
-                                        
-                                        # Adiciona o diretório ao sys.path se necessário
-                                        if str(Path(root).parent) not in sys.path:
-                                            sys.path.insert(0, str(Path(root).parent))
-                                        
-                                        # Importa o módulo
-                                        module = __import__(module_name, fromlist=["*"])
-                                        
-                                        # Procura por classes que herdam de BlockModel
-                                        for name, obj in inspect.getmembers(module):
-                                            if (inspect.isclass(obj) and 
-                                                hasattr(obj, '__bases__') and 
-                                                any('BlockModel' in str(base) for base in obj.__bases__) and
-                                                obj.__name__ != 'BlockModel'):
-                                                try:
-                                                    instance = obj()
-                                                    if hasattr(instance, 'type') and instance.type:
-                                                        # Só adiciona se não existir um JSON equivalente
-                                                        if instance.type not in json_blocks:
-                                                            self.__blocks[instance.type] = instance
-                                                            logger.info(f"Bloco Python carregado: {instance.type} de {file_path}")
-                                                        else:
-                                                            logger.info(f"Bloco Python ignorado (existe JSON): {instance.type} de {file_path}")
-                                                    else:
-                                                        # Para blocos sem tipo, usar o nome da classe
-                                                        if obj.__name__ not in json_blocks:
-                                                            self.__blocks[obj.__name__] = instance
-                                                            logger.info(f"Bloco Python carregado: {obj.__name__} de {file_path}")
-                                                        else:
-                                                            logger.info(f"Bloco Python ignorado (existe JSON): {obj.__name__} de {file_path}")
-                                                except Exception as e:
-                                                    logger.error(f"Erro ao instanciar bloco Python {obj.__name__}: {e}")
-                                    except Exception as e:
-                                        logger.error(f"Erro ao carregar bloco Python {file_path}: {e}")
-                
-                # Adicionar todos os blocos JSON ao dicionário final
-                self.__blocks.update(json_blocks)
-                self._blocks_loaded = True
-
-            # Carregar code templates (lazy loading)
-            if not self._templates_loaded:
-                for base_path in search_paths:
-                    for root, dirs, files in os.walk(base_path):
-                        if Path(root).name == "codetemplates":
-                            for file in files:
-                                if file.endswith(".json"):
-                                    file_path = str(Path(root) / file)
-                                    template = CodeTemplatePersistence.load(file_path)
-                                    if template and hasattr(template, 'type'):
-                                        self.__code_templates[template.type] = template
-                                        logger.info(f"Code template carregado: {template.type} de {file_path}")
-                self._templates_loaded = True
 
+            port_signatures = self.__port_signatures
+
+            def block_ports(block):
+                if block is None:
+                    return {}
+                return {port.type: port_signatures.get(port.type)
+                        for port in block.ports}
+
+            def load_files(tasks):
+                """Load (loader, path, ports) tasks, parsing only cache misses."""
+                values = []
+                misses = []
+                for loader, file_path, ports in tasks:
+                    signature = ExtensionCache.signature(file_path)
+                    if signature is not None:
+                        self.__signatures[file_path] = signature
+                    hit, value = cache.get(file_path, signature,
+                                           port_signatures if ports else None)
+                    values.append((value, signature))
+                    if not hit:
+                        misses.append(len(values) - 1)
+                parsed = self.__parse_files([tasks[i][:2] for i in misses])
+                for i, value in zip(misses, parsed):
+                    loader, file_path, ports = tasks[i]
+                    values[i] = (value, values[i][1])
+                    cache.put(file_path, values[i][1], value,
+                              ports(value) if ports else None)
+                return values
+
+            # Ports first: blocks copy the registry ports
+            port_files = files.get("ports", [])
+            port_values = load_files([(PortPersistence.load, file_path, None)
+                                      for language, file_path in port_files])
+            for (language, file_path), (port, signature) in zip(port_files, port_values):
+                if port and hasattr(port, 'type'):
+                    port_signatures[port.type] = (file_path, signature)
+                    self.__register("ports", language, file_path, port, changes)
+                    logger.info(f"Porta carregada: {port.type} de {file_path}")
+
+            # Then JSON blocks and code templates, in a single pool pass
+            block_files = files.get("blocks", [])
+            template_files = files.get("codetemplates", [])
+            block_loader = partial(BlockPersistence.load, ports=dict(self.__ports))
+            values = load_files(
+                [(block_loader, file_path, block_ports) for language, file_path in block_files] +
+                [(CodeTemplatePersistence.load, file_path, None) for language, file_path in template_files])
+
+            # Carregar blocos - Priorizar arquivos JSON sobre Python
+            json_blocks = {}
+            for (language, file_path), (block, signature) in zip(block_files, values):
+                if block and hasattr(block, 'type'):
+                    json_blocks[block.type] = (language, file_path, block)
+                    logger.info(f"Bloco JSON carregado: {block.type} de {file_path}")
+                else:
+                    logger.warning(f"Bloco JSON inválido ou sem tipo: {file_path}")
+
+            # Depois, carregar blocos de arquivos Python apenas se não existir JSON equivalente
+            json_types = set(json_blocks) | set(
+                key for (kind, key), path in self.__owners.items()
+                if kind == "blocks" and path.endswith(".json"))
+            for language, file_path in files.get("python_blocks", []):
+                signature = ExtensionCache.signature(file_path)
+                if signature is not None:
+                    self.__signatures[file_path] = signature
+                for block in self.__load_python_blocks(file_path, json_types):
+                    self.__register("blocks", language, file_path, block, changes)
+
+            # Adicionar todos os blocos JSON ao dicionário final
+            for language, file_path, block in json_blocks.values():
+                self.__register("blocks", language, file_path, block, changes)
+
+            # Carregar code templates
+            for (language, file_path), (template, signature) in zip(template_files, values[len(block_files):]):
+                if template and hasattr(template, 'type'):
+                    self.__register("codetemplates", language, file_path, template, changes)
+                    logger.info(f"Code template carregado: {template.type} de {file_path}")
+
+        # ----------------------------------------------------------------------
+        def __load_extensions(self, languages: Optional[List[str]] = None) -> None:
+            """
+            Carrega blocos, portas e templates a partir de arquivos JSON com lazy loading.
+
+            Args:
+                languages: Language partitions to load (all when None).
+                    Partitions already loaded are skipped.
+            """
+            self.get_languages()
+            partitions = [(language, path) for language, path in self.__partitions
+                          if language not in self.__loaded_languages and
+                          (languages is None or language in languages)]
+            if not partitions:
+                return
+            # The tracker is created again with the new partitions
+            self.__close_tracker()
+            logger.info("Carregando extensões: " +
+                        ", ".join(sorted(set(language for language, path in partitions))))
+
+            # Discover the files of every partition, in path order
+            files: Dict[str, List[tuple]] = {kind: [] for kind in self.KINDS}
+            for language, path in partitions:
+                self.__loaded_languages.setdefault(
+                    language, {"blocks": set(), "ports": set(), "codetemplates": set()})
+                found = self.__discover_extensions(path)
+                for kind in files:
+                    files[kind].extend((language, file_path) for file_path in found[kind])
+
+            cache = ExtensionCache()
+            cache.load()
+            self.__load_files(files, cache)
+
+            # Keep the cache entries of the partitions that were not scanned
+            cache.save([path for language, path in partitions])
+            logger.info(f"Extension cache: {cache.hits} arquivos reutilizados, {cache.misses} lidos")
             logger.info(f"Total de blocos carregados: {len(self.__blocks)}")
             logger.info(f"Total de portas carregadas: {len(self.__ports)}")
             logger.info(f"Total de code templates carregados: {len(self.__code_templates)}")
@@ -381,27 +802,117 @@ class System:
 
     # ----------------------------------------------------------------------
     @classmethod
-    def get_blocks(cls) -> Dict[str, BlockModel]:
-        """Get all loaded blocks."""
+    def get_blocks(cls, language: Optional[str] = None) -> Mapping[str, BlockModel]:
+        """
+        Get a read-only view of the loaded blocks. Use add_block() and
+        remove_block() to change them.
+
+        Args:
+            language: Only load and return the blocks of this language.
+                Every language is loaded when it is None.
+        """
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        return cls.instance.get_blocks(language)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_code_templates(cls, language: Optional[str] = None) -> Mapping[str, CodeTemplate]:
+        """Get a read-only view of the loaded code templates, of one language or of all."""
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        return cls.instance.get_code_templates(language)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_ports(cls, language: Optional[str] = None) -> Mapping[str, Port]:
+        """Get a read-only view of the loaded ports, of one language or of all."""
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        return cls.instance.get_ports(language)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_generation(cls) -> int:
+        """
+        Get the registry generation. It increases whenever a block, port
+        or code template is added, changed or removed, so lookups built
+        from the registry views can be kept while it does not change.
+        """
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        return cls.instance.get_generation()
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def add_block(cls, block: BlockModel) -> None:
+        """Add a block to the system, replacing the one with the same type."""
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        cls.instance.add("blocks", block)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def add_port(cls, port: Port) -> None:
+        """Add a port to the system, replacing the one with the same type."""
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        cls.instance.add("ports", port)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def add_code_template(cls, code_template: CodeTemplate) -> None:
+        """Add a code template to the system, replacing the one with the same type."""
         if cls.instance is None:
             cls.instance = cls.__Singleton()
-        return cls.instance.get_blocks()
+        cls.instance.add("codetemplates", code_template)
 
     # ----------------------------------------------------------------------
     @classmethod
-    def get_code_templates(cls) -> Dict[str, CodeTemplate]:
-        """Get all loaded code templates."""
+    def get_languages(cls) -> List[str]:
+        """
+        Get the languages with an extension directory
+        (extensions/<language>/), loaded or not.
+        """
         if cls.instance is None:
             cls.instance = cls.__Singleton()
-        return cls.instance.get_code_templates()
+        return cls.instance.get_languages()
 
     # ----------------------------------------------------------------------
     @classmethod
-    def get_ports(cls) -> Dict[str, Port]:
-        """Get all loaded ports."""
+    def is_language_loaded(cls, language: str) -> bool:
+        """Check if the extensions of a language are already loaded."""
         if cls.instance is None:
             cls.instance = cls.__Singleton()
-        return cls.instance.get_ports()
+        return cls.instance.is_language_loaded(language)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def load_language(cls, language: Optional[str] = None) -> None:
+        """Load the extensions of a language (all of them when None)."""
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        cls.instance.load_language(language)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def get_extension_paths(cls) -> List[str]:
+        """
+        Get the directories searched for extensions: the user extensions
+        directory and every mosaicode-*/mosaicode_lib_*/extensions
+        directory of the project.
+        """
+        search_paths = []
+        user_dir = cls.get_user_dir() / "extensions"
+        if user_dir.exists():
+            search_paths.append(str(user_dir))
+
+        # Adiciona todas as pastas mosaicode-*/**/extensions do projeto
+        project_root = Path(os.getcwd())
+        for ext_dir in project_root.glob("mosaicode-*/mosaicode_lib_*/extensions"):
+            if ext_dir.is_dir():
+                search_paths.append(str(ext_dir))
+        return search_paths
 
     # ----------------------------------------------------------------------
     @classmethod
@@ -427,6 +938,36 @@ class System:
             cls.instance = cls.__Singleton()
         cls.instance.reload()
 
+    # ----------------------------------------------------------------------
+    @classmethod
+    def refresh(cls) -> ExtensionChanges:
+        """
+        Update the loaded extensions with the files added, changed or
+        removed since the last check, instead of reloading everything.
+        The listeners are notified when something changed.
+        """
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        return cls.instance.refresh()
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def add_listener(cls, listener) -> None:
+        """
+        Call listener(changes) with the ExtensionChanges of each refresh.
+        """
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        cls.instance.add_listener(listener)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def remove_listener(cls, listener) -> None:
+        """Stop notifying a listener."""
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        cls.instance.remove_listener(listener)
+
     # ----------------------------------------------------------------------
     @classmethod
     def set_log(cls, log_widget) -> None:
@@ -442,7 +983,23 @@ class System:
         """Remove a block from the system."""
         if cls.instance is None:
             cls.instance = cls.__Singleton()
-        return cls.instance.remove_block(block)
+        return cls.instance.remove("blocks", block.type)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def remove_port(cls, port) -> Optional[Port]:
+        """Remove a port from the system."""
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        return cls.instance.remove("ports", port.type)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def remove_code_template(cls, code_template) -> Optional[CodeTemplate]:
+        """Remove a code template from the system."""
+        if cls.instance is None:
+            cls.instance = cls.__Singleton()
+        return cls.instance.remove("codetemplates", code_template.type)
 
     # ----------------------------------------------------------------------
     @classmethod
@@ -1,5 +1,8 @@
 import os
+import stat
 import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -30,3 +33,66 @@ def get_absolute_path_from_file(file_path):
     """
     return str(Path(file_path).resolve())
 
+
+@lru_cache(maxsize=None)
+def _get_umask():
+    """
+    Get the umask of the process, read once: it can only be read by
+    changing it, which is not thread safe, unless /proc gives it.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    umask = os.umask(0o22)
+    os.umask(umask)
+    return umask
+
+
+@contextmanager
+def atomic_write(file_name, mode="w"):
+    """
+    Write a file through a temporary file in the same directory, then
+    replace it at once. The file keeps its permissions (new files get
+    the default ones), and a symbolic link is followed, so the file it
+    points to is replaced instead of the link.
+
+    Args:
+        file_name: Path of the file
+        mode: "w" or "wb"
+
+    Returns:
+        The temporary file object, to write to
+    """
+    target = os.path.realpath(file_name)
+    try:
+        permissions = stat.S_IMODE(os.stat(target).st_mode)
+    except FileNotFoundError:
+        permissions = 0o666 & ~_get_umask()
+    directory = os.path.dirname(target)
+    descriptor, temp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, mode) as temp_file:
+            os.chmod(temp_name, permissions)
+            yield temp_file
+            # On disk before the rename, or it may be empty after a crash
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_name, target)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+    # Keep the rename as well, where directories can be synced
+    try:
+        directory_descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory_descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(directory_descriptor)
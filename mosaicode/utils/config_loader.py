@@ -51,7 +51,9 @@ class ConfigLoader:
                 }
             },
             "directories": {"type": "array", "items": {"type": "string"}},
-            "file_extensions": {"type": "object"}
+            "file_extensions": {"type": "object"},
+            "extension_loader": {"type": "string"},
+            "extension_workers": {"type": "integer"}
         },
         "required": ["app_name", "version"]
     }
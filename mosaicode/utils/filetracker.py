@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the FileTracker class, used to find the extension
+files added, changed or removed since the last check.
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from mosaicode.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# (mtime in nanoseconds, size in bytes)
+Signature = Tuple[int, int]
+
+
+@dataclass
+class FileChanges:
+    """
+    Files added, changed and removed between two checks.
+    """
+    added: Set[str] = field(default_factory=set)
+    changed: Set[str] = field(default_factory=set)
+    removed: Set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+class _Inotify:
+    """
+    Minimal non-blocking inotify watcher (Linux), through ctypes.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | \
+        IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    # ----------------------------------------------------------------------
+    def __init__(self) -> None:
+        name = ctypes.util.find_library("c")
+        if name is None:
+            raise OSError("libc not found")
+        self.__libc = ctypes.CDLL(name, use_errno=True)
+        self.fd: int = self.__libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.__watched: Set[str] = set()
+
+    # ----------------------------------------------------------------------
+    def watch(self, directory: str) -> None:
+        if directory in self.__watched:
+            return
+        result = self.__libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), self.MASK)
+        if result < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        self.__watched.add(directory)
+
+    # ----------------------------------------------------------------------
+    def forget(self) -> None:
+        """Forget the watched directories (removed ones are not tracked)."""
+        self.__watched.clear()
+
+    # ----------------------------------------------------------------------
+    def read(self) -> bool:
+        """
+        Drain the pending events.
+
+        Returns:
+            True if any file event happened since the last read
+        """
+        pending = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return pending
+            if not data:
+                return pending
+            offset = 0
+            while offset + 16 <= len(data):
+                wd, mask, cookie, length = struct.unpack_from("iIII", data, offset)
+                offset += 16 + length
+                pending = True
+
+    # ----------------------------------------------------------------------
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FileTracker:
+    """
+    This class compares the files of some directories with the state seen
+    on the previous check.
+
+    Checking walks the directories and compares (mtime, size) of each file.
+    On Linux, an inotify watch is used to skip the walk when no file event
+    happened; elsewhere, or when inotify is unavailable, every check polls.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, paths: List[str],
+                 suffixes: Tuple[str, ...] = (".json", ".py"),
+                 use_inotify: bool = True,
+                 files: Optional[Dict[str, Signature]] = None) -> None:
+        """
+        Initialize the tracker with the current state of the files.
+
+        Args:
+            paths: Directories to track, recursively
+            suffixes: Extensions of the tracked files
+            use_inotify: Use inotify when available
+            files: State of the files already known (when they were read),
+                instead of walking the directories now. The first check
+                walks them.
+        """
+        self.paths: List[str] = list(paths)
+        self.suffixes: Tuple[str, ...] = suffixes
+        self.__inotify: Optional[_Inotify] = None
+        if use_inotify:
+            try:
+                self.__inotify = _Inotify()
+            except (OSError, AttributeError) as error:
+                logger.debug(f"inotify not available, polling: {error}")
+        self.__scanned: bool = files is None
+        if files is None:
+            files = self.__scan()
+        self.__files: Dict[str, Signature] = dict(files)
+
+    # ----------------------------------------------------------------------
+    @property
+    def uses_inotify(self) -> bool:
+        return self.__inotify is not None
+
+    # ----------------------------------------------------------------------
+    def __scan(self) -> Dict[str, Signature]:
+        files: Dict[str, Signature] = {}
+        for base_path in self.paths:
+            for root, dirs, names in os.walk(base_path):
+                if self.__inotify is not None:
+                    try:
+                        self.__inotify.watch(root)
+                    except OSError as error:
+                        logger.debug(f"Polling, could not watch {root}: {error}")
+                        self.__inotify.close()
+                        self.__inotify = None
+                for name in names:
+                    if not name.endswith(self.suffixes):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    # ----------------------------------------------------------------------
+    def poll(self) -> FileChanges:
+        """
+        Get the files added, changed and removed since the last check.
+        """
+        if self.__inotify is not None and self.__scanned:
+            if not self.__inotify.read():
+                return FileChanges()
+            # Removed directories lose their watches: watch the tree again
+            self.__inotify.forget()
+        files = self.__scan()
+        self.__scanned = True
+        changes = FileChanges()
+        for path, signature in files.items():
+            previous = self.__files.get(path)
+            if previous is None:
+                changes.added.add(path)
+            elif previous != signature:
+                changes.changed.add(path)
+        changes.removed = set(self.__files) - set(files)
+        self.__files = files
+        return changes
+
+    # ----------------------------------------------------------------------
+    def close(self) -> None:
+        if self.__inotify is not None:
+            self.__inotify.close()
+            self.__inotify = None
@@ -56,6 +56,8 @@ class SystemConfig(BaseModel):
     directories: List[str] = Field(default_factory=lambda: ["extensions", "images", "code-gen"], description="System directories")
     file_extensions: FileExtensions = Field(default_factory=FileExtensions, description="File extensions configuration")
     extension_server_url: str = Field(default="https://alice.ufsj.edu.br/mosaicode/extensions/", description="Extension server URL")
+    extension_loader: str = Field(default="thread", pattern="^(thread|process)$", description="Worker pool used to parse extension files")
+    extension_workers: int = Field(default=0, ge=0, description="Extension parsing workers (0 uses the CPU count)")
     
     class Config:
         """Pydantic configuration."""
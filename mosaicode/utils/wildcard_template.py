@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+This module contains the WildcardTemplate class, used to expand the
+``$wildcard$`` placeholders found in block codes, port var_names and
+code templates.
+"""
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# $name$ or $name[argument]$
+_WILDCARD = re.compile(r"\$(\w+)(?:\[([^\]$]*)\])?\$")
+
+Segment = Union[str, Tuple[str, Optional[str], str]]
+Resolver = Callable[[str, Optional[str]], Optional[str]]
+
+
+class WildcardTemplate:
+    """
+    A template tokenized once into literal and placeholder segments.
+
+    Rendering walks the segments and joins the output in a single pass, so
+    the cost depends on the size of the output and not on the number of
+    candidate wildcards. Compiled templates are immutable and shared by
+    every object holding the same source text.
+    """
+
+    __slots__ = ("source", "segments", "wildcards")
+
+    # Compiled templates indexed by their source text
+    __cache: Dict[str, "WildcardTemplate"] = {}
+    CACHE_SIZE = 8192
+
+    # ----------------------------------------------------------------------
+    def __init__(self, source: str) -> None:
+        self.source: str = source
+        self.segments: List[Segment] = []
+        # Set of (name, argument) present in the template
+        self.wildcards = set()
+
+        position = 0
+        for match in _WILDCARD.finditer(source):
+            if match.start() > position:
+                self.segments.append(source[position:match.start()])
+            name, argument = match.group(1), match.group(2)
+            self.segments.append((name, argument, match.group(0)))
+            self.wildcards.add((name, argument))
+            position = match.end()
+        if position < len(source):
+            self.segments.append(source[position:])
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def compile(cls, source: str) -> "WildcardTemplate":
+        """
+        Return the compiled template of the source text, reusing the cached
+        one when the same text was already compiled.
+
+            Parameters:
+                * **source** (:class:`str<str>`)
+            Returns:
+                * **Types** (:class:`WildcardTemplate<WildcardTemplate>`)
+        """
+        template = cls.__cache.get(source)
+        if template is None:
+            if len(cls.__cache) >= cls.CACHE_SIZE:
+                cls.__cache.clear()
+            template = cls(source)
+            cls.__cache[source] = template
+        return template
+
+    # ----------------------------------------------------------------------
+    def has(self, name: str, argument: Optional[str] = None) -> bool:
+        """
+        Check if the template contains the wildcard ``$name[argument]$``.
+        """
+        return (name, argument) in self.wildcards
+
+    # ----------------------------------------------------------------------
+    def render(self, resolve: Resolver) -> str:
+        """
+        Expand the template.
+
+            Parameters:
+                * **resolve**: function receiving the wildcard name and its
+                  argument (None for ``$name$``) and returning the value,
+                  or None to keep the wildcard text untouched.
+            Returns:
+                * **Types** (:class:`str<str>`)
+        """
+        if len(self.wildcards) == 0:
+            return self.source
+        output = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                output.append(segment)
+                continue
+            value = resolve(segment[0], segment[1])
+            output.append(segment[2] if value is None else value)
+        return "".join(output)
+
+    # ----------------------------------------------------------------------
+    def __copy__(self) -> "WildcardTemplate":
+        return self
+
+    # ----------------------------------------------------------------------
+    def __deepcopy__(self, memo) -> "WildcardTemplate":
+        return self
+
+    # ----------------------------------------------------------------------
+    def __str__(self) -> str:
+        return self.source
+
+# ------------------------------------------------------------------------------
@@ -20,6 +20,13 @@ setup(
         "pgi",
     ],
     python_requires=">=3.9",
+    entry_points={
+        'console_scripts': [
+            'mosaicode-gen=mosaicode.control.batchgenerator:main',
+            'mosaicode-gend=mosaicode.control.generationdaemon:main',
+            'mosaicode-convert=mosaicode.persistence.binarydiagram:main',
+        ],
+    },
     scripts=[
         'launcher/mosaicode',
         'scripts/mosaicode.sh',
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the item index of the Diagram canvas.
+"""
+from mosaicode.model.blockmodel import BlockModel
+
+
+def test_redraw_keeps_index(diagram):
+    for block_id, x in ((1, 40), (2, 400)):
+        block = BlockModel()
+        block.id, block.x, block.y = block_id, x, 40
+        diagram.blocks[block_id] = block
+    index = diagram.get_spatial_index()
+    diagram.redraw()
+    # The models are replaced by their widgets in the same index
+    assert diagram.get_spatial_index() is index
+    assert len(index) == 2
+    widget = diagram.blocks[1]
+    assert diagram.get_items_in_bounds((0, 0, 200, 200)) == [widget]
+
+    # Items moved without being marked are updated by the next redraw
+    widget.move(600, 0)
+    del diagram.blocks[2]
+    diagram.redraw()
+    assert diagram.get_spatial_index() is index
+    assert len(index) == 1
+    assert diagram.get_items_in_bounds((0, 0, 200, 200)) == []
+    assert diagram.get_items_in_bounds((600, 0, 800, 200)) == [widget]
@@ -33,6 +33,55 @@ def temp_test_dir():
     if test_dir.exists():
         shutil.rmtree(test_dir)
 
+@pytest.fixture
+def test_dir():
+    """Create temporary test directory."""
+    test_dir = Path(tempfile.mkdtemp(prefix="mosaicode_test_"))
+    yield test_dir
+    if test_dir.exists():
+        shutil.rmtree(test_dir)
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Replace the extension registry by a small in-memory one."""
+    port = Port()
+    port.type = "test.float"
+    port.language = "python"
+    port.var_name = "$block[label]$_$block[id]$_$port[name]$"
+    port.code = "$input$ = $output$\n"
+
+    def make_block(block_type, conn_type, name, code):
+        block = BlockModel()
+        block.type = block_type
+        block.label = block_type.split(".")[-1]
+        block.language = "python"
+        block.codes = {"function": code}
+        block.properties = [{"name": "value", "label": "Value",
+                             "type": "Float", "value": "1"}]
+        block.ports = [{"type": "test.float", "conn_type": conn_type,
+                        "name": name, "label": name}]
+        return block
+
+    blocks = {
+        "test.source": make_block("test.source", "OUTPUT", "out",
+                                  "$port[out]$ = $prop[value]$\n"),
+        "test.sink": make_block("test.sink", "INPUT", "in",
+                                "print($port[in]$)\n"),
+    }
+    template = CodeTemplate()
+    template.type = "test.template"
+    template.name = "test"
+    template.language = "python"
+    template.command = "python $dir_name$main.py"
+    template.codes = {"main.py": "$code[function, connection]$"}
+    template.code_parts = ["function"]
+
+    monkeypatch.setattr(System, "get_blocks", classmethod(lambda cls, language=None: blocks))
+    monkeypatch.setattr(System, "get_ports",
+                        classmethod(lambda cls, language=None: {port.type: port}))
+    monkeypatch.setattr(System, "get_code_templates",
+                        classmethod(lambda cls, language=None: {template.type: template}))
+
 @pytest.fixture
 def main_window():
     return MainWindow()
@@ -80,7 +129,7 @@ def block(diagram_control):
     block_model.file = None
     block_model.id = len(System.get_blocks()) + 1
     block = Block(diagram_control.diagram, block_model)
-    System.get_blocks()[block.type] = block
+    System.add_block(block)
     from mosaicode.persistence.blockpersistence import BlockPersistence
     temp_dir = "mosaicode/extensions/blocks"
     os.makedirs(temp_dir, exist_ok=True)
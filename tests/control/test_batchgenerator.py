@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for BatchGenerator (headless code generation, no GUI dependencies).
+"""
+import json
+from pathlib import Path
+
+from mosaicode.control.batchgenerator import BatchGenerator, main
+from tests.helpers import write_diagram
+
+
+def test_load(registry, test_dir):
+    diagram = BatchGenerator.load(write_diagram(test_dir / "patch.mscd", "2"))
+    assert diagram is not None
+    assert diagram.code_template.type == "test.template"
+    assert sorted(diagram.blocks) == [1, 2]
+    assert len(diagram.connectors) == 1
+    assert str(diagram.comments[0]) == "Note"
+
+
+def test_load_invalid_connections(registry, test_dir):
+    file_name = write_diagram(test_dir / "patch.mscd", "2")
+    data = json.loads(Path(file_name).read_text())
+    data["blocks"].append(dict(data["blocks"][0], id=3))
+    data["connections"] += [
+        # The input is already connected
+        {"from_block": 3, "from_out": 0, "to_block": 2, "to_in": 0},
+        {"from_block": 1, "from_out": 5, "to_block": 2, "to_in": 0},
+        {"from_block": 1, "from_out": 0, "to_block": 9, "to_in": 0},
+    ]
+    Path(file_name).write_text(json.dumps(data))
+    diagram = BatchGenerator.load(file_name)
+    assert sorted(diagram.blocks) == [1, 2, 3]
+    assert diagram.last_id == 4
+    assert [(c.output.id, c.input.id) for c in diagram.connectors] == [(1, 2)]
+    assert diagram.get_incoming(2) == diagram.connectors
+
+
+def test_generate(registry, test_dir):
+    file_name = write_diagram(test_dir / "patch.mscd", "2")
+    name, success, message = BatchGenerator.generate(file_name, str(test_dir / "out"))
+    assert success, message
+    code = (test_dir / "out" / "patch" / "main.py").read_text()
+    assert code == "source_1_out = 2\nsink_2_in = source_1_out\nprint(sink_2_in)\n"
+
+
+def test_main(registry, test_dir):
+    files = [write_diagram(test_dir / "a.mscd", "3"),
+             write_diagram(test_dir / "b.mscd", "4"),
+             str(test_dir / "missing.mscd")]
+    status = main(files + ["-o", str(test_dir / "out"), "-j", "1"])
+    assert status == 1
+    assert "= 3" in (test_dir / "out" / "a" / "main.py").read_text()
+    assert "= 4" in (test_dir / "out" / "b" / "main.py").read_text()
@@ -21,6 +21,7 @@ sys.modules['gi.repository.Gtk'] = MagicMock()
 
 # Now we can import CodeGenerator
 from mosaicode.control.codegenerator import CodeGenerator
+from mosaicode.model.diagrammodel import DiagramModel
 
 
 @pytest.fixture
@@ -35,7 +36,7 @@ def test_dir():
 @pytest.fixture
 def mock_diagram():
     """Create a mock diagram for testing."""
-    diagram = Mock()
+    diagram = DiagramModel()
     
     # Mock blocks
     block1 = Mock()
@@ -120,7 +121,7 @@ class TestCodeGeneratorPure:
     def test_sort_block_list_with_connections(self):
         """Test block list sorting with connections."""
         # Create mock diagram with connections
-        diagram = Mock()
+        diagram = DiagramModel()
         
         # Create blocks
         block1 = Mock()
@@ -207,7 +208,7 @@ class TestCodeGeneratorPure:
         """Test file code generation."""
         # Mock diagram.language e patch_name para evitar TypeError
         mock_diagram.language = "python"
-        mock_diagram.patch_name = "test_patch"
+        mock_diagram.file_name = "test_patch.mscd"
         # Mock code_template.codes para evitar erro de iteração
         mock_diagram.code_template.codes = {"function": "print('Hello World')"}
         
@@ -226,7 +227,7 @@ class TestCodeGeneratorPure:
         """Test complete code generation integration."""
         # Mock diagram.language e patch_name para evitar TypeError
         mock_diagram.language = "python"
-        mock_diagram.patch_name = "test_patch"
+        mock_diagram.file_name = "test_patch.mscd"
         # Mock code_template.codes para evitar erro de iteração
         mock_diagram.code_template.codes = {"function": "print('Hello World')"}
         
@@ -241,7 +242,7 @@ class TestCodeGeneratorPure:
     def test_code_generator_with_properties(self):
         """Test code generator with block properties."""
         # Create mock diagram with properties
-        diagram = Mock()
+        diagram = DiagramModel()
         
         # Create block with properties
         block = Mock()
@@ -287,7 +288,7 @@ class TestCodeGeneratorPure:
     def test_code_generator_with_ports(self):
         """Test code generator with block ports."""
         # Create mock diagram with ports
-        diagram = Mock()
+        diagram = DiagramModel()
         
         # Create block with ports
         block = Mock()
@@ -333,4 +334,150 @@ class TestCodeGeneratorPure:
         block = code_generator._CodeGenerator__block_list[0]
         assert len(block.ports) == 2
         assert block.ports[0].name == "input1"
-        assert block.ports[1].name == "output1" 
\ No newline at end of file
+        assert block.ports[1].name == "output1" 
+
+    def test_sort_block_list_levels(self):
+        """Test that blocks are bucketed by the longest path that reaches them."""
+        diagram = DiagramModel()
+        blocks = {}
+        for i in range(1, 5):
+            block = Mock()
+            block.id = i
+            block.weight = 0
+            block.connections = []
+            blocks[i] = block
+
+        def connect(output, input):
+            connection = Mock()
+            connection.output = blocks[output]
+            connection.input = blocks[input]
+            return connection
+
+        # 1 -> 2 -> 3 and 1 -> 3, 4 is isolated
+        diagram.blocks = blocks
+        diagram.connectors = [connect(1, 2), connect(2, 3), connect(1, 3)]
+
+        code_generator = CodeGenerator(diagram)
+        code_generator._CodeGenerator__prepare_block_list()
+        assert code_generator._CodeGenerator__sort_block_list() is True
+
+        assert [b.weight for b in blocks.values()] == [0, 1, 2, 0]
+        levels = code_generator._CodeGenerator__levels
+        assert [[b.id for b in level] for level in levels] == [[1, 4], [2], [3]]
+        assert len(blocks[1].connections) == 2
+
+    def test_sort_block_list_with_cycle(self):
+        """Test that a cycle is reported instead of looping forever."""
+        diagram = DiagramModel()
+        block1 = Mock()
+        block1.id = 1
+        block2 = Mock()
+        block2.id = 2
+        connection1 = Mock()
+        connection1.output = block1
+        connection1.input = block2
+        connection2 = Mock()
+        connection2.output = block2
+        connection2.input = block1
+        diagram.blocks = {1: block1, 2: block2}
+        diagram.connectors = [connection1, connection2]
+
+        code_generator = CodeGenerator(diagram)
+        code_generator._CodeGenerator__prepare_block_list()
+        assert code_generator._CodeGenerator__sort_block_list() is False
+        assert code_generator.generate_code() == {}
+
+    def test_generate_code_with_connections(self):
+        """Test wildcard expansion of ports, properties and connections."""
+        diagram = DiagramModel()
+        diagram.language = "python"
+        diagram.file_name = "test_patch.mscd"
+
+        output_port = Mock()
+        output_port.name = "out"
+        output_port.var_name = "$block[label]$_$block[id]$_$port[name]$"
+        output_port.code = "$input$ = $output$\n"
+        input_port = Mock()
+        input_port.name = "in"
+        input_port.var_name = "$block[label]$_$block[id]$_$port[name]$"
+
+        block1 = Mock()
+        block1.id = 1
+        block1.label = "Osc"
+        block1.codes = {"function": "$port[out]$ = $prop[freq]$ # $label$\n"}
+        block1.ports = [output_port]
+        block1.get_properties.return_value = [{"name": "freq", "value": 440}]
+
+        block2 = Mock()
+        block2.id = 2
+        block2.label = "Out"
+        block2.codes = {"function": "print($port[in]$)\n"}
+        block2.ports = [input_port]
+        block2.get_properties.return_value = []
+
+        connection = Mock()
+        connection.output = block1
+        connection.output_port = output_port
+        connection.input = block2
+        connection.input_port = input_port
+
+        diagram.blocks = {2: block2, 1: block1}
+        diagram.connectors = [connection]
+
+        code_template = Mock()
+        code_template.code_parts = ["function"]
+        code_template.command = "python"
+        code_template.name = "test_template"
+        code_template.description = "Test template"
+        code_template.properties = []
+        code_template.codes = {"main": "$code[function, connection]$$name$"}
+        diagram.code_template = code_template
+
+        result = CodeGenerator(diagram).generate_code()
+        assert result["main"] == ("Osc_1_out = 440 # Osc\n"
+                                  "Out_2_in = Osc_1_out\n"
+                                  "print(Out_2_in)\n"
+                                  "test_template")
+
+    def test_generate_code_reuses_cached_blocks(self):
+        """Test that only blocks whose inputs changed are expanded again."""
+        # The block cache is kept per (hashable) diagram
+        diagram = Mock()
+        diagram.language = "python"
+        diagram.patch_name = "test_patch"
+        diagram.get_outgoing.side_effect = lambda block_id: []
+        diagram.get_topological_order.return_value = [1, 2]
+
+        blocks = {}
+        for i in (1, 2):
+            block = Mock()
+            block.id = i
+            block.label = "Block"
+            block.codes = {"function": "v$id$ = $prop[value]$\n"}
+            block.ports = []
+            block.get_properties.return_value = [{"name": "value", "value": i}]
+            blocks[i] = block
+        diagram.blocks = blocks
+        diagram.connectors = []
+
+        code_template = Mock()
+        code_template.code_parts = ["function"]
+        code_template.command = "python"
+        code_template.name = "test_template"
+        code_template.description = "Test template"
+        code_template.properties = []
+        code_template.codes = {"main": "$code[function]$"}
+        diagram.code_template = code_template
+
+        assert CodeGenerator(diagram).generate_code()["main"] == "v1 = 1\nv2 = 2\n"
+        first = blocks[1].gen_codes["function"]
+        second = blocks[2].gen_codes["function"]
+
+        blocks[2].get_properties.return_value = [{"name": "value", "value": 5}]
+        assert CodeGenerator(diagram).generate_code()["main"] == "v1 = 1\nv2 = 5\n"
+        assert blocks[1].gen_codes["function"] is first
+        assert blocks[2].gen_codes["function"] is not second
+
+        CodeGenerator.clear_cache(diagram)
+        CodeGenerator(diagram).generate_code()
+        assert blocks[1].gen_codes["function"] is not first
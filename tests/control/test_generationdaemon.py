@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for GenerationDaemon (resident code generation server).
+"""
+import json
+import threading
+
+import pytest
+
+from mosaicode.system import ExtensionChanges, System
+from mosaicode.control.batchgenerator import BatchGenerator
+from mosaicode.control.generationdaemon import GenerationDaemon
+from tests.helpers import write_diagram
+
+
+@pytest.fixture
+def daemon(registry, test_dir, monkeypatch):
+    """Run a daemon on a temporary socket."""
+    changes = []
+    monkeypatch.setattr(System, "reload", classmethod(lambda cls: None))
+    monkeypatch.setattr(System, "load_language",
+                        classmethod(lambda cls, language=None: None))
+    monkeypatch.setattr(System, "refresh",
+                        classmethod(lambda cls: changes.pop() if changes
+                                    else ExtensionChanges()))
+    server = GenerationDaemon(str(test_dir / "gen.sock"), interval=0)
+    server.changes = changes
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_validate(registry, test_dir):
+    file_name = write_diagram(test_dir / "patch.mscd", "2")
+    assert BatchGenerator.validate(file_name) == []
+
+    data = json.loads((test_dir / "patch.mscd").read_text())
+    data["blocks"].append({"type": "test.missing", "id": 3})
+    data["connections"].append(
+        {"from_block": 2, "from_out": 0, "to_block": 1, "to_in": 0})
+    (test_dir / "patch.mscd").write_text(json.dumps(data))
+    errors = BatchGenerator.validate(file_name)
+    assert "Block test.missing not found" in errors
+    assert "Invalid output port 0 in block 2" in errors
+
+
+def test_generate_and_validate(daemon, test_dir):
+    file_name = write_diagram(test_dir / "patch.mscd", "5")
+    responses = GenerationDaemon.request(daemon.socket_path, [
+        {"command": "ping"},
+        {"command": "validate", "file": file_name},
+        {"command": "generate", "file": file_name,
+         "output_dir": str(test_dir / "out")},
+        {"command": "generate", "file": str(test_dir / "missing.mscd")},
+        {"command": "unknown", "file": file_name},
+    ], timeout=10)
+    assert [response["success"] for response in responses] == \
+        [True, True, True, False, False]
+    assert responses[1]["errors"] == []
+    assert "= 5" in (test_dir / "out" / "patch" / "main.py").read_text()
+
+
+def test_refresh_on_extension_change(daemon):
+    assert not daemon.check_extensions()
+    changes = ExtensionChanges()
+    changes.removed["blocks"].add("test.sink")
+    daemon.changes.append(changes)
+    assert daemon.check_extensions()
+    assert not daemon.check_extensions()
+
+
+def test_invalid_request(daemon):
+    responses = GenerationDaemon.request(daemon.socket_path, ["not a dict"],
+                                         timeout=10)
+    assert responses == [{"success": False,
+                          "message": "Request is not an object"}]
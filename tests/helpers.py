@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the tests that do not need the GUI.
+"""
+import json
+
+
+def write_diagram(path, value):
+    data = {
+        "source": "JSON",
+        "data": "DIAGRAM",
+        "zoom": 1.0,
+        "language": "python",
+        "code_template": {},
+        "blocks": [
+            {"type": "test.source", "id": 1, "collapsed": False, "x": 0, "y": 0,
+             "properties": [{"key": "value", "value": value}]},
+            {"type": "test.sink", "id": 2, "collapsed": False, "x": 200, "y": 0,
+             "properties": []},
+        ],
+        "connections": [
+            {"from_block": 1, "from_out": 0, "to_block": 2, "to_in": 0},
+        ],
+        "comments": [{"x": 0, "y": 0,
+                      "properties": [{"key": "text", "value": "Note"}]}],
+        "authors": [],
+    }
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+PORT = {"data": "PORT", "type": "test.float", "version": "0.0.1",
+        "language": "python", "hint": "", "color": "#fff", "multiple": False,
+        "var_name": "$block[label]$_$port[name]$", "code": "$input$ = $output$"}
+
+
+def write_block(path, label):
+    path.write_text(json.dumps({
+        "data": "BLOCK", "type": "test.source", "language": "python",
+        "label": label, "codes": {"function": "x = 1"}, "properties": [],
+        "ports": [{"type": "test.float", "conn_type": "OUTPUT",
+                   "name": "out", "label": "Out"}]}))
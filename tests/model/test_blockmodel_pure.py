@@ -109,4 +109,39 @@ def test_block_serialization(temp_dir):
     new_block = BlockModel(**block_dict)
     assert new_block.id == block.id
     assert new_block.label == block.label
-    assert new_block.color == block.color 
\ No newline at end of file
+    assert new_block.color == block.color 
+
+
+def test_block_new_instance():
+    prototype = BlockModel(type="test.block", label="Test")
+    prototype.codes = {"function": "x = $prop[value]$\n"}
+    prototype.properties = [{"name": "value", "value": "1"},
+                            {"name": "other", "value": "2"}]
+    instance = prototype.new_instance()
+    assert instance.id == -1
+    assert instance.type == "test.block"
+    # Type data is shared, not copied
+    assert instance.codes is prototype.codes
+    assert instance.ports is prototype.ports
+
+    instance.set_properties({"value": "5", "other": "2"})
+    assert instance.properties_dict == {"value": "5", "other": "2"}
+    assert prototype.properties[0]["value"] == "1"
+    # Unchanged properties are still shared
+    assert instance.properties[1] is prototype.properties[1]
+
+    instance.gen_codes["function"] = "x = 5\n"
+    assert prototype.gen_codes == {}
+    assert instance.new_instance().properties_dict == {"value": "5", "other": "2"}
+
+
+def test_block_set_properties_unchanged():
+    block = BlockModel(type="test.block")
+    block.properties = [{"name": "value", "value": "1"}]
+    properties = block.properties
+    # Applying the same values is not a change to record
+    block.set_properties({"value": "1"})
+    assert block.properties is properties
+    block.set_properties({"value": "2"})
+    assert block.properties is not properties
+    assert block.get_properties()[0]["value"] == "2"
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the diagram commands and CommandHistory.
+"""
+import pytest
+
+from mosaicode.model.blockmodel import BlockModel
+from mosaicode.model.commandhistory import (
+    AddBlock, AddConnection, Command, CommandHistory, MoveBlocks, RemoveBlock,
+    RemoveComment, SetProperties)
+from mosaicode.model.commentmodel import CommentModel
+from mosaicode.model.connectionmodel import ConnectionModel
+from mosaicode.model.diagrammodel import DiagramModel
+from mosaicode.model.port import Port
+
+
+@pytest.fixture
+def diagram():
+    diagram = DiagramModel()
+    for i in (1, 2):
+        block = BlockModel()
+        block.id = i
+        block.properties = [{"name": "value", "value": i}]
+        diagram.blocks[i] = block
+    return diagram
+
+
+def test_undo_redo(diagram):
+    # Commands must implement undo and redo
+    with pytest.raises(TypeError):
+        Command()
+    history = CommandHistory(diagram)
+    assert history.undo() is None
+
+    block = BlockModel()
+    block.id = 3
+    diagram.blocks[3] = block
+    history.push("Add Block", [AddBlock(block)])
+    port = Port()
+    connection = ConnectionModel(diagram, diagram.blocks[1], port, block, port)
+    diagram.add_connection(connection)
+    history.push("Add Connection", [AddConnection(connection)])
+
+    # The connection model may be replaced by its widget
+    widget = ConnectionModel(diagram, diagram.blocks[1], port, block, port)
+    diagram.replace_connection(connection, widget)
+    assert history.undo().name == "Add Connection"
+    assert diagram.connectors == []
+    history.undo()
+    assert list(diagram.blocks) == [1, 2]
+    history.redo()
+    history.redo()
+    assert diagram.blocks[3] is block
+    assert diagram.get_incoming(3) == [widget]
+
+    # A new action discards the undone ones
+    history.undo()
+    comment = CommentModel()
+    diagram.comments.append(comment)
+    diagram.comments.remove(comment)
+    history.push("Delete", [RemoveComment(comment, 0)])
+    assert diagram.redo_stack == []
+    history.undo()
+    assert diagram.comments == [comment]
+
+    removed = diagram.remove_block(3)
+    history.push("Delete", [RemoveBlock(block, removed)])
+    history.undo()
+    assert 3 in diagram.blocks
+
+
+def test_properties_and_moves(diagram):
+    history = CommandHistory(diagram)
+    block = diagram.blocks[1]
+    old = block.properties
+    for value in ("4", "42"):
+        previous = block.properties
+        block.set_properties({"value": value})
+        history.push("Set Properties", [SetProperties(block, previous, block.properties)])
+    # Consecutive changes of a block are merged
+    assert len(diagram.undo_stack) == 1
+    history.undo()
+    assert block.properties is old
+    history.redo()
+    assert block.get_properties()[0]["value"] == "42"
+
+    # Changes of another field are a separate action
+    block.properties = block.properties + [{"name": "gain", "value": "1"}]
+    previous = block.properties
+    block.set_properties({"gain": "2"})
+    history.push("Set Properties", [SetProperties(block, previous, block.properties)])
+    assert len(diagram.undo_stack) == 2
+    history.undo()
+    assert block.get_properties()[0]["value"] == "42"
+    assert block.get_properties()[1]["value"] == "1"
+
+    diagram.blocks[1].x, diagram.blocks[1].y = 10, 20
+    diagram.blocks[2].x, diagram.blocks[2].y = 5, 20
+    history.push("Align", [MoveBlocks({1: ((0, 0), (10, 20)), 2: ((5, 5), (5, 20))})])
+    history.undo()
+    assert (diagram.blocks[1].x, diagram.blocks[1].y) == (0, 0)
+    assert (diagram.blocks[2].x, diagram.blocks[2].y) == (5, 5)
+    history.redo()
+    assert (diagram.blocks[1].x, diagram.blocks[1].y) == (10, 20)
+
+
+def test_budget(diagram):
+    history = CommandHistory(diagram, budget=20000)
+    for i in range(100):
+        block = BlockModel()
+        block.id = 10 + i
+        block.label = "x" * 1000
+        diagram.blocks[block.id] = block
+        removed = diagram.remove_block(block.id)
+        history.push("Delete", [RemoveBlock(block, removed)])
+        assert history.get_size() <= 20000 or len(diagram.undo_stack) == 1
+    assert 1 < len(diagram.undo_stack) < 100
+    assert history.get_size() == sum(entry.size for entry in diagram.undo_stack)
+    # The oldest actions were dropped
+    assert diagram.undo_stack[-1].commands[0].block.id == 109
+
+    # Stacks replaced directly are counted again
+    diagram.undo_stack = []
+    assert history.get_size() == 0
+
+
+def test_transaction(diagram):
+    history = CommandHistory(diagram)
+    assert not diagram.defer("redraw")
+
+    history.begin("Paste")
+    history.begin("Add Block")
+    for i in (3, 4):
+        block = BlockModel()
+        block.id = i
+        diagram.blocks[i] = block
+        history.push("Add Block", [AddBlock(block)])
+        assert diagram.defer("redraw")
+    assert history.end() is None
+    assert diagram.undo_stack == []
+    assert history.end() == ["redraw"]
+    assert not diagram.defer("redraw")
+
+    # One action for the whole transaction
+    assert [entry.name for entry in diagram.undo_stack] == ["Paste"]
+    history.undo()
+    assert list(diagram.blocks) == [1, 2]
+    history.redo()
+    assert list(diagram.blocks) == [1, 2, 3, 4]
+
+    # Changes of a transaction not committed are undone
+    history.begin("Delete")
+    block = diagram.blocks[3]
+    history.push("Delete", [RemoveBlock(block, diagram.remove_block(3))])
+    history.end(commit=False)
+    assert diagram.blocks[3] is block
+    assert len(diagram.undo_stack) == 1
@@ -3,12 +3,16 @@
 Tests for DiagramModel class.
 Migrated from unittest to pytest.
 """
+import random
+
 import pytest
 from pathlib import Path
 
 from mosaicode.model.diagrammodel import DiagramModel
 from mosaicode.model.blockmodel import BlockModel
 from mosaicode.model.commentmodel import CommentModel
+from mosaicode.model.connectionmodel import ConnectionModel
+from mosaicode.model.port import Port
 
 
 @pytest.fixture
@@ -267,3 +271,87 @@ def test_diagram_model_edge_cases(diagram):
     # Test with filename with multiple dots
     diagram.file_name = "test.file.mscd"
     assert diagram.patch_name == "test.file"
+
+
+def test_diagram_model_connection_index(diagram):
+    """Test the connection indexes by block and by port."""
+    blocks = []
+    for i in range(3):
+        block = BlockModel()
+        block.id = i
+        diagram.blocks[i] = block
+        blocks.append(block)
+    out_port = Port()
+    in_port = Port()
+    first = ConnectionModel(diagram, blocks[0], out_port, blocks[1], in_port)
+    second = ConnectionModel(diagram, blocks[1], out_port, blocks[2], in_port)
+    diagram.add_connection(first)
+    diagram.add_connection(second)
+
+    assert diagram.get_outgoing(0) == [first]
+    assert diagram.get_incoming(2) == [second]
+    assert diagram.get_outgoing(2) == []
+    assert diagram.get_port_connections(blocks[1], in_port) == [first]
+    assert diagram.get_port_connections(blocks[1], out_port) == [second]
+
+    other = ConnectionModel(diagram, blocks[0], out_port, blocks[2], in_port)
+    diagram.replace_connection(first, other)
+    assert diagram.connectors == [other, second]
+    assert diagram.get_incoming(1) == []
+    assert diagram.get_incoming(2) == [other, second]
+
+    # Changes made directly to the list are noticed
+    diagram.connectors.append(first)
+    assert diagram.get_incoming(1) == [first]
+    diagram.connectors = [second]
+    assert diagram.get_outgoing(0) == []
+
+    assert diagram.remove_connection(second)
+    assert not diagram.remove_connection(second)
+    diagram.set_connections([first, second, other])
+    assert diagram.remove_block(1) == [second, first]
+    assert 1 not in diagram.blocks
+    assert diagram.connectors == [other]
+    assert diagram.get_outgoing(0) == [other]
+
+
+def test_diagram_model_topological_order(diagram):
+    """Test the cycle checks and the order kept on each new connection."""
+    port = Port()
+    blocks = {}
+    for i in range(30):
+        block = BlockModel()
+        block.id = i
+        diagram.blocks[i] = block
+        blocks[i] = block
+
+    def reaches(start, target):
+        marks = [start]
+        for block_id in marks:
+            for connection in diagram.connectors:
+                if connection.output.id == block_id and connection.input.id not in marks:
+                    marks.append(connection.input.id)
+        return target in marks
+
+    generator = random.Random(1)
+    for _ in range(200):
+        source, target = generator.sample(range(30), 2)
+        assert diagram.would_create_cycle(source, target) == reaches(target, source)
+        if not reaches(target, source):
+            diagram.add_connection(
+                ConnectionModel(diagram, blocks[source], port, blocks[target], port))
+        order = diagram.get_topological_order()
+        assert sorted(order) == list(range(30))
+        position = {block_id: i for i, block_id in enumerate(order)}
+        for connection in diagram.connectors:
+            assert position[connection.output.id] < position[connection.input.id]
+
+    # A cycle made directly in the list
+    first = diagram.connectors[0]
+    back = ConnectionModel(diagram, first.input, port, first.output, port)
+    diagram.connectors.append(back)
+    assert diagram.get_topological_order() is None
+    assert diagram.would_create_cycle(first.output.id, first.input.id)
+    diagram.remove_connection(back)
+    assert diagram.get_topological_order() is not None
+    assert diagram.would_create_cycle(first.input.id, first.output.id)
@@ -3,9 +3,12 @@
 Tests for Port class.
 Migrated from unittest to pytest.
 """
+import copy
+import pickle
+
 import pytest
 
-from mosaicode.model.port import Port
+from mosaicode.model.port import Port, PortRef
 
 
 def test_init():
@@ -17,3 +20,34 @@ def test_init():
     model.conn_type = Port.OUTPUT
     assert model.is_input() is False
 
+
+
+def test_port_ref():
+    """Test block ports sharing a port type."""
+    port = Port()
+    port.type = "test.float"
+    port.hint = "FLOAT"
+    port.code = "$input$ = $output$"
+    port_type = port.get_port_type()
+    assert port.get_port_type() is port_type
+
+    port_ref = PortRef(port_type, conn_type=Port.INPUT, name="in", label="In")
+    assert port_ref.is_input()
+    assert port_ref.type == "test.float"
+    assert port_ref.code == "$input$ = $output$"
+    assert port_ref.hint == "FLOAT"
+    port_ref.hint = ""
+    assert port_ref.hint == ""
+    with pytest.raises(AttributeError):
+        port_ref.color = "#FFF"
+
+    other = copy.deepcopy(port_ref)
+    assert other == port_ref
+    assert other.port_type is port_type
+    other.index = 1
+    assert other != port_ref
+
+    # Unpickled port types are shared too
+    other = pickle.loads(pickle.dumps(port_ref))
+    assert other == port_ref
+    assert other.port_type is port_type
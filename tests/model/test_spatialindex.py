@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the SpatialIndex class and the item bounds of DiagramModel.
+"""
+import random
+
+from mosaicode.model.blockmodel import BlockModel
+from mosaicode.model.diagrammodel import DiagramModel
+from mosaicode.model.spatialindex import SpatialIndex
+
+
+def brute_force(boxes, area, inside):
+    x1, y1, x2, y2 = area
+    if inside:
+        return {key for key, (bx1, by1, bx2, by2) in boxes.items()
+                if x1 <= bx1 and y1 <= by1 and bx2 <= x2 and by2 <= y2}
+    return {key for key, (bx1, by1, bx2, by2) in boxes.items()
+            if bx1 <= x2 and x1 <= bx2 and by1 <= y2 and y1 <= by2}
+
+
+def test_query():
+    rand = random.Random(4)
+    index = SpatialIndex(cell_size=50)
+    boxes = {}
+    for step in range(2000):
+        key = rand.randrange(300)
+        if rand.random() < 0.2:
+            assert index.remove(key) == (key in boxes)
+            boxes.pop(key, None)
+            continue
+        x, y = rand.uniform(-1000, 3000), rand.uniform(-1000, 3000)
+        # Some boxes are long connectors across the canvas
+        size = 2000 if key % 50 == 0 else 120
+        box = (x, y, x + rand.uniform(0, size), y + rand.uniform(0, 60))
+        index.insert(key, box)
+        boxes[key] = box
+        if step % 20 == 0:
+            x, y = rand.uniform(-1000, 3000), rand.uniform(-1000, 3000)
+            # Small and large areas, backwards as the rubber band
+            area = (x, y, x - rand.choice((10, 300, 5000)), y + rand.uniform(0, 900))
+            normal = (min(area[0], area[2]), area[1], max(area[0], area[2]), area[3])
+            for inside in (True, False):
+                assert set(index.query(area, inside)) == brute_force(boxes, normal, inside)
+    assert len(index) == len(boxes)
+    assert index.get_extent() == (min(box[0] for box in boxes.values()),
+                                  min(box[1] for box in boxes.values()),
+                                  max(box[2] for box in boxes.values()),
+                                  max(box[3] for box in boxes.values()))
+    index.clear()
+    assert index.get_extent() is None
+    assert index.query((-5000, -5000, 5000, 5000)) == []
+
+
+def test_diagram_bounds():
+    diagram = DiagramModel()
+    blocks = []
+    for block_id, (x, y) in enumerate([(0, 0), (300, 40), (1000, 900)]):
+        block = BlockModel()
+        block.id, block.x, block.y = block_id, x, y
+        diagram.blocks[block_id] = block
+        blocks.append(block)
+    assert diagram.get_extent() == (0, 0, 1000, 900)
+    assert diagram.get_items_in_bounds((-10, -10, 400, 100), inside=True) in \
+        ([blocks[0], blocks[1]], [blocks[1], blocks[0]])
+
+    blocks[2].x = 50
+    diagram.update_bounds(blocks[2])
+    assert diagram.get_items_in_bounds((40, 800, 60, 1000)) == [blocks[2]]
+    diagram.forget_bounds(blocks[1])
+    assert diagram.get_extent() == (0, 0, 50, 900)
+    # Invalidated, the index is built again from the items
+    diagram._spatial = None
+    assert len(diagram.get_items_in_bounds((-10, -10, 2000, 2000))) == 3
+
+
+def test_diagram_item_area():
+    """Items off the canvas give their own area."""
+    class Item:
+        def get_area(self):
+            return (5, 5, 10, 10)
+
+        def get_bounds(self):
+            raise AssertionError("not on the canvas")
+
+    diagram = DiagramModel()
+    item = Item()
+    diagram.connectors.append(item)
+    assert diagram.get_items_in_bounds((0, 0, 6, 6)) == [item]
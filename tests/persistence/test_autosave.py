@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the autosave journal and the recovery of diagrams.
+"""
+import os
+
+from mosaicode.control.batchgenerator import BatchGenerator
+from mosaicode.model.commandhistory import (
+    AddBlock, AddComment, AddConnection, CommandHistory, MoveBlocks,
+    RemoveConnection, SetProperties)
+from mosaicode.model.commentmodel import CommentModel
+from mosaicode.model.diagrammodel import DiagramModel
+from mosaicode.persistence.autosave import Autosave
+from mosaicode.persistence.diagrampersistence import DiagramPersistence
+from mosaicode.system import System
+from tests.helpers import write_diagram
+
+
+def edit(diagram):
+    """Make some changes through the history."""
+    history = CommandHistory(diagram)
+    block = DiagramPersistence.create_block(
+        {"type": "test.source", "id": 3, "collapsed": False, "x": 10, "y": 20,
+         "properties": [{"key": "value", "value": "5"}]},
+        System.get_blocks(), System.get_ports())
+    diagram.blocks[3] = block
+    diagram.last_id = 4
+    history.push("Add Block", [AddBlock(block)])
+
+    old = diagram.connectors[0]
+    diagram.remove_connection(old)
+    new = DiagramPersistence.create_connection(
+        diagram, {"from_block": 3, "from_out": 0, "to_block": 2, "to_in": 0})
+    diagram.add_connection(new)
+    history.push("Connect", [RemoveConnection(old), AddConnection(new)])
+
+    previous = diagram.blocks[1].get_properties()
+    diagram.blocks[1].set_properties({"value": "7"})
+    history.push("Set Properties", [SetProperties(diagram.blocks[1], previous,
+                                                  diagram.blocks[1].get_properties())])
+    diagram.blocks[2].x, diagram.blocks[2].y = 300, 40
+    history.push("Align", [MoveBlocks({2: ((200, 0), (300, 40))})])
+
+    comment = CommentModel()
+    comment.set_properties({"text": "Other"})
+    diagram.comments.append(comment)
+    history.push("Add Comment", [AddComment(comment, 1)])
+    # Undone changes are recorded too
+    history.undo()
+    history.undo()
+    history.redo()
+
+
+def summary(diagram):
+    return ({block_id: (block.x, block.y, block.get_properties()[0]["value"])
+             for block_id, block in diagram.blocks.items()},
+            [(c.output.id, c.input.id) for c in diagram.connectors],
+            [str(comment) for comment in diagram.comments],
+            diagram.last_id)
+
+
+def test_recover_journal(registry, test_dir):
+    directory = str(test_dir / "autosave")
+    diagram = BatchGenerator.load(write_diagram(test_dir / "patch.mscd", "2"))
+    autosave = Autosave(diagram, directory)
+    assert Autosave.get_recoverable(directory) == []
+    edit(diagram)
+    assert autosave.flush(5)
+
+    # The process stops without saving
+    assert Autosave.get_recoverable(directory) == \
+        [(autosave.key, str(test_dir / "patch.mscd"))]
+    recovered = DiagramModel()
+    assert Autosave.recover(recovered, autosave.key, directory)
+    assert recovered.file_name == str(test_dir / "patch.mscd")
+    assert summary(recovered) == summary(diagram)
+    assert summary(recovered)[0][2] == (300, 40, "1")
+    assert os.listdir(directory) == []
+
+
+
+def test_recover_drag(registry, test_dir):
+    directory = str(test_dir / "autosave")
+    diagram = BatchGenerator.load(write_diagram(test_dir / "patch.mscd", "2"))
+    autosave = Autosave(diagram, directory)
+    history = CommandHistory(diagram)
+    block = diagram.blocks[1]
+    # A drag moves the block many times, the move is recorded on release
+    for x in (10, 20, 30):
+        diagram.start_move(block)
+        block.x = x
+    history.push("Move", [MoveBlocks(diagram.end_move())])
+    diagram.start_move(block)
+    block.y = 50
+    history.push("Move", [MoveBlocks(diagram.end_move())])
+    # A click without a drag moves nothing
+    diagram.start_move(block)
+    assert diagram.end_move() == {}
+    assert [entry.name for entry in diagram.undo_stack] == ["Move"]
+    assert diagram.undo_stack[0].commands[0].positions == {1: ((0, 0), (30, 50))}
+    assert autosave.flush(5)
+
+    recovered = DiagramModel()
+    assert Autosave.recover(recovered, autosave.key, directory)
+    assert (recovered.blocks[1].x, recovered.blocks[1].y) == (30, 50)
+
+def test_recover_snapshot(registry, test_dir, monkeypatch):
+    monkeypatch.setattr(Autosave, "COMPACT_RECORDS", 3)
+    directory = str(test_dir / "autosave")
+    diagram = BatchGenerator.load(write_diagram(test_dir / "patch.mscd", "2"))
+    autosave = Autosave(diagram, directory)
+    edit(diagram)
+    assert autosave.flush(5)
+    assert os.path.exists(autosave.get_snapshot_name())
+
+    recovered = DiagramModel()
+    assert Autosave.recover(recovered, autosave.key, directory)
+    assert summary(recovered) == summary(diagram)
+
+    # Nothing is left to recover once the diagram is saved or closed
+    autosave = Autosave(diagram, directory)
+    edit(diagram)
+    autosave.reset()
+    assert autosave.flush(5)
+    assert Autosave.get_recoverable(directory) == []
+    edit(diagram)
+    autosave.discard()
+    assert diagram._journal is None
+    assert Autosave.wait_stopped(5)
+    assert os.listdir(directory) == []
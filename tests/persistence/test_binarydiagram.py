@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the binary diagram format and the mosaicode-convert command.
+"""
+import json
+
+import pytest
+
+from mosaicode.control.batchgenerator import BatchGenerator
+from mosaicode.persistence.binarydiagram import BinaryDiagram, main
+from tests.helpers import write_diagram
+
+
+def test_round_trip(test_dir):
+    json_file = write_diagram(test_dir / "patch.mscd", "2")
+    data = json.loads((test_dir / "patch.mscd").read_text())
+    # Values that are not strings and a block not fitting the packed records
+    data["blocks"][0]["properties"].append({"key": "gain", "value": 0.5})
+    data["blocks"][1]["x"] = 12.25
+    data["comments"][0]["properties"][0]["value"] = "Nota ç"
+    (test_dir / "patch.mscd").write_text(json.dumps(data))
+
+    binary_file = str(test_dir / "patch.mscdb")
+    BinaryDiagram.convert(json_file, binary_file)
+    assert BinaryDiagram.is_binary(binary_file)
+    assert not BinaryDiagram.is_binary(json_file)
+    with BinaryDiagram(binary_file) as binary:
+        assert list(binary) == list(data)
+        assert binary["blocks"][-1] == data["blocks"][-1]
+        assert binary["connections"][0] == data["connections"][0]
+        assert binary.to_data() == data
+
+    data["blocks"].append({"type": "test.sink", "id": 3, "extra": True})
+    data["connections"].append({"from_block": "1"})
+    BinaryDiagram.write(binary_file, data)
+    with BinaryDiagram(binary_file) as binary:
+        assert binary.to_data() == data
+
+    with pytest.raises(ValueError):
+        BinaryDiagram(json_file)
+
+
+def test_load_binary(registry, test_dir):
+    write_diagram(test_dir / "patch.mscd", "2")
+    assert main([str(test_dir / "patch.mscd")]) == 0
+    diagram = BatchGenerator.load(str(test_dir / "patch.mscdb"))
+    assert diagram is not None
+    assert diagram.code_template.type == "test.template"
+    assert sorted(diagram.blocks) == [1, 2]
+    assert diagram.blocks[1].get_properties()[0]["value"] == "2"
+    assert len(diagram.connectors) == 1
+
+    # Back to JSON
+    assert main([str(test_dir / "patch.mscdb"), "-o",
+                 str(test_dir / "copy.mscd")]) == 0
+    assert json.loads((test_dir / "copy.mscd").read_text()) == \
+        json.loads((test_dir / "patch.mscd").read_text())
+
+
+def test_validate_binary(registry, test_dir):
+    write_diagram(test_dir / "patch.mscd", "2")
+    binary_file = str(test_dir / "patch.mscdb")
+    BinaryDiagram.convert(str(test_dir / "patch.mscd"), binary_file)
+    assert BatchGenerator.validate(binary_file) == []
+
+    data = json.loads((test_dir / "patch.mscd").read_text())
+    data["blocks"].append({"type": "test.missing", "id": 3})
+    BinaryDiagram.write(binary_file, data)
+    assert BatchGenerator.validate(binary_file) == ["Block test.missing not found"]
+
+
+def test_truncated(test_dir, capsys):
+    write_diagram(test_dir / "patch.mscd", "2")
+    binary_file = test_dir / "patch.mscdb"
+    BinaryDiagram.convert(str(test_dir / "patch.mscd"), str(binary_file))
+    content = binary_file.read_bytes()
+    # Cut in the connection records, then in the JSON section
+    for size in (len(content) - 5, 200):
+        binary_file.write_bytes(content[:size])
+        with pytest.raises(ValueError, match="Truncated"):
+            BinaryDiagram(str(binary_file))
+        assert main([str(binary_file), "-o", str(test_dir / "copy.mscd")]) == 1
+        assert "Truncated" in capsys.readouterr().err
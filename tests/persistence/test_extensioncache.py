@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for ExtensionCache and the cached extension loading of System.
+"""
+import json
+import os
+
+import pytest
+
+from mosaicode.system import System
+from mosaicode.persistence.extensioncache import ExtensionCache
+from tests.helpers import PORT, write_block
+
+
+@pytest.fixture
+def extensions(tmp_path, monkeypatch):
+    """Fresh System using a temporary user directory and library."""
+    library = tmp_path / "extensions" / "python"
+    (library / "ports").mkdir(parents=True)
+    (library / "examples").mkdir()
+    (library / "blocks" / "math").mkdir(parents=True)
+    (library / "ports" / "float.json").write_text(json.dumps(PORT))
+    write_block(library / "blocks" / "math" / "source.json", "Source")
+    monkeypatch.setattr(System, "get_user_dir", classmethod(lambda cls: tmp_path))
+    monkeypatch.setattr(System, "get_extension_paths",
+                        classmethod(lambda cls: [str(tmp_path / "extensions")]))
+    monkeypatch.setattr(System, "instance", None)
+    return library
+
+
+def test_get_put_save(tmp_path):
+    cache = ExtensionCache(str(tmp_path / "cache.pickle"))
+    assert not cache.load()
+    cache.put("a.json", (1, 2), "A", {"port": ("p.json", (3, 4))})
+    cache.put("b.json", (1, 2), "B")
+    assert cache.save()
+
+    cache = ExtensionCache(str(tmp_path / "cache.pickle"))
+    assert cache.load()
+    assert cache.get("a.json", (1, 2), {"port": ("p.json", (3, 4))}) == (True, "A")
+    assert cache.get("a.json", (1, 2), {"port": ("p.json", (3, 5))}) == (False, None)
+    assert cache.get("a.json", (1, 3)) == (False, None)
+    assert cache.get("missing.json", (1, 2)) == (False, None)
+    # b.json was not requested: it is dropped on save
+    assert cache.save()
+    cache = ExtensionCache(str(tmp_path / "cache.pickle"))
+    cache.load()
+    assert cache.get("b.json", (1, 2)) == (False, None)
+
+
+def test_corrupted_file(tmp_path):
+    (tmp_path / "cache.pickle").write_bytes(b"not a pickle")
+    cache = ExtensionCache(str(tmp_path / "cache.pickle"))
+    assert not cache.load()
+    assert cache.get("a.json", (1, 2)) == (False, None)
+
+
+def test_system_reuses_unchanged_files(extensions, tmp_path):
+    blocks = System.get_blocks()
+    assert blocks["test.source"].label == "Source"
+    assert blocks["test.source"].ports[0].type == "test.float"
+    assert (tmp_path / "cache" / "extensions.pickle").exists()
+
+    block_file = extensions / "blocks" / "math" / "source.json"
+    stat = os.stat(block_file)
+    write_block(block_file, "Changed")
+    os.utime(block_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    System.reload()
+    assert System.get_blocks()["test.source"].label == "Changed"
+
+    # A changed port invalidates the blocks built from it
+    port_file = extensions / "ports" / "float.json"
+    port_file.write_text(json.dumps(dict(PORT, color="#000000")))
+    System.reload()
+    assert System.get_blocks()["test.source"].ports[0].color == "#000000"
+
+    cache = ExtensionCache(str(tmp_path / "cache" / "extensions.pickle"))
+    cache.load()
+    found, block = cache.get(str(block_file), ExtensionCache.signature(str(block_file)),
+                             {"test.float": (str(port_file),
+                                             ExtensionCache.signature(str(port_file)))})
+    assert found and block.label == "Changed"
+
+
+@pytest.mark.parametrize("loader", ["thread", "process"])
+def test_parallel_loading_is_deterministic(extensions, monkeypatch, loader):
+    config = {"extension_loader": loader, "extension_workers": 4}
+    monkeypatch.setattr(System, "get_system_value",
+                        classmethod(lambda cls, key, default=None:
+                                    config.get(key, default)))
+    for i in range(20):
+        write_block(extensions / "blocks" / "math" / f"b{i:02}.json", f"B{i:02}")
+    blocks = System.get_blocks()
+    # The same type is defined by every file: the last one in path order wins
+    assert blocks["test.source"].label == "Source"
+    assert blocks["test.source"].ports[0].type == "test.float"
+    write_block(extensions / "blocks" / "math" / "z.json", "Z")
+    System.reload()
+    assert System.get_blocks()["test.source"].label == "Z"
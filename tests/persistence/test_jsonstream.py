@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the streaming JSON writer and reader.
+"""
+import io
+import json
+
+import pytest
+
+from mosaicode.persistence.jsonstream import JSONStreamReader, JSONStreamWriter
+
+DATA = {
+    "data": "DIAGRAM",
+    "zoom": 1.25,
+    "code_template": {"type": "t", "properties": [{"key": "k", "value": "v"}]},
+    "blocks": [{"id": i, "x": 123456789 + i, "label": "bloco ç \"%d\"\n" % i,
+                "properties": [{"key": "value", "value": [i, None, True]}]}
+               for i in range(50)],
+    "connections": [],
+    "comments": [{"x": 0.5, "properties": {}}],
+    "authors": [],
+}
+
+
+def test_writer():
+    for data in (DATA, {}):
+        stream = io.StringIO()
+        JSONStreamWriter.dump({key: iter(value) if isinstance(value, list) else value
+                               for key, value in data.items()}, stream)
+        assert stream.getvalue() == json.dumps(data, indent=4)
+
+
+def test_reader(tmp_path, monkeypatch):
+    # Small chunks break keys, strings and numbers
+    monkeypatch.setattr(JSONStreamReader, "CHUNK", 7)
+    file_name = tmp_path / "data.json"
+    file_name.write_text(json.dumps(DATA, indent=4), encoding="utf-8")
+
+    with JSONStreamReader(str(file_name)) as reader:
+        assert reader["data"] == "DIAGRAM"
+    with JSONStreamReader(str(file_name)) as reader:
+        assert reader["code_template"] == DATA["code_template"]
+        assert reader["zoom"] == 1.25
+        blocks = reader["blocks"]
+        assert next(blocks) == DATA["blocks"][0]
+        # The items not read are kept when other members are requested
+        assert list(reader["authors"]) == []
+        assert reader["blocks"] == DATA["blocks"][1:]
+        assert list(reader["connections"]) == []
+        assert "missing" not in reader
+        assert list(reader) == list(DATA)
+
+    with JSONStreamReader(str(file_name)) as reader:
+        assert {key: list(value) if key == "blocks" else value
+                for key, value in reader.items()} == DATA
+
+    file_name.write_text('{"data": "DIAGRAM", "blocks": [1, 2')
+    with JSONStreamReader(str(file_name)) as reader:
+        blocks = reader["blocks"]
+        assert next(blocks) == 1
+        with pytest.raises(ValueError):
+            list(blocks)
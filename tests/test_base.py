@@ -170,8 +170,8 @@ class TestBase(unittest.TestCase):
         
         block = Block(diagram_control.diagram, block_model)
         # Don't override block.id - let the Block constructor handle it
-        # Register the block in System.get_blocks() for persistence to work correctly
-        System.get_blocks()[block.type] = block
+        # Register the block in the System for persistence to work correctly
+        System.add_block(block)
         # Salva o bloco como extensão temporária reconhecida pelo mosaicode
         from mosaicode.persistence.blockpersistence import BlockPersistence
         import os
@@ -286,7 +286,7 @@ Developed by: $author$
 */
 $single_code[function]$
 """
-        System.get_code_templates()[code_template.type] = code_template
+        System.add_code_template(code_template)
         return code_template
 
     def create_test_json_file(self, data: Dict[str, Any], filename: str) -> Path:
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for FileTracker (extension file changes).
+"""
+import os
+
+import pytest
+
+from mosaicode.utils.filetracker import FileTracker
+
+
+def touch(path, text, offset=0):
+    path.write_text(text)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset))
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_poll(tmp_path, use_inotify):
+    (tmp_path / "blocks").mkdir()
+    touch(tmp_path / "blocks" / "a.json", "{}")
+    touch(tmp_path / "blocks" / "b.json", "{}")
+    touch(tmp_path / "blocks" / "notes.txt", "")
+    tracker = FileTracker([str(tmp_path)], use_inotify=use_inotify)
+    assert not tracker.poll()
+
+    touch(tmp_path / "blocks" / "a.json", "{ }", 10**9)
+    (tmp_path / "blocks" / "b.json").unlink()
+    (tmp_path / "ports").mkdir()
+    touch(tmp_path / "ports" / "c.json", "{}")
+    touch(tmp_path / "blocks" / "other.txt", "")
+
+    changes = tracker.poll()
+    assert changes.changed == {str(tmp_path / "blocks" / "a.json")}
+    assert changes.removed == {str(tmp_path / "blocks" / "b.json")}
+    assert changes.added == {str(tmp_path / "ports" / "c.json")}
+    assert not tracker.poll()
+
+    # Files created in a new directory are seen as well
+    touch(tmp_path / "ports" / "d.json", "{}")
+    assert tracker.poll().added == {str(tmp_path / "ports" / "d.json")}
+    tracker.close()
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_known_files(tmp_path, use_inotify):
+    """The state of the files read is given, nothing is walked until the first poll."""
+    touch(tmp_path / "a.json", "{}")
+    stat = os.stat(tmp_path / "a.json")
+    known = {str(tmp_path / "a.json"): (stat.st_mtime_ns, stat.st_size),
+             str(tmp_path / "b.json"): (0, 2)}
+    tracker = FileTracker([str(tmp_path)], use_inotify=use_inotify, files=known)
+    touch(tmp_path / "c.json", "{}")
+
+    changes = tracker.poll()
+    assert not changes.changed
+    assert changes.removed == {str(tmp_path / "b.json")}
+    assert changes.added == {str(tmp_path / "c.json")}
+    assert not tracker.poll()
+    touch(tmp_path / "a.json", "{ }", 10**9)
+    assert tracker.poll().changed == {str(tmp_path / "a.json")}
+    tracker.close()
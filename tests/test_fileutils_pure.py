@@ -2,6 +2,7 @@
 """
 Tests for FileUtils (pure logic, no GUI dependencies).
 """
+import os
 import tempfile
 import shutil
 from pathlib import Path
@@ -9,6 +10,7 @@ import json
 import pytest
 
 from mosaicode.utils.FileUtils import get_file_path, get_temp_file, get_absolute_path_from_file
+from mosaicode.utils.FileUtils import atomic_write
 
 @pytest.fixture
 def temp_dir():
@@ -81,4 +83,37 @@ def test_error_handling():
         result = get_file_path("")
         assert isinstance(result, str)
     except Exception:
-        pass 
\ No newline at end of file
+        pass 
+
+
+def test_atomic_write(temp_dir, monkeypatch):
+    target = temp_dir / "patch.mscd"
+    target.write_text("old")
+    target.chmod(0o640)
+    link = temp_dir / "link.mscd"
+    link.symlink_to(target)
+
+    with atomic_write(str(link)) as data_file:
+        data_file.write("new")
+    # The link is kept and the file keeps its permissions
+    assert link.is_symlink()
+    assert target.read_text() == "new"
+    assert target.stat().st_mode & 0o777 == 0o640
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(target)) as data_file:
+            data_file.write("partial")
+            raise RuntimeError()
+    assert target.read_text() == "new"
+    assert sorted(path.name for path in temp_dir.iterdir()) == ["link.mscd", "patch.mscd"]
+
+    # New files get the default permissions; data and rename are synced
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+    with atomic_write(str(temp_dir / "new.mscd")) as data_file:
+        data_file.write("new")
+    assert len(synced) == 2
+    umask = os.umask(0o22)
+    os.umask(umask)
+    assert (temp_dir / "new.mscd").stat().st_mode & 0o777 == 0o666 & ~umask
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the per-language lazy loading of the System extensions.
+"""
+import copy
+import json
+
+import pytest
+
+from mosaicode.system import System
+from mosaicode.utils.filetracker import FileTracker
+from tests.helpers import PORT
+
+
+@pytest.fixture
+def languages(tmp_path, monkeypatch):
+    """Two language libraries in a temporary user directory."""
+    for language in ["javascript", "python"]:
+        library = tmp_path / "extensions" / language
+        (library / "ports").mkdir(parents=True)
+        (library / "blocks").mkdir()
+        (library / "codetemplates").mkdir()
+        (library / "examples").mkdir()
+        (library / "ports" / "port.json").write_text(
+            json.dumps(dict(PORT, type=language + ".float", language=language)))
+        (library / "blocks" / "block.json").write_text(json.dumps({
+            "data": "BLOCK", "type": language + ".source", "language": language,
+            "label": "Source", "codes": {}, "properties": [],
+            "ports": [{"type": language + ".float", "conn_type": "OUTPUT",
+                       "name": "out", "label": "Out"}]}))
+        (library / "codetemplates" / "template.json").write_text(json.dumps({
+            "data": "CODE_TEMPLATE", "type": language + ".template", "version": "0.0.1",
+            "name": language, "language": language, "command": "",
+            "description": "", "codes": {}, "code_parts": [], "properties": []}))
+    monkeypatch.setattr(System, "get_user_dir", classmethod(lambda cls: tmp_path))
+    monkeypatch.setattr(System, "get_extension_paths",
+                        classmethod(lambda cls: [str(tmp_path / "extensions")]))
+    monkeypatch.setattr(System, "instance", None)
+    return tmp_path / "extensions"
+
+
+def test_load_one_language(languages):
+    assert System.get_languages() == ["javascript", "python"]
+    assert not System.is_language_loaded("python")
+
+    blocks = System.get_blocks("python")
+    assert list(blocks) == ["python.source"]
+    assert blocks["python.source"].ports[0].type == "python.float"
+    assert list(System.get_ports("python")) == ["python.float"]
+    assert list(System.get_code_templates("python")) == ["python.template"]
+    assert System.is_language_loaded("python")
+    assert not System.is_language_loaded("javascript")
+
+    # Reloading keeps only the languages in use
+    System.reload()
+    assert System.is_language_loaded("python")
+    assert not System.is_language_loaded("javascript")
+
+
+def test_load_all_languages(languages):
+    assert sorted(System.get_blocks()) == ["javascript.source", "python.source"]
+    assert System.is_language_loaded("javascript")
+    assert System.is_language_loaded("python")
+    # Unknown languages fall back to the whole registry
+    assert len(System.get_ports("c")) == 2
+
+
+def test_refresh(languages, monkeypatch):
+    # Nothing is tracked before the first refresh
+    trackers = []
+
+    def tracker(paths, **kwargs):
+        trackers.append(paths)
+        return FileTracker(paths, **kwargs)
+
+    monkeypatch.setattr("mosaicode.system.FileTracker", tracker)
+    events = []
+    System.add_listener(events.append)
+    assert not System.refresh()
+    assert System.get_blocks("python")["python.source"].label == "Source"
+    assert trackers == []
+
+    block_file = languages / "python" / "blocks" / "block.json"
+    data = json.loads(block_file.read_text())
+    block_file.write_text(json.dumps(dict(data, label="Changed")))
+    (languages / "python" / "blocks" / "other.json").write_text(
+        json.dumps(dict(data, type="python.other")))
+    # Languages not loaded are left alone
+    (languages / "javascript" / "blocks" / "block.json").unlink()
+
+    changes = System.refresh()
+    # Only the loaded languages are tracked
+    assert trackers == [[str(languages / "python")]]
+    assert events == [changes]
+    assert changes.changed["blocks"]["python.source"].label == "Changed"
+    assert list(changes.added["blocks"]) == ["python.other"]
+    assert not changes.removed["blocks"]
+    assert sorted(System.get_blocks("python")) == ["python.other", "python.source"]
+    assert not System.is_language_loaded("javascript")
+
+    # A changed port rebuilds the blocks using it
+    port_file = languages / "python" / "ports" / "port.json"
+    port = json.loads(port_file.read_text())
+    port_file.write_text(json.dumps(dict(port, color="#123456")))
+    (languages / "python" / "blocks" / "other.json").unlink()
+    changes = System.refresh()
+    assert list(changes.changed["ports"]) == ["python.float"]
+    assert list(changes.changed["blocks"]) == ["python.source"]
+    assert changes.removed["blocks"] == {"python.other"}
+    assert System.get_blocks("python")["python.source"].ports[0].color == "#123456"
+    assert len(events) == 2
+
+
+def test_registry_views(languages):
+    with pytest.raises(TypeError):
+        System.get_ports()["python.other"] = None
+    blocks = System.get_blocks("python")
+    with pytest.raises(TypeError):
+        blocks["python.other"] = blocks["python.source"]
+
+    # The views are kept while the registry does not change
+    generation = System.get_generation()
+    assert System.get_blocks("python") is blocks
+    assert System.get_blocks() is System.get_blocks()
+
+    block = copy.copy(blocks["python.source"])
+    block.type = "python.other"
+    System.add_block(block)
+    assert System.get_generation() > generation
+    assert sorted(System.get_blocks("python")) == ["python.other", "python.source"]
+    assert "python.other" not in blocks
+
+    generation = System.get_generation()
+    assert System.remove_block(block) is block
+    assert System.remove_block(block) is None
+    assert System.get_generation() > generation
+    assert list(System.get_blocks("python")) == ["python.source"]
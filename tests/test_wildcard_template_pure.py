@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for WildcardTemplate (pure logic, no GUI dependencies).
+"""
+from copy import deepcopy
+
+from mosaicode.utils.wildcard_template import WildcardTemplate
+
+
+def test_tokenize():
+    template = WildcardTemplate("a $label$ b $prop[freq]$ $code[main, connection]$")
+    assert template.has("label")
+    assert template.has("prop", "freq")
+    assert template.has("code", "main, connection")
+    assert not template.has("prop", "gain")
+    assert template.segments[0] == "a "
+
+
+def test_render():
+    template = WildcardTemplate("$x$ + $prop[y]$ = $unknown$")
+    values = {("x", None): "1", ("prop", "y"): "2"}
+    result = template.render(lambda name, arg: values.get((name, arg)))
+    assert result == "1 + 2 = $unknown$"
+
+
+def test_render_without_wildcards():
+    template = WildcardTemplate("var a = $(document);")
+    assert template.render(lambda name, arg: "x") == "var a = $(document);"
+
+
+def test_compile_is_cached():
+    first = WildcardTemplate.compile("$label$_$id$")
+    assert WildcardTemplate.compile("$label$_$id$") is first
+    assert deepcopy(first) is first